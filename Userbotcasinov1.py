@@ -1,7 +1,4 @@
 import logging
-import random
-import string
-import re
 from datetime import datetime, timedelta
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, LabeledPrice
 from telegram.ext import (
@@ -14,9 +11,32 @@ from telegram.ext import (
     ContextTypes,
 )
 from telegram.constants import ParseMode
-from collections import defaultdict
 import asyncio
 import os
+from functools import partial
+
+from balance_store import BalanceStore, LedgerBalanceStore
+from money import StarsConverter
+from profiles import ProfileRepository
+from display_names import DisplayNames
+from history_store import GameHistory
+from ranks import RANKS, RankTable
+from games import GAMES, UNKNOWN_GAME, Game, GameSetup, GameTable
+from game_engine import BOT, PLAYER, TIE, play_round, play_rounds
+from round_dispatch import ChatPacer, RoundDispatcher
+from dice_dispatch import DiceDispatch
+from callback_router import CallbackRouter
+from actors import ActorExecutor
+from checkpoints import GameCheckpoints
+from timers import ExpiryTracker, TimerWheel
+from tables import TABLE_OPEN, TableEngine, TableError
+from tournaments import (
+    TOURNAMENT_CANCELLED, TOURNAMENT_FINISHED, TOURNAMENT_SIGNUP, TournamentEngine, TournamentError,
+)
+from payments import PaymentWaiters
+from ton_validator import is_valid_ton_address
+from ids import IdGenerator
+from userbot_pool import UserbotPool
 
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
@@ -33,161 +53,342 @@ if not BOT_TOKEN:
 USERBOT_API_ID = os.environ.get("USERBOT_API_ID", "28782318")  # Get from https://my.telegram.org
 USERBOT_API_HASH = os.environ.get("USERBOT_API_HASH", "ea72ed0d16604c27198d5dd1a53f2a69")  # Get from https://my.telegram.org
 USERBOT_SESSION = os.environ.get("USERBOT_SESSION", "userbot_session")  # Session file name
+# Comma-separated session files; group chats are spread across them by consistent hashing
+USERBOT_SESSIONS = [
+    session.strip() for session in os.environ.get("USERBOT_SESSIONS", USERBOT_SESSION).split(",") if session.strip()
+]
+
+# Balance storage: "ledger" (durable write-ahead ledger) or "memory"
+BALANCE_STORE = os.environ.get("BALANCE_STORE", "ledger")
+LEDGER_DIR = os.environ.get("LEDGER_DIR", "data/ledger")
+PROFILE_DB = os.environ.get("PROFILE_DB", "data/profiles.db")
+HISTORY_DIR = os.environ.get("HISTORY_DIR", "data/history")
+CHECKPOINT_PATH = os.environ.get("CHECKPOINT_PATH", "data/games.ckpt")
 
 PROVIDER_TOKEN = ""
 ADMIN_ID = 5709159932
 
-user_games = {}
-user_balances = defaultdict(float)
-game_locks = defaultdict(asyncio.Lock)
+user_games = GameTable()
+user_balances = BalanceStore() if BALANCE_STORE == 'memory' else LedgerBalanceStore(LEDGER_DIR)
+game_actors = ActorExecutor('games')
 user_withdrawals = {}
 withdrawal_counter = 26356
+transaction_ids = IdGenerator('stx', 32)
+payment_request_ids = IdGenerator('pr', 6)
+
+user_profiles = ProfileRepository(PROFILE_DB)
+# Names of userbot senders, so commands never wait on a Telegram entity lookup
+display_names = DisplayNames(user_profiles)
+
+# Payment request tracking
+pending_payment_requests = {}
+timer_wheel = TimerWheel()
+payment_waiters = PaymentWaiters(timer_wheel)
+# Fire-and-forget tasks, referenced until they finish so they are not collected mid-flight
+background_tasks = set()
+
+# Abandoned payment requests, game setups and games are dropped by the timer wheel
+PAYMENT_REQUEST_TTL = 900
+GAME_SETUP_TTL = 600
+GAME_IDLE_TTL = 1800
+# Open bet menus kept at most; past this the least recently used one is dropped
+MAX_GAME_SETUPS = int(os.environ.get("MAX_GAME_SETUPS", "10000"))
+# Games one player may run at once, one per chat
+MAX_GAMES_PER_USER = int(os.environ.get("MAX_GAMES_PER_USER", "5"))
+game_contexts = {}
+payment_expiry = ExpiryTracker(timer_wheel, 'payment_requests', pending_payment_requests, PAYMENT_REQUEST_TTL)
+context_expiry = ExpiryTracker(
+    timer_wheel, 'game_contexts', game_contexts, GAME_SETUP_TTL, max_size=MAX_GAME_SETUPS
+)
+# Active games are checkpointed on every change so they survive restarts
+game_checkpoints = GameCheckpoints(CHECKPOINT_PATH, user_games)
+# A game that sits idle (or is evicted) hands the bet back; the userbot also tells the chat
+game_expiry = ExpiryTracker(
+    timer_wheel, 'games', user_games, GAME_IDLE_TTL,
+    on_expire=lambda key, game: refund_expired_game(game), on_change=game_checkpoints.mark_dirty
+)
 
-user_profiles = {}
-user_game_history = defaultdict(list)
+# Bot throws go out concurrently, paced per chat; results wait for the dice animation
+THROW_INTERVAL = float(os.environ.get("THROW_INTERVAL", "0.3"))
+THROW_REPLY_DELAY = float(os.environ.get("THROW_REPLY_DELAY", "0.5"))
+round_dispatch = RoundDispatcher(ChatPacer(THROW_INTERVAL), THROW_REPLY_DELAY)
+
+# Multiplayer tables in groups: everyone stakes the same, the best throw takes the pot
+TABLE_JOIN_SECONDS = int(os.environ.get("TABLE_JOIN_SECONDS", "60"))
+TABLE_THROW_SECONDS = int(os.environ.get("TABLE_THROW_SECONDS", "90"))
+TABLE_MAX_PLAYERS = int(os.environ.get("TABLE_MAX_PLAYERS", "10"))
+TABLE_DEFAULT_STAKE = int(os.environ.get("TABLE_DEFAULT_STAKE", "10"))
+table_engine = TableEngine(
+    timer_wheel, user_balances, TABLE_JOIN_SECONDS, TABLE_THROW_SECONDS, TABLE_MAX_PLAYERS
+)
+
+# Knockout tournaments in groups, seeded by XP; entry fees go to the champion
+TOURNAMENT_SIGNUP_SECONDS = int(os.environ.get("TOURNAMENT_SIGNUP_SECONDS", "300"))
+TOURNAMENT_MATCH_SECONDS = int(os.environ.get("TOURNAMENT_MATCH_SECONDS", "120"))
+TOURNAMENT_MAX_ENTRANTS = int(os.environ.get("TOURNAMENT_MAX_ENTRANTS", "1024"))
+tournament_engine = TournamentEngine(
+    timer_wheel, user_balances, TOURNAMENT_SIGNUP_SECONDS, TOURNAMENT_MATCH_SECONDS, TOURNAMENT_MAX_ENTRANTS,
+    # Runs on the timer wheel: cached profiles only, an unseen entrant seeds as 0 XP
+    seed_key=lambda user_id: -getattr(user_profiles.cached(user_id), 'xp', 0)
+)
+
+# The userbot's dice handler only sees dice thrown where a game, table or tournament is running
+dice_dispatch = DiceDispatch(
+    lambda chat_id: user_games.has_chat(chat_id) or chat_id in table_engine.tables
+    or chat_id in tournament_engine.tournaments
+)
+callback_router = CallbackRouter()
 
 STARS_TO_USD = 0.0179
 STARS_TO_TON = 0.01201014
+stars_converter = StarsConverter(STARS_TO_USD, STARS_TO_TON)
+
+user_game_history = GameHistory(HISTORY_DIR, GAMES)
 
-GAME_TYPES = {
-    'dice': {'emoji': '🎲', 'name': 'Dice', 'max_value': 6, 'icon': '🎲'},
-    'bowl': {'emoji': '🎳', 'name': 'Bowling', 'max_value': 6, 'icon': '🎳'},
-    'arrow': {'emoji': '🎯', 'name': 'Darts', 'max_value': 6, 'icon': '🎯'},
-    'football': {'emoji': '⚽', 'name': 'Football', 'max_value': 5, 'icon': '🥅'},
-    'basket': {'emoji': '🏀', 'name': 'Basketball', 'max_value': 5, 'icon': '🏀'}
-}
-
-# Map commands to game types for userbot
-COMMAND_TO_GAME = {
-    '/dice': 'dice',
-    '/dart': 'arrow',
-    '/bowl': 'bowl',
-    '/football': 'football',
-    '/basket': 'basket'
-}
-
-RANKS = {
-    1: {"name": "Newcomer", "xp_required": 0, "emoji": "🌱"},
-    2: {"name": "Beginner", "xp_required": 100, "emoji": "🌿"},
-    3: {"name": "Amateur", "xp_required": 300, "emoji": "🌾"},
-    4: {"name": "Player", "xp_required": 600, "emoji": "⭐"},
-    5: {"name": "Regular", "xp_required": 1000, "emoji": "🌟"},
-    6: {"name": "Enthusiast", "xp_required": 1500, "emoji": "✨"},
-    7: {"name": "Skilled", "xp_required": 2200, "emoji": "💫"},
-    8: {"name": "Expert", "xp_required": 3000, "emoji": "🔥"},
-    9: {"name": "Veteran", "xp_required": 4000, "emoji": "💎"},
-    10: {"name": "Master", "xp_required": 5200, "emoji": "👑"},
-    11: {"name": "Grand Master", "xp_required": 6500, "emoji": "🏆"},
-    12: {"name": "Champion", "xp_required": 8000, "emoji": "🥇"},
-    13: {"name": "Elite", "xp_required": 10000, "emoji": "💠"},
-    14: {"name": "Pro", "xp_required": 12500, "emoji": "🎖"},
-    15: {"name": "Star", "xp_required": 15500, "emoji": "⚡"},
-    16: {"name": "Superstar", "xp_required": 19000, "emoji": "🌠"},
-    17: {"name": "Legend", "xp_required": 23000, "emoji": "🔱"},
-    18: {"name": "Mythic", "xp_required": 28000, "emoji": "🐉"},
-    19: {"name": "Immortal", "xp_required": 35000, "emoji": "👼"},
-    20: {"name": "God", "xp_required": 50000, "emoji": "🌌"}
-}
-
-class Game:
-    def __init__(self, user_id, username, bet_amount, rounds, throw_count, game_type):
-        self.user_id = user_id
-        self.username = username
-        self.bet_amount = bet_amount
-        self.total_rounds = rounds
-        self.throw_count = throw_count
-        self.game_type = game_type
-        self.current_round = 0
-        self.user_score = 0
-        self.bot_score = 0
-        self.user_results = []
-        self.bot_results = []
-        self.is_demo = False
+# Usage hints list the group commands of the catalogue, e.g. "dice|dart|bowl"
+GAME_CHOICES = "|".join(spec.command[1:] for spec in GAMES.values())
+GAME_MENU_TEXT = "🎮 <b>Select a game to play:</b>\n\n" + "\n".join(
+    f"{spec.icon} <b>{spec.name}</b> - {spec.tagline}" for spec in GAMES.values()
+)
+
+def button_rows(buttons, per_row=2):
+    return [buttons[i:i + per_row] for i in range(0, len(buttons), per_row)]
+
+def inline_button(text, data):
+    return InlineKeyboardButton(text, callback_data=data)
+
+def option_rows(button, action, game_info, options, label):
+    """One button per option the game offers (its bets, rounds or throws); ``button(text, data)`` builds each"""
+    return button_rows([button(label(value), f"{action}_{game_info.key}_{value}") for value in options])
+
+def game_menu_rows(button, action):
+    """One button per game in the catalogue"""
+    return button_rows([button(f"{spec.icon} {spec.name}", f"{action}_{spec.key}") for spec in GAMES.values()])
+
+def bet_label(amount):
+    return f"{amount} ⭐"
+
+def rounds_label(rounds):
+    return f"{rounds} Round" if rounds == 1 else f"{rounds} Rounds"
+
+def throws_label(throws):
+    return f"{throws} Throw" if throws == 1 else f"{throws} Throws"
+
+rank_table = RankTable(RANKS)
 
 def get_or_create_profile(user_id, username=None):
-    if user_id not in user_profiles:
-        user_profiles[user_id] = {
-            'user_id': user_id,
-            'username': username or 'Unknown',
-            'registration_date': datetime.now(),
-            'xp': 0,
-            'total_games': 0,
-            'total_bets': 0.0,
-            'total_wins': 0.0,
-            'total_losses': 0.0,
-            'games_won': 0,
-            'games_lost': 0,
-            'favorite_game': None,
-            'biggest_win': 0.0,
-            'game_counts': defaultdict(int)
-        }
-    return user_profiles[user_id]
+    return user_profiles.get_or_create(user_id, username or display_names.get(user_id))
 
 def get_user_rank(xp):
-    current_rank = 1
-    for level, data in RANKS.items():
-        if xp >= data['xp_required']:
-            current_rank = level
-        else:
-            break
-    return current_rank
+    return rank_table.lookup(xp).level
 
 def get_rank_info(level):
-    return RANKS.get(level, RANKS[1])
+    return rank_table.level(level)
 
 def add_xp(user_id, amount):
     profile = get_or_create_profile(user_id)
-    profile['xp'] += amount
-    return profile['xp']
+    profile.xp += amount
+    user_profiles.mark_dirty(profile)
+    return profile.xp
 
 def update_game_stats(user_id, game_type, bet_amount, win_amount, won):
     profile = get_or_create_profile(user_id)
-    profile['total_games'] += 1
-    profile['total_bets'] += bet_amount
+    profile.total_games += 1
+    profile.total_bets += bet_amount
     
     if won:
-        profile['games_won'] += 1
-        profile['total_wins'] += win_amount
-        if win_amount > profile['biggest_win']:
-            profile['biggest_win'] = win_amount
-        add_xp(user_id, int(bet_amount * 2) + 50)
+        profile.games_won += 1
+        profile.total_wins += win_amount
+        if win_amount > profile.biggest_win:
+            profile.biggest_win = win_amount
+        add_xp(user_id, bet_amount * 2 + 50)
     else:
-        profile['games_lost'] += 1
-        profile['total_losses'] += bet_amount
-        add_xp(user_id, int(bet_amount * 0.5) + 10)
-    
-    profile['game_counts'][game_type] += 1
-    
-    max_count = 0
-    fav_game = None
-    for gt, count in profile['game_counts'].items():
-        if count > max_count:
-            max_count = count
-            fav_game = gt
-    profile['favorite_game'] = fav_game
-    
-    user_game_history[user_id].append({
-        'game_type': game_type,
-        'bet_amount': bet_amount,
-        'win_amount': win_amount if won else 0,
-        'won': won,
-        'timestamp': datetime.now()
-    })
+        profile.games_lost += 1
+        profile.total_losses += bet_amount
+        add_xp(user_id, bet_amount // 2 + 10)
+    
+    profile.count_game(game_type)
+    user_profiles.mark_dirty(profile)
+    
+    user_game_history.record(user_id, game_type, bet_amount, win_amount if won else 0, won)
 
-def generate_transaction_id():
-    chars = string.ascii_letters + string.digits
-    return 'stx' + ''.join(random.choice(chars) for _ in range(80))
+def apply_settlement(user_id, game, settlement):
+    """Credit the payout or refund and record stats for a finished game"""
+    if game.is_demo:
+        return
+    if settlement.payout:
+        user_balances.credit(user_id, settlement.payout, settlement.reason)
+    if settlement.won is not None:
+        update_game_stats(user_id, game.game_type, game.bet_amount, settlement.payout, settlement.won)
 
-def is_valid_ton_address(address):
-    if not address:
+def format_autoplay(game, outcomes):
+    """Single report for a game played out by auto-play: every round, then the settlement"""
+    marks = {PLAYER: "✅", BOT: "❌", TIE: "🤝"}
+    rounds = "\n".join(
+        f"Round {outcome.round_number}: You <b>{outcome.user_total}</b> - "
+        f"<b>{outcome.bot_total}</b> Bot {marks[outcome.winner]}"
+        for outcome in outcomes
+    )
+    demo_tag = " (DEMO)" if game.is_demo else ""
+    settlement = outcomes[-1].settlement
+    if settlement.winner == PLAYER:
+        result_text = f"🎉 <b>YOU WON!{demo_tag}</b> 🎉\n\n💰 Winnings: <b>{settlement.payout} ⭐</b>"
+    elif settlement.winner == BOT:
+        result_text = f"😔 <b>You lost!{demo_tag}</b>\n\n💸 Lost: <b>{game.bet_amount} ⭐</b>"
+    else:
+        result_text = f"🤝 <b>It's a tie!{demo_tag}</b>\n\n💰 Bet returned: <b>{game.bet_amount} ⭐</b>"
+    return (
+        f"⚡ <b>Auto-play Results:</b>\n\n{rounds}\n\n"
+        f"📊 Final Score: You <b>{game.user_score}</b> - <b>{game.bot_score}</b> Bot\n\n"
+        f"{result_text}\n\n"
+        f"💰 Balance: <b>{user_balances[game.user_id]} ⭐</b>"
+    )
+
+def refund_expired_game(game):
+    """Credit back the bet of a game dropped before it finished; refunds are not games"""
+    if not game.is_demo:
+        user_balances.credit(game.user_id, game.bet_amount, 'refund')
+    logger.info(f"Refunded {game.bet_amount} ⭐ to user {game.user_id} for expired game in {game.chat_id}")
+
+async def sync_finished_game(game):
+    """Get a finished game on disk before it is paid; if that fails the payout still goes ahead"""
+    try:
+        await game_checkpoints.sync()
+    except Exception as e:
+        logger.error(f"Checkpoint of finished game in {game.chat_id} failed, settling it anyway: {e}")
+
+def reopen_failed_round(game):
+    """Hand the player back a round whose bot throws never went out; True if it was reopened"""
+    if user_games.get(game.key) is not game or not game.reopen_round():
         return False
-    ton_pattern = r'^(UQ|EQ|kQ|0Q)[A-Za-z0-9_-]{46}$'
-    if re.match(ton_pattern, address):
-        return True
-    raw_pattern = r'^-?[0-9]+:[a-fA-F0-9]{64}$'
-    if re.match(raw_pattern, address):
-        return True
-    return len(address) >= 48 and len(address) <= 67
+    game_checkpoints.mark_dirty(game.key)
+    return True
+
+def apply_table_result(result):
+    """Record stats for every player of a settled table; refunds are not games"""
+    if not result.winners:
+        return
+    table = result.table
+    for user_id in table.players:
+        payout = result.payouts.get(user_id, 0)
+        update_game_stats(user_id, table.game_type, table.stake, payout, user_id in result.payouts)
+
+def format_table(table):
+    game_info = GAMES[table.game_type]
+    players = "\n".join(f"• {table.names[user_id]}" for user_id in table.players)
+    text = (
+        f"{game_info.icon} <b>{game_info.name} Table</b>\n\n"
+        f"💰 Stake: <b>{table.stake} ⭐</b> | Pot: <b>{table.pot} ⭐</b>\n"
+        f"👥 Players ({len(table.players)}/{table_engine.max_players}):\n{players}\n\n"
+    )
+    if table.state == TABLE_OPEN:
+        return text + f"Tap Join within {table_engine.join_seconds}s. The host can start once 2 players are in."
+    return text + f"🎮 Everyone send one {game_info.emoji} within {table_engine.throw_seconds}s!"
+
+def format_table_result(result):
+    table = result.table
+    game_info = GAMES[table.game_type]
+    if not result.winners:
+        return (
+            f"{game_info.icon} <b>{game_info.name} Table closed</b>\n\n"
+            f"No game was played. Every stake of {table.stake} ⭐ was refunded."
+        )
+    lines = []
+    for user_id in table.players:
+        value = table.values.get(user_id)
+        lines.append(f"{table.names[user_id]}: <b>{value if value is not None else '—'}</b>")
+    winners = ", ".join(f"{table.names[user_id]} (+{result.payouts[user_id]} ⭐)" for user_id in result.winners)
+    return (
+        f"{game_info.icon} <b>{game_info.name} Table Results</b>\n\n"
+        + "\n".join(lines)
+        + f"\n\n🏆 Pot of <b>{table.pot} ⭐</b> goes to {winners}"
+    )
+
+def apply_match_result(tournament, match):
+    """Record a decided tournament match for both players.
+
+    The entry fee is staked once, so it is the bet of each player's last
+    match: the loser's, and the champion's final, which also wins the prize.
+    Earlier wins count as games with no money on them.
+    """
+    final = tournament.next_match(match) is None
+    fee = tournament.entry_fee
+    update_game_stats(match.winner, tournament.game_type, fee if final else 0, tournament.prize if final else 0, True)
+    update_game_stats(match.loser, tournament.game_type, fee, 0, False)
+
+def format_tournament(tournament, limit=20):
+    game_info = GAMES[tournament.game_type]
+    header = (
+        f"🏆 <b>{game_info.name} Tournament</b>\n\n"
+        f"💰 Entry: <b>{tournament.entry_fee} ⭐</b> | Prize: <b>{tournament.prize} ⭐</b>\n"
+    )
+    if tournament.state == TOURNAMENT_SIGNUP:
+        names = [tournament.names[user_id] for user_id in tournament.entrants[:limit]]
+        more = len(tournament.entrants) - len(names)
+        return (
+            header
+            + f"👥 Players ({len(tournament.entrants)}/{tournament_engine.max_entrants}): "
+            + ", ".join(names) + (f" and {more} more" if more > 0 else "")
+            + f"\n\nTap Join within {tournament_engine.signup_seconds}s. Matches are best of "
+            + f"{tournament.rounds}, seeded by XP."
+        )
+    if tournament.state == TOURNAMENT_CANCELLED:
+        return header + "\nThe tournament was called off. Every entry fee was refunded."
+    live = tournament.live_matches()
+    lines = [
+        f"{tournament.names[match.players[0]]} vs {tournament.names[match.players[1]]}"
+        for match in live[:limit]
+    ]
+    if len(live) > limit:
+        lines.append(f"...and {len(live) - limit} more matches")
+    return (
+        header
+        + f"👥 {len(tournament.entrants)} players, {tournament.total_rounds} rounds\n\n"
+        + "\n".join(lines)
+        + f"\n\n🎮 Send {game_info.emoji} when your match is up. "
+        + f"Each match has {tournament_engine.match_seconds}s."
+    )
+
+def format_match_result(tournament, match):
+    game = match.game
+    names = tournament.names
+    winner, loser = match.winner, match.loser
+    scores = {match.players[0]: game.user_score, match.players[1]: game.bot_score}
+    text = (
+        f"⚔️ Round {tournament.round_of(match)}: <b>{names[winner]}</b> beats {names[loser]} "
+        f"({scores[winner]}-{scores[loser]})"
+    )
+    if tournament.state == TOURNAMENT_FINISHED:
+        return text + f"\n\n🏆 <b>{names[winner]}</b> wins the tournament and <b>{tournament.prize} ⭐</b>!"
+    following = tournament.next_match(match)
+    if following.game is not None and following.winner is None:
+        better, other = following.players
+        return text + f"\nNext: {names[better]} vs {names[other]}, send your {GAMES[tournament.game_type].emoji}!"
+    return text + f"\n{names[winner]} waits for the next opponent."
+
+def generate_transaction_id():
+    return transaction_ids()
+
+def generate_payment_request_id():
+    return payment_request_ids()
+
+def run_in_background(coro, name):
+    task = asyncio.create_task(coro, name=name)
+    background_tasks.add(task)
+    task.add_done_callback(background_task_done)
+    return task
+
+def background_task_done(task):
+    background_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Background task {task.get_name()} failed: {task.exception()}")
+
+def parse_deposit_callback(rest):
+    """(request id, amount) from ``udeposit_`` callback data, given the part after the prefix"""
+    request_id, _, amount = rest.partition('_')
+    if not request_id or not amount.isdigit():
+        return None
+    return request_id, int(amount)
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
@@ -196,10 +397,10 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     get_or_create_profile(user_id, user.username or user.first_name)
     
     balance = user_balances[user_id]
-    balance_usd = balance * STARS_TO_USD
+    balance_usd = stars_converter.usd(balance)
     
     profile = user_profiles.get(user_id, {})
-    turnover = profile.get('total_bets', 0.0) * STARS_TO_USD
+    turnover = stars_converter.usd(profile.get('total_bets', 0))
     
     welcome_text = (
         f"🐱 <b>Welcome to lenarao Game</b>\n\n"
@@ -208,8 +409,8 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         f"1. Make sure you have a balance. You can top up using the \"Пополнить\" button.\n\n"
         f"2. Join one of our groups from the @lenrao catalog.\n\n"
         f"3. Type /play and start playing!\n\n\n"
-        f"💵 Balance: ${balance_usd:.2f}\n"
-        f"👑 Game turnover: ${turnover:.2f}\n\n"
+        f"💵 Balance: ${balance_usd}\n"
+        f"👑 Game turnover: ${turnover}\n\n"
         f"🌐 <b>About us</b>\n"
         f"<a href='https://t.me/lenrao'>Channel</a> | <a href='https://t.me/lenraochat'>Chat</a> | <a href='https://t.me/lenraosupport'>Support</a>"
     )
@@ -225,28 +426,11 @@ async def play_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     get_or_create_profile(user_id, update.effective_user.username or update.effective_user.first_name)
     
-    keyboard = [
-        [
-            InlineKeyboardButton("🎲 Dice", callback_data="play_game_dice"),
-            InlineKeyboardButton("🎳 Bowling", callback_data="play_game_bowl"),
-        ],
-        [
-            InlineKeyboardButton("🎯 Darts", callback_data="play_game_arrow"),
-            InlineKeyboardButton("⚽ Football", callback_data="play_game_football"),
-        ],
-        [
-            InlineKeyboardButton("🏀 Basketball", callback_data="play_game_basket"),
-        ]
-    ]
+    keyboard = game_menu_rows(inline_button, 'play_game')
     reply_markup = InlineKeyboardMarkup(keyboard)
     
     await update.message.reply_html(
-        "🎮 <b>Select a game to play:</b>\n\n"
-        "🎲 <b>Dice</b> - Roll the dice and beat the bot!\n"
-        "🎳 <b>Bowling</b> - Strike your way to victory!\n"
-        "🎯 <b>Darts</b> - Aim for the bullseye!\n"
-        "⚽ <b>Football</b> - Score goals and win!\n"
-        "🏀 <b>Basketball</b> - Shoot hoops for stars!",
+        GAME_MENU_TEXT,
         reply_markup=reply_markup
     )
 
@@ -256,46 +440,42 @@ async def profile_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     profile = get_or_create_profile(user_id, user.username or user.first_name)
     balance = user_balances[user_id]
-    balance_usd = balance * STARS_TO_USD
+    balance_usd = stars_converter.usd(balance)
     
-    rank_level = get_user_rank(profile['xp'])
-    rank_info = get_rank_info(rank_level)
+    rank = rank_table.lookup(profile['xp'])
     
-    if rank_level < 20:
-        next_rank_info = get_rank_info(rank_level + 1)
-        xp_progress = profile['xp'] - rank_info['xp_required']
-        xp_needed = next_rank_info['xp_required'] - rank_info['xp_required']
-        progress_bar = create_progress_bar(xp_progress, xp_needed)
-        rank_display = f"{rank_info['emoji']} {rank_info['name']} (Lvl {rank_level})\n{progress_bar} {profile['xp']}/{next_rank_info['xp_required']} XP"
+    if not rank.is_max:
+        progress_bar = create_progress_bar(profile['xp'] - rank.xp_required, rank.span)
+        rank_display = f"{rank.emoji} {rank.name} (Lvl {rank.level})\n{progress_bar} {profile['xp']}/{rank.next_xp} XP"
     else:
-        rank_display = f"{rank_info['emoji']} {rank_info['name']} (MAX LEVEL)\n🌌 {profile['xp']} XP"
+        rank_display = f"{rank.emoji} {rank.name} (MAX LEVEL)\n🌌 {profile['xp']} XP"
     
     fav_game = profile.get('favorite_game')
-    if fav_game and fav_game in GAME_TYPES:
-        fav_game_display = f"{GAME_TYPES[fav_game]['icon']} {GAME_TYPES[fav_game]['name']}"
+    if fav_game and fav_game in GAMES:
+        fav_game_display = f"{GAMES[fav_game].icon} {GAMES[fav_game].name}"
     else:
         fav_game_display = "?"
     
     biggest_win = profile.get('biggest_win', 0)
     if biggest_win > 0:
-        biggest_win_display = f"${biggest_win * STARS_TO_USD:.2f}"
+        biggest_win_display = f"${stars_converter.usd(biggest_win)}"
     else:
         biggest_win_display = "?"
     
     reg_date = profile.get('registration_date', datetime.now())
     reg_date_str = reg_date.strftime("%Y-%m-%d %H:%M")
     
-    total_bets_usd = profile.get('total_bets', 0) * STARS_TO_USD
-    total_wins_usd = profile.get('total_wins', 0) * STARS_TO_USD
+    total_bets_usd = stars_converter.usd(profile.get('total_bets', 0))
+    total_wins_usd = stars_converter.usd(profile.get('total_wins', 0))
     
     profile_text = (
         f"📢 <b>Profile</b>\n\n"
         f"ℹ️ User ID: <code>{user_id}</code>\n"
         f"⬆️ Rank: {rank_display}\n"
-        f"💵 Balance: ${balance_usd:.2f}\n\n"
+        f"💵 Balance: ${balance_usd}\n\n"
         f"⚡️ Total games: {profile.get('total_games', 0)}\n"
-        f"Total bets: ${total_bets_usd:.2f}\n"
-        f"Total wins: ${total_wins_usd:.2f}\n\n"
+        f"Total bets: ${total_bets_usd}\n"
+        f"Total wins: ${total_wins_usd}\n\n"
         f"🎲 Favorite game: {fav_game_display}\n"
         f"🎉 Biggest win: {biggest_win_display}\n\n"
         f"🕒 Registration date: {reg_date_str}"
@@ -316,7 +496,7 @@ async def history_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = user.id
     
     profile = get_or_create_profile(user_id, user.username or user.first_name)
-    history = user_game_history.get(user_id, [])
+    history = user_game_history.recent(user_id)
     
     total_games = profile.get('total_games', 0)
     total_bets = profile.get('total_bets', 0)
@@ -328,11 +508,11 @@ async def history_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     total_wagered = total_bets
     net_profit = total_wins - total_losses
     
-    total_bets_usd = total_bets * STARS_TO_USD
-    total_wins_usd = total_wins * STARS_TO_USD
-    total_losses_usd = total_losses * STARS_TO_USD
-    total_wagered_usd = total_wagered * STARS_TO_USD
-    net_profit_usd = net_profit * STARS_TO_USD
+    total_bets_usd = stars_converter.usd(total_bets)
+    total_wins_usd = stars_converter.usd(total_wins)
+    total_losses_usd = stars_converter.usd(total_losses)
+    total_wagered_usd = stars_converter.usd(total_wagered)
+    net_profit_usd = stars_converter.usd(net_profit)
     
     if total_games > 0:
         win_rate = (games_won / total_games) * 100
@@ -346,23 +526,22 @@ async def history_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         f"❌ Games Lost: {games_lost}\n"
         f"📈 Win Rate: {win_rate:.1f}%\n\n"
         f"💰 <b>Financial Summary:</b>\n"
-        f"💵 Total Bets: ${total_bets_usd:.2f}\n"
-        f"🏆 Total Wins: ${total_wins_usd:.2f}\n"
-        f"📉 Total Losses: ${total_losses_usd:.2f}\n"
-        f"🔄 Total Wagered: ${total_wagered_usd:.2f}\n"
-        f"{'📈' if net_profit >= 0 else '📉'} Net Profit: ${net_profit_usd:.2f}\n"
+        f"💵 Total Bets: ${total_bets_usd}\n"
+        f"🏆 Total Wins: ${total_wins_usd}\n"
+        f"📉 Total Losses: ${total_losses_usd}\n"
+        f"🔄 Total Wagered: ${total_wagered_usd}\n"
+        f"{'📈' if net_profit >= 0 else '📉'} Net Profit: ${net_profit_usd}\n"
     )
     
     if history:
         history_text += "\n📜 <b>Recent Games:</b>\n"
-        recent_games = history[-5:]
-        for game in reversed(recent_games):
-            game_type = game['game_type']
-            game_info = GAME_TYPES.get(game_type, {'icon': '🎮', 'name': 'Unknown'})
-            status = "✅ Won" if game['won'] else "❌ Lost"
-            bet_usd = game['bet_amount'] * STARS_TO_USD
-            timestamp = game['timestamp'].strftime("%m/%d %H:%M")
-            history_text += f"{game_info['icon']} {game_info['name']} - {status} (${bet_usd:.2f}) - {timestamp}\n"
+        for game in history:
+            game_type = game.game_type
+            game_info = GAMES.get(game_type, UNKNOWN_GAME)
+            status = "✅ Won" if game.won else "❌ Lost"
+            bet_usd = stars_converter.usd(game.bet_amount)
+            timestamp = game.timestamp.strftime("%m/%d %H:%M")
+            history_text += f"{game_info.icon} {game_info.name} - {status} (${bet_usd}) - {timestamp}\n"
     
     await update.message.reply_html(history_text)
 
@@ -385,9 +564,9 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def balance_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     balance = user_balances[user_id]
-    balance_usd = balance * STARS_TO_USD
+    balance_usd = stars_converter.usd(balance)
     await update.message.reply_html(
-        f"💰 Your balance: <b>{balance} ⭐</b> (${balance_usd:.2f})"
+        f"💰 Your balance: <b>{balance} ⭐</b> (${balance_usd})"
     )
 
 async def deposit_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -478,93 +657,75 @@ async def custom_deposit(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def start_game_command(update: Update, context: ContextTypes.DEFAULT_TYPE, game_type: str):
     user_id = update.effective_user.id
     
-    async with game_locks[user_id]:
-        if user_id in user_games:
-            await update.message.reply_html(
-                "❌ You already have an active game! Finish it first."
-            )
-            return
-        
-        balance = user_balances[user_id]
-        
-        if balance < 1:
-            await update.message.reply_html(
-                "❌ Insufficient balance! Use /deposit to add Stars.\n"
-                f"Your balance: <b>{balance} ⭐</b>"
-            )
-            return
-        
-        context.user_data['game_type'] = game_type
-        context.user_data['is_demo'] = False
-        
-        game_info = GAME_TYPES[game_type]
-        keyboard = [
-            [
-                InlineKeyboardButton("10 ⭐", callback_data=f"bet_{game_type}_10"),
-                InlineKeyboardButton("25 ⭐", callback_data=f"bet_{game_type}_25"),
-            ],
-            [
-                InlineKeyboardButton("50 ⭐", callback_data=f"bet_{game_type}_50"),
-                InlineKeyboardButton("100 ⭐", callback_data=f"bet_{game_type}_100"),
-            ],
-            [
-                InlineKeyboardButton("Cancel ❌", callback_data="cancel_game"),
-            ]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+    if (update.effective_chat.id, user_id) in user_games:
         await update.message.reply_html(
-            f"{game_info['icon']} <b>{game_info['name']} Game</b>\n\n"
-            f"💰 Choose your bet:\n"
-            f"Your balance: <b>{balance} ⭐</b>",
-            reply_markup=reply_markup
+            "❌ You already have an active game! Finish it first."
         )
+        return
+    
+    balance = user_balances[user_id]
+    
+    if balance < 1:
+        await update.message.reply_html(
+            "❌ Insufficient balance! Use /deposit to add Stars.\n"
+            f"Your balance: <b>{balance} ⭐</b>"
+        )
+        return
+    
+    context.user_data['game_type'] = game_type
+    context.user_data['is_demo'] = False
+    
+    game_info = GAMES[game_type]
+    keyboard = option_rows(inline_button, 'bet', game_info, game_info.bets, bet_label) + [
+        [
+            InlineKeyboardButton("Cancel ❌", callback_data="cancel_game"),
+        ]
+    ]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    await update.message.reply_html(
+        f"{game_info.icon} <b>{game_info.name} Game</b>\n\n"
+        f"💰 Choose your bet:\n"
+        f"Your balance: <b>{balance} ⭐</b>",
+        reply_markup=reply_markup
+    )
 
 async def start_game_from_callback(query, context: ContextTypes.DEFAULT_TYPE, game_type: str):
     user_id = query.from_user.id
     
-    async with game_locks[user_id]:
-        if user_id in user_games:
-            await query.edit_message_text(
-                "❌ You already have an active game! Finish it first.",
-                parse_mode=ParseMode.HTML
-            )
-            return
-        
-        balance = user_balances[user_id]
-        
-        if balance < 1:
-            await query.edit_message_text(
-                "❌ Insufficient balance! Use /deposit to add Stars.\n"
-                f"Your balance: <b>{balance} ⭐</b>",
-                parse_mode=ParseMode.HTML
-            )
-            return
-        
-        context.user_data['game_type'] = game_type
-        context.user_data['is_demo'] = False
-        
-        game_info = GAME_TYPES[game_type]
-        keyboard = [
-            [
-                InlineKeyboardButton("10 ⭐", callback_data=f"bet_{game_type}_10"),
-                InlineKeyboardButton("25 ⭐", callback_data=f"bet_{game_type}_25"),
-            ],
-            [
-                InlineKeyboardButton("50 ⭐", callback_data=f"bet_{game_type}_50"),
-                InlineKeyboardButton("100 ⭐", callback_data=f"bet_{game_type}_100"),
-            ],
-            [
-                InlineKeyboardButton("◀️ Back to Games", callback_data="show_games"),
-            ]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+    if (query.message.chat_id, user_id) in user_games:
+        await query.edit_message_text(
+            "❌ You already have an active game! Finish it first.",
+            parse_mode=ParseMode.HTML
+        )
+        return
+    
+    balance = user_balances[user_id]
+    
+    if balance < 1:
         await query.edit_message_text(
-            f"{game_info['icon']} <b>{game_info['name']} Game</b>\n\n"
-            f"💰 Choose your bet:\n"
+            "❌ Insufficient balance! Use /deposit to add Stars.\n"
             f"Your balance: <b>{balance} ⭐</b>",
-            reply_markup=reply_markup,
             parse_mode=ParseMode.HTML
         )
+        return
+    
+    context.user_data['game_type'] = game_type
+    context.user_data['is_demo'] = False
+    
+    game_info = GAMES[game_type]
+    keyboard = option_rows(inline_button, 'bet', game_info, game_info.bets, bet_label) + [
+        [
+            InlineKeyboardButton("◀️ Back to Games", callback_data="show_games"),
+        ]
+    ]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    await query.edit_message_text(
+        f"{game_info.icon} <b>{game_info.name} Game</b>\n\n"
+        f"💰 Choose your bet:\n"
+        f"Your balance: <b>{balance} ⭐</b>",
+        reply_markup=reply_markup,
+        parse_mode=ParseMode.HTML
+    )
 
 async def dice_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await start_game_command(update, context, 'dice')
@@ -588,24 +749,13 @@ async def demo_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_html("❌ This command is only for administrators.")
         return
     
-    if user_id in user_games:
+    if (update.effective_chat.id, user_id) in user_games:
         await update.message.reply_html(
             "❌ You already have an active game! Finish it first."
         )
         return
     
-    keyboard = [
-        [
-            InlineKeyboardButton("🎲 Dice", callback_data="demo_game_dice"),
-            InlineKeyboardButton("🎳 Bowl", callback_data="demo_game_bowl"),
-        ],
-        [
-            InlineKeyboardButton("🎯 Arrow", callback_data="demo_game_arrow"),
-            InlineKeyboardButton("🥅 Football", callback_data="demo_game_football"),
-        ],
-        [
-            InlineKeyboardButton("🏀 Basketball", callback_data="demo_game_basket"),
-        ],
+    keyboard = game_menu_rows(inline_button, 'demo_game') + [
         [
             InlineKeyboardButton("Cancel ❌", callback_data="cancel_game"),
         ]
@@ -647,34 +797,21 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     try:
         if data == "show_games":
-            keyboard = [
-                [
-                    InlineKeyboardButton("🎲 Dice", callback_data="play_game_dice"),
-                    InlineKeyboardButton("🎳 Bowling", callback_data="play_game_bowl"),
-                ],
-                [
-                    InlineKeyboardButton("🎯 Darts", callback_data="play_game_arrow"),
-                    InlineKeyboardButton("⚽ Football", callback_data="play_game_football"),
-                ],
-                [
-                    InlineKeyboardButton("🏀 Basketball", callback_data="play_game_basket"),
-                ]
-            ]
+            keyboard = game_menu_rows(inline_button, 'play_game')
             reply_markup = InlineKeyboardMarkup(keyboard)
             await query.edit_message_text(
-                "🎮 <b>Select a game to play:</b>\n\n"
-                "🎲 <b>Dice</b> - Roll the dice and beat the bot!\n"
-                "🎳 <b>Bowling</b> - Strike your way to victory!\n"
-                "🎯 <b>Darts</b> - Aim for the bullseye!\n"
-                "⚽ <b>Football</b> - Score goals and win!\n"
-                "🏀 <b>Basketball</b> - Shoot hoops for stars!",
+                GAME_MENU_TEXT,
                 reply_markup=reply_markup,
                 parse_mode=ParseMode.HTML
             )
             return
         
         if data.startswith("play_game_"):
-            game_type = data.replace("play_game_", "")
+            choice = GAMES.parse_callback(data)
+            if choice is None:
+                return
+            _, game_info, _ = choice
+            game_type = game_info.key
             await start_game_from_callback(query, context, game_type)
             return
         
@@ -705,12 +842,12 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 context.user_data['withdraw_state'] = None
                 return
             
-            user_balances[user_id] -= stars_amount
+            user_balances.debit(user_id, stars_amount, 'withdraw')
             
             withdrawal_counter += 1
             exchange_id = withdrawal_counter
             
-            ton_amount = round(stars_amount * STARS_TO_TON, 8)
+            ton_amount = stars_converter.ton(stars_amount)
             transaction_id = generate_transaction_id()
             
             now = datetime.now()
@@ -788,27 +925,22 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 await query.answer("❌ Admin only!", show_alert=True)
                 return
             
-            game_type = data.split("_")[2]
+            choice = GAMES.parse_callback(data)
+            if choice is None:
+                return
+            _, game_info, _ = choice
+            game_type = game_info.key
             context.user_data['game_type'] = game_type
             context.user_data['is_demo'] = True
             
-            game_info = GAME_TYPES[game_type]
-            keyboard = [
-                [
-                    InlineKeyboardButton("10 ⭐", callback_data=f"demo_bet_{game_type}_10"),
-                    InlineKeyboardButton("25 ⭐", callback_data=f"demo_bet_{game_type}_25"),
-                ],
-                [
-                    InlineKeyboardButton("50 ⭐", callback_data=f"demo_bet_{game_type}_50"),
-                    InlineKeyboardButton("100 ⭐", callback_data=f"demo_bet_{game_type}_100"),
-                ],
+            keyboard = option_rows(inline_button, 'demo_bet', game_info, game_info.bets, bet_label) + [
                 [
                     InlineKeyboardButton("Back ◀️", callback_data="back_to_demo_menu"),
                 ]
             ]
             reply_markup = InlineKeyboardMarkup(keyboard)
             await query.edit_message_text(
-                f"🎮 <b>DEMO: {game_info['name']}</b> 🔑\n\n"
+                f"🎮 <b>DEMO: {game_info.name}</b> 🔑\n\n"
                 f"💰 Choose demo bet:\n"
                 f"(No Stars will be deducted)",
                 reply_markup=reply_markup,
@@ -817,18 +949,7 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return
         
         if data == "back_to_demo_menu":
-            keyboard = [
-                [
-                    InlineKeyboardButton("🎲 Dice", callback_data="demo_game_dice"),
-                    InlineKeyboardButton("🎳 Bowl", callback_data="demo_game_bowl"),
-                ],
-                [
-                    InlineKeyboardButton("🎯 Arrow", callback_data="demo_game_arrow"),
-                    InlineKeyboardButton("🥅 Football", callback_data="demo_game_football"),
-                ],
-                [
-                    InlineKeyboardButton("🏀 Basketball", callback_data="demo_game_basket"),
-                ],
+            keyboard = game_menu_rows(inline_button, 'demo_game') + [
                 [
                     InlineKeyboardButton("Cancel ❌", callback_data="cancel_game"),
                 ]
@@ -848,30 +969,24 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 await query.answer("❌ Admin only!", show_alert=True)
                 return
             
-            parts = data.split("_")
-            game_type = parts[2]
-            bet_amount = int(parts[3])
+            choice = GAMES.parse_callback(data)
+            if choice is None:
+                return
+            _, game_info, bet_amount = choice
+            game_type = game_info.key
             
             context.user_data['bet_amount'] = bet_amount
             context.user_data['game_type'] = game_type
             context.user_data['is_demo'] = True
             
-            game_info = GAME_TYPES[game_type]
-            keyboard = [
-                [
-                    InlineKeyboardButton("1 Round", callback_data=f"rounds_{game_type}_1"),
-                    InlineKeyboardButton("2 Rounds", callback_data=f"rounds_{game_type}_2"),
-                ],
-                [
-                    InlineKeyboardButton("3 Rounds", callback_data=f"rounds_{game_type}_3"),
-                ],
+            keyboard = option_rows(inline_button, 'rounds', game_info, game_info.rounds, rounds_label) + [
                 [
                     InlineKeyboardButton("Back ◀️", callback_data=f"demo_game_{game_type}"),
                 ]
             ]
             reply_markup = InlineKeyboardMarkup(keyboard)
             await query.edit_message_text(
-                f"{game_info['icon']} <b>Select rounds:</b> 🔑\n"
+                f"{game_info.icon} <b>Select rounds:</b> 🔑\n"
                 f"Demo Bet: <b>{bet_amount} ⭐</b>",
                 reply_markup=reply_markup,
                 parse_mode=ParseMode.HTML
@@ -879,9 +994,11 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return
         
         if data.startswith("bet_"):
-            parts = data.split("_")
-            game_type = parts[1]
-            bet_amount = int(parts[2])
+            choice = GAMES.parse_callback(data)
+            if choice is None:
+                return
+            _, game_info, bet_amount = choice
+            game_type = game_info.key
             balance = user_balances[user_id]
             
             if balance < bet_amount:
@@ -894,22 +1011,14 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             context.user_data['game_type'] = game_type
             context.user_data['is_demo'] = False
             
-            game_info = GAME_TYPES[game_type]
-            keyboard = [
-                [
-                    InlineKeyboardButton("1 Round", callback_data=f"rounds_{game_type}_1"),
-                    InlineKeyboardButton("2 Rounds", callback_data=f"rounds_{game_type}_2"),
-                ],
-                [
-                    InlineKeyboardButton("3 Rounds", callback_data=f"rounds_{game_type}_3"),
-                ],
+            keyboard = option_rows(inline_button, 'rounds', game_info, game_info.rounds, rounds_label) + [
                 [
                     InlineKeyboardButton("Back ◀️", callback_data=f"back_to_bet_{game_type}"),
                 ]
             ]
             reply_markup = InlineKeyboardMarkup(keyboard)
             await query.edit_message_text(
-                f"{game_info['icon']} <b>Select number of rounds:</b>\n"
+                f"{game_info.icon} <b>Select number of rounds:</b>\n"
                 f"Bet: <b>{bet_amount} ⭐</b>",
                 reply_markup=reply_markup,
                 parse_mode=ParseMode.HTML
@@ -917,26 +1026,21 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return
         
         if data.startswith("back_to_bet_"):
-            game_type = data.split("_")[3]
+            choice = GAMES.parse_callback(data)
+            if choice is None:
+                return
+            _, game_info, _ = choice
+            game_type = game_info.key
             balance = user_balances[user_id]
             
-            game_info = GAME_TYPES[game_type]
-            keyboard = [
-                [
-                    InlineKeyboardButton("10 ⭐", callback_data=f"bet_{game_type}_10"),
-                    InlineKeyboardButton("25 ⭐", callback_data=f"bet_{game_type}_25"),
-                ],
-                [
-                    InlineKeyboardButton("50 ⭐", callback_data=f"bet_{game_type}_50"),
-                    InlineKeyboardButton("100 ⭐", callback_data=f"bet_{game_type}_100"),
-                ],
+            keyboard = option_rows(inline_button, 'bet', game_info, game_info.bets, bet_label) + [
                 [
                     InlineKeyboardButton("◀️ Back to Games", callback_data="show_games"),
                 ]
             ]
             reply_markup = InlineKeyboardMarkup(keyboard)
             await query.edit_message_text(
-                f"{game_info['icon']} <b>{game_info['name']} Game</b>\n\n"
+                f"{game_info.icon} <b>{game_info.name} Game</b>\n\n"
                 f"💰 Choose your bet:\n"
                 f"Your balance: <b>{balance} ⭐</b>",
                 reply_markup=reply_markup,
@@ -945,21 +1049,15 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return
         
         if data.startswith("rounds_"):
-            parts = data.split("_")
-            game_type = parts[1]
-            rounds = int(parts[2])
+            choice = GAMES.parse_callback(data)
+            if choice is None:
+                return
+            _, game_info, rounds = choice
+            game_type = game_info.key
             
             context.user_data['rounds'] = rounds
             
-            game_info = GAME_TYPES[game_type]
-            keyboard = [
-                [
-                    InlineKeyboardButton("1 Throw", callback_data=f"throws_{game_type}_1"),
-                    InlineKeyboardButton("2 Throws", callback_data=f"throws_{game_type}_2"),
-                ],
-                [
-                    InlineKeyboardButton("3 Throws", callback_data=f"throws_{game_type}_3"),
-                ],
+            keyboard = option_rows(inline_button, 'throws', game_info, game_info.throws, throws_label) + [
                 [
                     InlineKeyboardButton("Back ◀️", callback_data=f"bet_{game_type}_{context.user_data.get('bet_amount', 10)}"),
                 ]
@@ -970,7 +1068,7 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             demo_tag = " 🔑" if is_demo else ""
             
             await query.edit_message_text(
-                f"{game_info['icon']} <b>Select throws per round:</b>{demo_tag}\n"
+                f"{game_info.icon} <b>Select throws per round:</b>{demo_tag}\n"
                 f"Rounds: <b>{rounds}</b>",
                 reply_markup=reply_markup,
                 parse_mode=ParseMode.HTML
@@ -978,14 +1076,26 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return
         
         if data.startswith("throws_"):
-            parts = data.split("_")
-            game_type = parts[1]
-            throws = int(parts[2])
+            choice = GAMES.parse_callback(data)
+            if choice is None:
+                return
+            _, game_info, throws = choice
+            game_type = game_info.key
             
             bet_amount = context.user_data.get('bet_amount', 10)
             rounds = context.user_data.get('rounds', 1)
             is_demo = context.user_data.get('is_demo', False)
             
+            # Same guards as the userbot's throws action, so a running game is never overwritten unrefunded
+            if (query.message.chat_id, user_id) in user_games:
+                await query.edit_message_text("❌ You already have an active game in this chat!")
+                return
+            if user_games.count_for(user_id) >= MAX_GAMES_PER_USER:
+                await query.edit_message_text(
+                    f"❌ You already have {MAX_GAMES_PER_USER} games running. Finish one first."
+                )
+                return
+            
             if not is_demo:
                 balance = user_balances[user_id]
                 if balance < bet_amount:
@@ -993,7 +1103,7 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
                         "❌ Insufficient balance! Use /deposit to add Stars."
                     )
                     return
-                user_balances[user_id] -= bet_amount
+                user_balances.debit(user_id, bet_amount, 'bet')
             
             game = Game(
                 user_id=user_id,
@@ -1001,32 +1111,42 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 bet_amount=bet_amount,
                 rounds=rounds,
                 throw_count=throws,
-                game_type=game_type
+                game_type=game_type,
+                chat_id=query.message.chat_id
             )
             game.is_demo = is_demo
-            user_games[user_id] = game
+            game_expiry.add(game.key, game)
             
-            game_info = GAME_TYPES[game_type]
             demo_tag = " 🔑 DEMO" if is_demo else ""
             
             await query.edit_message_text(
-                f"{game_info['icon']} <b>Game Started!{demo_tag}</b>\n\n"
+                f"{game_info.icon} <b>Game Started!{demo_tag}</b>\n\n"
                 f"💰 Bet: <b>{bet_amount} ⭐</b>\n"
                 f"🔄 Rounds: <b>{rounds}</b>\n"
                 f"🎯 Throws per round: <b>{throws}</b>\n\n"
-                f"Send {throws}x {game_info['emoji']} to play Round 1!",
+                f"Send {throws}x {game_info.emoji} to play Round 1 or tap Auto-play!",
+                reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("⚡ Auto-play", callback_data="autoplay")]]),
                 parse_mode=ParseMode.HTML
             )
             return
         
         if data == "cancel_game":
-            if user_id in user_games:
-                del user_games[user_id]
+            game_expiry.cancel((query.message.chat_id, user_id))
             await query.edit_message_text(
                 "❌ Game cancelled.",
                 parse_mode=ParseMode.HTML
             )
             return
+        
+        if data == "autoplay":
+            key = (query.message.chat_id, user_id)
+            game = user_games.get(key)
+            if game is None or not game.at_round_start:
+                await query.message.reply_text("❌ Auto-play is only available between rounds.")
+                return
+            await query.edit_message_reply_markup(reply_markup=None)
+            game_actors.submit(key, autoplay_bot_game(user_id, game, query.message))
+            return
             
     except Exception as e:
         logger.error(f"Button callback error: {e}")
@@ -1035,94 +1155,139 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             parse_mode=ParseMode.HTML
         )
 
-async def handle_game_emoji(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user_id = update.effective_user.id
+async def autoplay_bot_game(user_id, game, message):
+    """Throw every remaining round for both sides at once and settle the game in one reply"""
+    emoji = GAMES[game.game_type].emoji
+    count = (game.total_rounds - game.current_round) * game.throw_count
+    
+    try:
+        throws = await round_dispatch.send_throws(
+            message.chat_id,
+            lambda: message.reply_dice(emoji=emoji),
+            2 * count
+        )
+    except Exception as e:
+        # Nothing was recorded yet, so the game is left as it was
+        logger.error(f"Auto-play throws failed in chat {game.chat_id}: {e}")
+        await message.reply_html(
+            f"⚠️ Auto-play could not throw the dice. "
+            f"Send {game.throw_count}x {emoji} to play Round {game.current_round + 1}!"
+        )
+        return
+    values = [throw.dice.value for throw in throws]
     
-    if user_id not in user_games:
+    if user_games.get(game.key) is not game or not game.at_round_start:
         return
     
-    game = user_games[user_id]
-    game_info = GAME_TYPES[game.game_type]
-    emoji = game_info['emoji']
+    outcomes = play_rounds(game, values[0::2], values[1::2])
+    game_checkpoints.mark_dirty(game.key)
+    # The finished game is on disk before its payout, so a restart never plays it again
+    await sync_finished_game(game)
+    apply_settlement(user_id, game, outcomes[-1].settlement)
+    game_expiry.complete(game.key)
     
-    message = update.message
-    if not message.dice:
+    await round_dispatch.wait_animation(message.chat_id, emoji)
+    await message.reply_html(format_autoplay(game, outcomes))
+
+async def play_bot_round(user_id, game, message):
+    """Bot throws and round result for a completed round, run off the update handler"""
+    emoji = GAMES[game.game_type].emoji
+    
+    try:
+        bot_msgs = await round_dispatch.send_throws(
+            message.chat_id,
+            lambda: message.reply_dice(emoji=emoji),
+            game.throw_count
+        )
+    except Exception as e:
+        # Reopen the round: the player throws it again, so their next dice stay in step
+        logger.error(f"Bot throws failed in chat {game.chat_id}: {e}")
+        if reopen_failed_round(game):
+            await message.reply_html(
+                f"⚠️ The bot's dice did not go through. "
+                f"Send {game.throw_count}x {emoji} again for Round {game.current_round + 1}!"
+            )
         return
+    bot_values = [bot_msg.dice.value for bot_msg in bot_msgs]
     
-    if message.dice.emoji != emoji:
+    if user_games.get(game.key) is not game:
         return
     
-    user_value = message.dice.value
-    game.user_results.append(user_value)
+    outcome = play_round(game, bot_values)
+    game_checkpoints.mark_dirty(game.key)
+    if outcome.finished:
+        # On disk as finished before it is paid, and dropped before any message goes out
+        await sync_finished_game(game)
+        apply_settlement(user_id, game, outcome.settlement)
+        game_expiry.complete(game.key)
+    user_round_total, bot_round_total = outcome.user_total, outcome.bot_total
     
-    if len(game.user_results) % game.throw_count == 0:
-        await asyncio.sleep(0.5)
-        
-        bot_results = []
-        for _ in range(game.throw_count):
-            bot_msg = await message.reply_dice(emoji=emoji)
-            bot_results.append(bot_msg.dice.value)
-            await asyncio.sleep(0.3)
-        
-        game.bot_results.extend(bot_results)
-        
-        round_start = (game.current_round) * game.throw_count
-        user_round_total = sum(game.user_results[round_start:round_start + game.throw_count])
-        bot_round_total = sum(bot_results)
-        
-        game.current_round += 1
-        
-        if user_round_total > bot_round_total:
-            game.user_score += 1
-            round_result = "✅ You won this round!"
-        elif bot_round_total > user_round_total:
-            game.bot_score += 1
-            round_result = "❌ Bot won this round!"
+    if outcome.winner == PLAYER:
+        round_result = "✅ You won this round!"
+    elif outcome.winner == BOT:
+        round_result = "❌ Bot won this round!"
+    else:
+        round_result = "🤝 This round is a tie!"
+    
+    await round_dispatch.wait_animation(message.chat_id, emoji)
+    
+    if not outcome.finished:
+        await message.reply_html(
+            f"<b>Round {game.current_round} Results:</b>\n\n"
+            f"👤 Your total: <b>{user_round_total}</b>\n"
+            f"🤖 Bot total: <b>{bot_round_total}</b>\n\n"
+            f"{round_result}\n\n"
+            f"📊 Score: You <b>{game.user_score}</b> - <b>{game.bot_score}</b> Bot\n\n"
+            f"Send {game.throw_count}x {emoji} for Round {game.current_round + 1}!"
+        )
+    else:
+        demo_tag = " (DEMO)" if game.is_demo else ""
+        
+        settlement = outcome.settlement
+        if settlement.winner == PLAYER:
+            winnings = settlement.payout
+            result_text = f"🎉 <b>YOU WON!{demo_tag}</b> 🎉\n\n💰 Winnings: <b>{winnings} ⭐</b>"
+        elif settlement.winner == BOT:
+            result_text = f"😔 <b>You lost!{demo_tag}</b>\n\n💸 Lost: <b>{game.bet_amount} ⭐</b>"
         else:
-            round_result = "🤝 This round is a tie!"
+            result_text = f"🤝 <b>It's a tie!{demo_tag}</b>\n\n💰 Bet returned: <b>{game.bet_amount} ⭐</b>"
         
-        await asyncio.sleep(2)
+        balance = user_balances[user_id]
         
-        if game.current_round < game.total_rounds:
-            await message.reply_html(
-                f"<b>Round {game.current_round} Results:</b>\n\n"
-                f"👤 Your total: <b>{user_round_total}</b>\n"
-                f"🤖 Bot total: <b>{bot_round_total}</b>\n\n"
-                f"{round_result}\n\n"
-                f"📊 Score: You <b>{game.user_score}</b> - <b>{game.bot_score}</b> Bot\n\n"
-                f"Send {game.throw_count}x {emoji} for Round {game.current_round + 1}!"
-            )
-        else:
-            demo_tag = " (DEMO)" if game.is_demo else ""
-            
-            if game.user_score > game.bot_score:
-                winnings = game.bet_amount * 2
-                if not game.is_demo:
-                    user_balances[user_id] += winnings
-                    update_game_stats(user_id, game.game_type, game.bet_amount, winnings, True)
-                result_text = f"🎉 <b>YOU WON!{demo_tag}</b> 🎉\n\n💰 Winnings: <b>{winnings} ⭐</b>"
-            elif game.bot_score > game.user_score:
-                if not game.is_demo:
-                    update_game_stats(user_id, game.game_type, game.bet_amount, 0, False)
-                result_text = f"😔 <b>You lost!{demo_tag}</b>\n\n💸 Lost: <b>{game.bet_amount} ⭐</b>"
-            else:
-                if not game.is_demo:
-                    user_balances[user_id] += game.bet_amount
-                result_text = f"🤝 <b>It's a tie!{demo_tag}</b>\n\n💰 Bet returned: <b>{game.bet_amount} ⭐</b>"
-            
-            balance = user_balances[user_id]
-            
-            await message.reply_html(
-                f"<b>Final Round Results:</b>\n\n"
-                f"👤 Your total: <b>{user_round_total}</b>\n"
-                f"🤖 Bot total: <b>{bot_round_total}</b>\n\n"
-                f"{round_result}\n\n"
-                f"📊 Final Score: You <b>{game.user_score}</b> - <b>{game.bot_score}</b> Bot\n\n"
-                f"{result_text}\n\n"
-                f"💰 Balance: <b>{balance} ⭐</b>"
-            )
-            
-            del user_games[user_id]
+        await message.reply_html(
+            f"<b>Final Round Results:</b>\n\n"
+            f"👤 Your total: <b>{user_round_total}</b>\n"
+            f"🤖 Bot total: <b>{bot_round_total}</b>\n\n"
+            f"{round_result}\n\n"
+            f"📊 Final Score: You <b>{game.user_score}</b> - <b>{game.bot_score}</b> Bot\n\n"
+            f"{result_text}\n\n"
+            f"💰 Balance: <b>{balance} ⭐</b>"
+        )
+
+async def process_game_emoji(user_id, key, message):
+    """Record a player throw on the game's actor, behind any bot round still in flight"""
+    game = user_games.get(key)
+    if game is None:
+        return
+    
+    game_expiry.touch(key)
+    if message.dice.emoji != GAMES[game.game_type].emoji:
+        return
+    
+    round_complete = game.add_user_throw(message.dice.value)
+    game_checkpoints.mark_dirty(key)
+    if round_complete:
+        await play_bot_round(user_id, game, message)
+
+async def handle_game_emoji(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.effective_user.id
+    key = (update.effective_chat.id, user_id)
+    
+    message = update.message
+    if key not in user_games or not message.dice:
+        return
+    
+    game_actors.submit(key, process_game_emoji(user_id, key, message))
 
 async def handle_text_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
@@ -1177,7 +1342,7 @@ async def handle_text_message(update: Update, context: ContextTypes.DEFAULT_TYPE
             context.user_data['withdraw_amount'] = amount
             context.user_data['withdraw_state'] = 'waiting_address'
             
-            ton_amount = round(amount * STARS_TO_TON, 8)
+            ton_amount = stars_converter.ton(amount)
             
             await update.message.reply_html(
                 f"💎 <b>Withdrawal Amount:</b> {amount} ⭐\n"
@@ -1199,7 +1364,7 @@ async def handle_text_message(update: Update, context: ContextTypes.DEFAULT_TYPE
         context.user_data['withdraw_address'] = text
         
         stars_amount = context.user_data.get('withdraw_amount', 0)
-        ton_amount = round(stars_amount * STARS_TO_TON, 8)
+        ton_amount = stars_converter.ton(stars_amount)
         
         keyboard = [
             [
@@ -1228,7 +1393,7 @@ async def successful_payment(update: Update, context: ContextTypes.DEFAULT_TYPE)
     payment = update.message.successful_payment
     
     amount = payment.total_amount
-    user_balances[user_id] += amount
+    user_balances.credit(user_id, amount, 'deposit')
     
     await update.message.reply_html(
         f"✅ <b>Payment successful!</b>\n\n"
@@ -1251,7 +1416,7 @@ async def setup_userbot():
         # Create userbot client
         userbot = TelegramClient(USERBOT_SESSION, USERBOT_API_ID, USERBOT_API_HASH)
         
-        @userbot.on(events.NewMessage(pattern=r'^/(dice|dart|bowl|football|basket)$'))
+        @userbot.on(events.NewMessage(pattern=GAMES.command_pattern))
         async def handle_group_command(event):
             """Handle game commands in groups"""
             try:
@@ -1260,17 +1425,16 @@ async def setup_userbot():
                     return
                 
                 command = event.raw_text.lower()
-                game_type = COMMAND_TO_GAME.get(command)
+                game_info = GAMES.by_command(command)
                 
-                if not game_type:
+                if not game_info:
                     return
-                
-                game_info = GAME_TYPES[game_type]
+                game_type = game_info.key
                 
                 # Send notification that command was detected
                 await event.respond(
-                    f"🎮 <b>{game_info['name']} Game Detected!</b>\n\n"
-                    f"Someone wants to play {game_info['icon']} {game_info['name']}!\n"
+                    f"🎮 <b>{game_info.name} Game Detected!</b>\n\n"
+                    f"Someone wants to play {game_info.icon} {game_info.name}!\n"
                     f"Start a private chat with @{(await userbot.get_me()).username or 'the bot'} to play!",
                     parse_mode='html'
                 )
@@ -1282,7 +1446,7 @@ async def setup_userbot():
         
         await userbot.start()
         logger.info("✅ Userbot started successfully and listening for game commands in groups!")
-        logger.info("Listening for: /dice, /dart, /bowl, /football, /basket")
+        logger.info(f"Listening for: {', '.join(spec.command for spec in GAMES.values())}")
         
         return userbot
         
@@ -1333,43 +1497,39 @@ async def profile_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return
             
         balance = user_balances[user_id]
-        balance_usd = balance * STARS_TO_USD
+        balance_usd = stars_converter.usd(balance)
         
-        rank_level = get_user_rank(profile['xp'])
-        rank_info = get_rank_info(rank_level)
+        rank = rank_table.lookup(profile['xp'])
         
-        if rank_level < 20:
-            next_rank_info = get_rank_info(rank_level + 1)
-            xp_progress = profile['xp'] - rank_info['xp_required']
-            xp_needed = next_rank_info['xp_required'] - rank_info['xp_required']
-            progress_bar = create_progress_bar(xp_progress, xp_needed)
-            rank_display = f"{rank_info['emoji']} {rank_info['name']} (Lvl {rank_level})\n{progress_bar} {profile['xp']}/{next_rank_info['xp_required']} XP"
+        if not rank.is_max:
+            progress_bar = create_progress_bar(profile['xp'] - rank.xp_required, rank.span)
+            rank_display = f"{rank.emoji} {rank.name} (Lvl {rank.level})\n{progress_bar} {profile['xp']}/{rank.next_xp} XP"
         else:
-            rank_display = f"{rank_info['emoji']} {rank_info['name']} (MAX LEVEL)\n🌌 {profile['xp']} XP"
+            rank_display = f"{rank.emoji} {rank.name} (MAX LEVEL)\n🌌 {profile['xp']} XP"
         
         fav_game = profile.get('favorite_game')
-        if fav_game and fav_game in GAME_TYPES:
-            fav_game_display = f"{GAME_TYPES[fav_game]['icon']} {GAME_TYPES[fav_game]['name']}"
+        if fav_game and fav_game in GAMES:
+            fav_game_display = f"{GAMES[fav_game].icon} {GAMES[fav_game].name}"
         else:
             fav_game_display = "None yet"
         
         biggest_win = profile.get('biggest_win', 0)
-        biggest_win_display = f"${biggest_win * STARS_TO_USD:.2f}" if biggest_win > 0 else "$0.00"
+        biggest_win_display = f"${stars_converter.usd(biggest_win)}" if biggest_win > 0 else "$0.00"
         
         reg_date = profile.get('registration_date', datetime.now())
         reg_date_str = reg_date.strftime("%Y-%m-%d %H:%M")
         
-        total_bets_usd = profile.get('total_bets', 0) * STARS_TO_USD
-        total_wins_usd = profile.get('total_wins', 0) * STARS_TO_USD
+        total_bets_usd = stars_converter.usd(profile.get('total_bets', 0))
+        total_wins_usd = stars_converter.usd(profile.get('total_wins', 0))
         
         profile_text = (
             f"📢 <b>Profile</b>\n\n"
             f"ℹ️ User ID: <code>{user_id}</code>\n"
             f"⬆️ Rank: {rank_display}\n"
-            f"💵 Balance: ${balance_usd:.2f}\n\n"
+            f"💵 Balance: ${balance_usd}\n\n"
             f"⚡️ Total games: {profile.get('total_games', 0)}\n"
-            f"Total bets: ${total_bets_usd:.2f}\n"
-            f"Total wins: ${total_wins_usd:.2f}\n\n"
+            f"Total bets: ${total_bets_usd}\n"
+            f"Total wins: ${total_wins_usd}\n\n"
             f"🎲 Favorite game: {fav_game_display}\n"
             f"🎉 Biggest win: {biggest_win_display}\n\n"
             f"🕒 Registration date: {reg_date_str}"
@@ -1392,7 +1552,7 @@ async def history_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await update.message.reply_html("❌ Error loading history.")
             return
             
-        history = user_game_history.get(user_id, [])
+        history = user_game_history.recent(user_id)
         
         total_games = profile.get('total_games', 0)
         total_bets = profile.get('total_bets', 0)
@@ -1403,10 +1563,10 @@ async def history_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
         net_profit = total_wins - total_losses
         
-        total_bets_usd = total_bets * STARS_TO_USD
-        total_wins_usd = total_wins * STARS_TO_USD
-        total_losses_usd = total_losses * STARS_TO_USD
-        net_profit_usd = net_profit * STARS_TO_USD
+        total_bets_usd = stars_converter.usd(total_bets)
+        total_wins_usd = stars_converter.usd(total_wins)
+        total_losses_usd = stars_converter.usd(total_losses)
+        net_profit_usd = stars_converter.usd(net_profit)
         
         win_rate = (games_won / total_games) * 100 if total_games > 0 else 0
         
@@ -1417,22 +1577,21 @@ async def history_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             f"❌ Games Lost: {games_lost}\n"
             f"📈 Win Rate: {win_rate:.1f}%\n\n"
             f"💰 <b>Financial Summary:</b>\n"
-            f"💵 Total Bets: ${total_bets_usd:.2f}\n"
-            f"🏆 Total Wins: ${total_wins_usd:.2f}\n"
-            f"📉 Total Losses: ${total_losses_usd:.2f}\n"
-            f"{'📈' if net_profit >= 0 else '📉'} Net Profit: ${net_profit_usd:.2f}\n"
+            f"💵 Total Bets: ${total_bets_usd}\n"
+            f"🏆 Total Wins: ${total_wins_usd}\n"
+            f"📉 Total Losses: ${total_losses_usd}\n"
+            f"{'📈' if net_profit >= 0 else '📉'} Net Profit: ${net_profit_usd}\n"
         )
         
         if history:
             history_text += "\n📜 <b>Recent Games:</b>\n"
-            recent_games = history[-5:]
-            for game in reversed(recent_games):
-                game_type = game['game_type']
-                game_info = GAME_TYPES.get(game_type, {'icon': '🎮', 'name': 'Unknown'})
-                status = "✅ Won" if game['won'] else "❌ Lost"
-                bet_usd = game['bet_amount'] * STARS_TO_USD
-                timestamp = game['timestamp'].strftime("%m/%d %H:%M")
-                history_text += f"{game_info['icon']} {game_info['name']} - {status} (${bet_usd:.2f}) - {timestamp}\n"
+            for game in history:
+                game_type = game.game_type
+                game_info = GAMES.get(game_type, UNKNOWN_GAME)
+                status = "✅ Won" if game.won else "❌ Lost"
+                bet_usd = stars_converter.usd(game.bet_amount)
+                timestamp = game.timestamp.strftime("%m/%d %H:%M")
+                history_text += f"{game_info.icon} {game_info.name} - {status} (${bet_usd}) - {timestamp}\n"
         
         await update.message.reply_html(history_text)
         
@@ -1489,8 +1648,6 @@ async def handle_payment_request(update: Update, context: ContextTypes.DEFAULT_T
             await query.edit_message_text("❌ Payment request expired or invalid.")
             return
         
-        request_data = pending_payment_requests[request_id]
-        
         # Send invoice
         title = f"Deposit {amount} Stars"
         description = f"Add {amount} ⭐ to your game balance"
@@ -1539,7 +1696,7 @@ async def successful_payment(update: Update, context: ContextTypes.DEFAULT_TYPE)
         payment = update.message.successful_payment
         
         amount = payment.total_amount
-        user_balances[user_id] += amount
+        user_balances.credit(user_id, amount, 'deposit')
         
         # Check if this was from a userbot request
         payload = payment.invoice_payload
@@ -1560,21 +1717,10 @@ async def successful_payment(update: Update, context: ContextTypes.DEFAULT_TYPE)
         
         # Notify userbot if this was a group payment request
         if request_id and request_id in pending_payment_requests:
-            request_data = pending_payment_requests[request_id]
-            chat_id = request_data.get('chat_id')
-            original_message_id = request_data.get('message_id')
-            
-            # Store success for userbot to check
-            request_data['payment_success'] = True
-            request_data['new_balance'] = user_balances[user_id]
-            
-            # Clean up old request after 60 seconds
-            async def cleanup():
-                await asyncio.sleep(60)
-                if request_id in pending_payment_requests:
-                    del pending_payment_requests[request_id]
+            # Wake the userbot waiting on this request
+            payment_waiters.resolve(request_id, user_balances[user_id])
             
-            asyncio.create_task(cleanup())
+            payment_expiry.complete(request_id)
         
     except Exception as e:
         logger.error(f"Error in successful payment: {e}")
@@ -1605,7 +1751,7 @@ async def handle_text_message(update: Update, context: ContextTypes.DEFAULT_TYPE
                 context.user_data['withdraw_amount'] = amount
                 context.user_data['withdraw_state'] = 'waiting_address'
                 
-                ton_amount = round(amount * STARS_TO_TON, 8)
+                ton_amount = stars_converter.ton(amount)
                 
                 await update.message.reply_html(
                     f"💎 <b>Withdrawal Amount:</b> {amount} ⭐\n"
@@ -1627,7 +1773,7 @@ async def handle_text_message(update: Update, context: ContextTypes.DEFAULT_TYPE
             context.user_data['withdraw_address'] = text
             
             stars_amount = context.user_data.get('withdraw_amount', 0)
-            ton_amount = round(stars_amount * STARS_TO_TON, 8)
+            ton_amount = stars_converter.ton(stars_amount)
             
             keyboard = [
                 [
@@ -1692,11 +1838,11 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 context.user_data['withdraw_state'] = None
                 return
             
-            user_balances[user_id] -= stars_amount
+            user_balances.debit(user_id, stars_amount, 'withdraw')
             withdrawal_counter += 1
             exchange_id = withdrawal_counter
             
-            ton_amount = round(stars_amount * STARS_TO_TON, 8)
+            ton_amount = stars_converter.ton(stars_amount)
             transaction_id = generate_transaction_id()
             
             now = datetime.now()
@@ -1765,10 +1911,14 @@ async def setup_userbot(bot_username):
     
     try:
         from telethon import TelegramClient, events, Button
+        from telethon.tl.types import InputMediaDice
         from telethon.tl.custom import Message
         
-        # Create userbot client
-        userbot = TelegramClient(USERBOT_SESSION, int(USERBOT_API_ID), USERBOT_API_HASH)
+        # One client per session; each group chat is served by the session it hashes to
+        userbot = UserbotPool(
+            [TelegramClient(session, int(USERBOT_API_ID), USERBOT_API_HASH) for session in USERBOT_SESSIONS],
+            USERBOT_SESSIONS
+        )
         
         # Store bot reference
         userbot.bot_username = bot_username
@@ -1787,16 +1937,16 @@ async def setup_userbot(bot_username):
                 request_id = generate_payment_request_id()
                 
                 # Store request data
-                pending_payment_requests[request_id] = {
+                payment_expiry.add(request_id, {
                     'user_id': user_id,
                     'chat_id': chat_id,
                     'message_id': event.id,
                     'timestamp': datetime.now()
-                }
+                })
                 
                 # Get current balance
                 balance = user_balances[user_id]
-                balance_usd = balance * STARS_TO_USD
+                balance_usd = stars_converter.usd(balance)
                 
                 # Create inline menu
                 keyboard = [
@@ -1816,7 +1966,7 @@ async def setup_userbot(bot_username):
                 
                 deposit_text = (
                     f"💳 <b>Deposit Stars</b>\n\n"
-                    f"💰 Current Balance: <b>{balance} ⭐</b> (${balance_usd:.2f})\n\n"
+                    f"💰 Current Balance: <b>{balance} ⭐</b> (${balance_usd})\n\n"
                     f"Select amount to deposit:"
                 )
                 
@@ -1833,20 +1983,9 @@ async def setup_userbot(bot_username):
                 logger.error(f"Error handling deposit command: {e}")
                 await event.respond("❌ An error occurred. Please try again.")
         
-        @userbot.on(events.CallbackQuery(pattern=r'^udeposit_'))
-        async def handle_deposit_callback(event):
+        async def handle_deposit_callback(event, request_id, amount):
             """Handle deposit amount selection"""
             try:
-                data = event.data.decode('utf-8')
-                parts = data.split("_")
-                
-                if len(parts) < 3:
-                    await event.answer("❌ Invalid request")
-                    return
-                
-                request_id = parts[1]
-                amount = int(parts[2])
-                
                 if request_id not in pending_payment_requests:
                     await event.answer("❌ Request expired", alert=True)
                     return
@@ -1869,6 +2008,9 @@ async def setup_userbot(bot_username):
                     parse_mode='html'
                 )
                 
+                # Register before the link goes out so an early payment is not missed
+                payment_done = payment_waiters.expect(request_id)
+                
                 # Create payment button for bot
                 payment_keyboard = [[
                     Button.url(
@@ -1914,23 +2056,21 @@ async def setup_userbot(bot_username):
                 
                 logger.info(f"Payment request forwarded for {amount} stars to user {user_id}")
                 
-                # Monitor payment completion
-                async def check_payment():
-                    for _ in range(60):  # Check for 60 seconds
-                        await asyncio.sleep(1)
-                        if request_data.get('payment_success'):
-                            new_balance = request_data.get('new_balance', user_balances[user_id])
-                            await userbot.send_message(
-                                request_data['chat_id'],
-                                f"✅ <b>Payment Successful!</b>\n\n"
-                                f"User: {user_id}\n"
-                                f"Amount: {amount} ⭐\n"
-                                f"New Balance: {new_balance} ⭐",
-                                parse_mode='html'
-                            )
-                            break
-                
-                asyncio.create_task(check_payment())
+                # Announce the deposit once successful_payment resolves it (None on timeout)
+                async def announce_payment():
+                    new_balance = await payment_done
+                    if new_balance is None:
+                        return
+                    await userbot.send_message(
+                        request_data['chat_id'],
+                        f"✅ <b>Payment Successful!</b>\n\n"
+                        f"User: {user_id}\n"
+                        f"Amount: {amount} ⭐\n"
+                        f"New Balance: {new_balance} ⭐",
+                        parse_mode='html'
+                    )
+                
+                run_in_background(announce_payment(), 'announce_payment')
                 
             except Exception as e:
                 logger.error(f"Error in deposit callback: {e}")
@@ -1939,8 +2079,7 @@ async def setup_userbot(bot_username):
                 except:
                     pass
         
-        @userbot.on(events.NewMessage(pattern=r'^/(dice|dart|bowl|football|basket)$'))
-        async def handle_game_command(event):
+        async def process_game_command(event):
             """Handle game commands in groups"""
             try:
                 if not event.is_group:
@@ -1948,21 +2087,31 @@ async def setup_userbot(bot_username):
                 
                 user_id = event.sender_id
                 chat_id = event.chat_id
-                username = event.sender.username or event.sender.first_name or "Player"
+                username = display_names.for_event(event)
                 
                 # Check if user already has active game
-                if user_id in user_games:
+                if (chat_id, user_id) in user_games:
                     await event.respond(
-                        "❌ You already have an active game! Finish it first.",
+                        "❌ You already have an active game in this chat! Finish it first.",
                         reply_to=event.id
                     )
                     return
                 
+                if user_games.count_for(user_id) >= MAX_GAMES_PER_USER:
+                    await event.respond(
+                        f"❌ You already have {MAX_GAMES_PER_USER} games running "
+                        f"(<b>{user_games.at_stake(user_id)} ⭐</b> in play). Finish one first.",
+                        reply_to=event.id,
+                        parse_mode='html'
+                    )
+                    return
+                
                 command = event.raw_text.lower()
-                game_type = COMMAND_TO_GAME.get(command)
+                game_info = GAMES.by_command(command)
                 
-                if not game_type:
+                if not game_info:
                     return
+                game_type = game_info.key
                 
                 # Get or create profile
                 get_or_create_profile(user_id, username)
@@ -1978,25 +2127,15 @@ async def setup_userbot(bot_username):
                     )
                     return
                 
-                game_info = GAME_TYPES[game_type]
-                
                 # Create bet selection keyboard
-                keyboard = [
-                    [
-                        Button.inline("10 ⭐", f"bet_{game_type}_10"),
-                        Button.inline("25 ⭐", f"bet_{game_type}_25"),
-                    ],
-                    [
-                        Button.inline("50 ⭐", f"bet_{game_type}_50"),
-                        Button.inline("100 ⭐", f"bet_{game_type}_100"),
-                    ],
+                keyboard = option_rows(Button.inline, 'bet', game_info, game_info.bets, bet_label) + [
                     [
                         Button.inline("❌ Cancel", "cancel_game"),
                     ]
                 ]
                 
                 msg = await event.respond(
-                    f"{game_info['icon']} <b>{game_info['name']} Game</b>\n\n"
+                    f"{game_info.icon} <b>{game_info.name} Game</b>\n\n"
                     f"💰 Choose your bet:\n"
                     f"Your balance: <b>{balance} ⭐</b>",
                     buttons=keyboard,
@@ -2005,15 +2144,7 @@ async def setup_userbot(bot_username):
                 )
                 
                 # Store game setup context
-                if not hasattr(userbot, 'game_contexts'):
-                    userbot.game_contexts = {}
-                
-                userbot.game_contexts[user_id] = {
-                    'chat_id': chat_id,
-                    'game_type': game_type,
-                    'message_id': msg.id,
-                    'username': username
-                }
+                context_expiry.add((chat_id, user_id), GameSetup(chat_id, game_type, msg.id, username))
                 
                 logger.info(f"Game {game_type} initiated by user {user_id} in chat {chat_id}")
                 
@@ -2021,30 +2152,42 @@ async def setup_userbot(bot_username):
                 logger.error(f"Error handling game command: {e}")
                 await event.respond("❌ An error occurred. Please try again.")
         
-        @userbot.on(events.CallbackQuery)
-        async def handle_game_callback(event):
+        @userbot.on(events.NewMessage(pattern=GAMES.command_pattern))
+        async def handle_game_command(event):
+            """Queue the command on the sender's actor for this chat"""
+            game_actors.submit((event.chat_id, event.sender_id), process_game_command(event))
+        
+        async def process_game_callback(event, action, game_info=None, value=None):
             """Handle game setup callbacks"""
             try:
-                data = event.data.decode('utf-8')
                 user_id = event.sender_id
+                key = (event.chat_id, user_id)
                 
-                if not hasattr(userbot, 'game_contexts'):
-                    userbot.game_contexts = {}
-                
-                context = userbot.game_contexts.get(user_id, {})
+                context = context_expiry.touch(key)
                 
-                if data == "cancel_game":
-                    if user_id in user_games:
-                        del user_games[user_id]
-                    if user_id in userbot.game_contexts:
-                        del userbot.game_contexts[user_id]
+                if action == "cancel_game":
+                    game_expiry.cancel(key)
+                    context_expiry.cancel(key)
                     await event.edit("❌ Game cancelled.", parse_mode='html')
                     return
                 
-                if data.startswith("bet_"):
-                    parts = data.split("_")
-                    game_type = parts[1]
-                    bet_amount = int(parts[2])
+                if action == "autoplay":
+                    game = user_games.get(key)
+                    if game is None or not game.at_round_start:
+                        await event.answer("❌ Auto-play is only available between rounds", alert=True)
+                        return
+                    await event.answer("⚡ Auto-playing")
+                    await event.edit(buttons=None)
+                    await autoplay_userbot_game(user_id, game)
+                    return
+                
+                if context is None:
+                    await event.answer("⌛ This menu has expired, send the game command again", alert=True)
+                    return
+                
+                if action == "bet":
+                    bet_amount = value
+                    game_type = game_info.key
                     
                     balance = user_balances[user_id]
                     if balance < bet_amount:
@@ -2053,71 +2196,65 @@ async def setup_userbot(bot_username):
                     
                     await event.answer()
                     
-                    context['bet_amount'] = bet_amount
-                    context['game_type'] = game_type
+                    context.bet_amount = bet_amount
+                    context.game_type = game_type
                     
-                    game_info = GAME_TYPES[game_type]
-                    keyboard = [
-                        [
-                            Button.inline("1 Round", f"rounds_{game_type}_1"),
-                            Button.inline("2 Rounds", f"rounds_{game_type}_2"),
-                        ],
-                        [
-                            Button.inline("3 Rounds", f"rounds_{game_type}_3"),
-                        ],
+                    keyboard = option_rows(Button.inline, 'rounds', game_info, game_info.rounds, rounds_label) + [
                         [
                             Button.inline("◀️ Back", f"back_bet_{game_type}"),
                         ]
                     ]
                     
                     await event.edit(
-                        f"{game_info['icon']} <b>Select number of rounds:</b>\n"
+                        f"{game_info.icon} <b>Select number of rounds:</b>\n"
                         f"Bet: <b>{bet_amount} ⭐</b>",
                         buttons=keyboard,
                         parse_mode='html'
                     )
                     return
                 
-                if data.startswith("rounds_"):
-                    parts = data.split("_")
-                    game_type = parts[1]
-                    rounds = int(parts[2])
+                if action == "rounds":
+                    rounds = value
+                    game_type = game_info.key
                     
                     await event.answer()
                     
-                    context['rounds'] = rounds
+                    context.rounds = rounds
                     
-                    game_info = GAME_TYPES[game_type]
-                    keyboard = [
+                    keyboard = option_rows(Button.inline, 'throws', game_info, game_info.throws, throws_label) + [
                         [
-                            Button.inline("1 Throw", f"throws_{game_type}_1"),
-                            Button.inline("2 Throws", f"throws_{game_type}_2"),
-                        ],
-                        [
-                            Button.inline("3 Throws", f"throws_{game_type}_3"),
-                        ],
-                        [
-                            Button.inline("◀️ Back", f"bet_{game_type}_{context.get('bet_amount', 10)}"),
+                            Button.inline("◀️ Back", f"bet_{game_type}_{context.bet_amount}"),
                         ]
                     ]
                     
                     await event.edit(
-                        f"{game_info['icon']} <b>Select throws per round:</b>\n"
+                        f"{game_info.icon} <b>Select throws per round:</b>\n"
                         f"Rounds: <b>{rounds}</b>",
                         buttons=keyboard,
                         parse_mode='html'
                     )
                     return
                 
-                if data.startswith("throws_"):
-                    parts = data.split("_")
-                    game_type = parts[1]
-                    throws = int(parts[2])
+                if action == "throws":
+                    if key in user_games:
+                        await event.answer("❌ You already have an active game in this chat!", alert=True)
+                        return
+                    
+                    # Checked again here: setups opened side by side all passed the command's check
+                    if user_games.count_for(user_id) >= MAX_GAMES_PER_USER:
+                        await event.answer(
+                            f"❌ You already have {MAX_GAMES_PER_USER} games running. Finish one first.",
+                            alert=True
+                        )
+                        return
+                    
+                    throws = value
+                    game_type = game_info.key
                     
-                    bet_amount = context.get('bet_amount', 10)
-                    rounds = context.get('rounds', 1)
-                    username = context.get('username', 'Player')
-                    chat_id = context.get('chat_id')
+                    bet_amount = context.bet_amount
+                    rounds = context.rounds
+                    username = context.username
+                    chat_id = event.chat_id
                     
                     balance = user_balances[user_id]
                     if balance < bet_amount:
@@ -2125,7 +2262,7 @@ async def setup_userbot(bot_username):
                         return
                     
                     # Deduct bet amount
-                    user_balances[user_id] -= bet_amount
+                    user_balances.debit(user_id, bet_amount, 'bet')
                     
                     # Create game
                     game = Game(
@@ -2137,43 +2274,34 @@ async def setup_userbot(bot_username):
                         game_type=game_type,
                         chat_id=chat_id
                     )
-                    user_games[user_id] = game
-                    
-                    game_info = GAME_TYPES[game_type]
+                    game_expiry.add(game.key, game)
+                    context_expiry.complete(key)
                     
                     await event.edit(
-                        f"{game_info['icon']} <b>Game Started!</b>\n\n"
+                        f"{game_info.icon} <b>Game Started!</b>\n\n"
                         f"💰 Bet: <b>{bet_amount} ⭐</b>\n"
                         f"🔄 Rounds: <b>{rounds}</b>\n"
                         f"🎯 Throws per round: <b>{throws}</b>\n\n"
-                        f"Send {throws}x {game_info['emoji']} to play Round 1!",
+                        f"Send {throws}x {game_info.emoji} to play Round 1 or tap Auto-play!",
+                        buttons=[[Button.inline("⚡ Auto-play", "autoplay")]],
                         parse_mode='html'
                     )
                     
                     logger.info(f"Game started: {game_type} for user {user_id}")
                     return
                 
-                if data.startswith("back_bet_"):
-                    game_type = data.split("_")[2]
+                if action == "back_bet":
+                    game_type = game_info.key
                     balance = user_balances[user_id]
                     
-                    game_info = GAME_TYPES[game_type]
-                    keyboard = [
-                        [
-                            Button.inline("10 ⭐", f"bet_{game_type}_10"),
-                            Button.inline("25 ⭐", f"bet_{game_type}_25"),
-                        ],
-                        [
-                            Button.inline("50 ⭐", f"bet_{game_type}_50"),
-                            Button.inline("100 ⭐", f"bet_{game_type}_100"),
-                        ],
+                    keyboard = option_rows(Button.inline, 'bet', game_info, game_info.bets, bet_label) + [
                         [
                             Button.inline("❌ Cancel", "cancel_game"),
                         ]
                     ]
                     
                     await event.edit(
-                        f"{game_info['icon']} <b>{game_info['name']} Game</b>\n\n"
+                        f"{game_info.icon} <b>{game_info.name} Game</b>\n\n"
                         f"💰 Choose your bet:\n"
                         f"Your balance: <b>{balance} ⭐</b>",
                         buttons=keyboard,
@@ -2188,105 +2316,453 @@ async def setup_userbot(bot_username):
                 except:
                     pass
         
-        @userbot.on(events.NewMessage)
-        async def handle_game_dice(event):
+        async def handle_game_callback(event, action, game_info=None, value=None):
+            """Queue the callback on the sender's actor for this chat"""
+            game_actors.submit(
+                (event.chat_id, event.sender_id), process_game_callback(event, action, game_info, value)
+            )
+        
+        async def autoplay_userbot_game(user_id, game):
+            """Throw every remaining round for both sides at once and settle with one message"""
+            emoji = GAMES[game.game_type].emoji
+            count = (game.total_rounds - game.current_round) * game.throw_count
+            
+            try:
+                throws = await round_dispatch.send_throws(
+                    game.chat_id,
+                    lambda: userbot.send_message(game.chat_id, file=InputMediaDice(emoji)),
+                    2 * count
+                )
+            except Exception as e:
+                # Nothing was recorded yet, so the game is left as it was
+                logger.error(f"Auto-play throws failed in chat {game.chat_id}: {e}")
+                await userbot.send_message(
+                    game.chat_id,
+                    f"⚠️ Auto-play could not throw the dice. "
+                    f"Send {game.throw_count}x {emoji} to play Round {game.current_round + 1}!"
+                )
+                return
+            values = [throw.media.value for throw in throws]
+            
+            if user_games.get(game.key) is not game or not game.at_round_start:
+                return
+            
+            outcomes = play_rounds(game, values[0::2], values[1::2])
+            game_checkpoints.mark_dirty(game.key)
+            # The finished game is on disk before its payout, so a restart never plays it again
+            await sync_finished_game(game)
+            apply_settlement(user_id, game, outcomes[-1].settlement)
+            game_expiry.complete(game.key)
+            
+            await round_dispatch.wait_animation(game.chat_id, emoji)
+            await userbot.send_message(game.chat_id, format_autoplay(game, outcomes), parse_mode='html')
+        
+        async def play_userbot_round(user_id, game):
+            """Bot throws and round result for a completed round, run off the dice handler"""
+            game_info = GAMES[game.game_type]
+            emoji = game_info.emoji
+            
+            try:
+                throws = await round_dispatch.send_throws(
+                    game.chat_id,
+                    lambda: userbot.send_message(game.chat_id, file=InputMediaDice(game_info.emoji)),
+                    game.throw_count
+                )
+            except Exception as e:
+                # Reopen the round: the player throws it again, so their next dice stay in step
+                logger.error(f"Bot throws failed in chat {game.chat_id}: {e}")
+                if reopen_failed_round(game):
+                    await userbot.send_message(
+                        game.chat_id,
+                        f"⚠️ The bot's dice did not go through. "
+                        f"Send {game.throw_count}x {game_info.emoji} again for Round {game.current_round + 1}!"
+                    )
+                return
+            bot_values = [throw.media.value for throw in throws]
+            
+            if user_games.get(game.key) is not game:
+                return
+            
+            outcome = play_round(game, bot_values)
+            game_checkpoints.mark_dirty(game.key)
+            if outcome.finished:
+                # On disk as finished before it is paid, and dropped before any message goes out
+                await sync_finished_game(game)
+                apply_settlement(user_id, game, outcome.settlement)
+                game_expiry.complete(game.key)
+            user_round_total, bot_round_total = outcome.user_total, outcome.bot_total
+            
+            if outcome.winner == PLAYER:
+                round_result = "✅ You won this round!"
+            elif outcome.winner == BOT:
+                round_result = "❌ Bot won this round!"
+            else:
+                round_result = "🤝 This round is a tie!"
+            
+            await round_dispatch.wait_animation(game.chat_id, emoji)
+            
+            if not outcome.finished:
+                await userbot.send_message(
+                    game.chat_id,
+                    f"<b>Round {game.current_round} Results:</b>\n\n"
+                    f"👤 Your total: <b>{user_round_total}</b>\n"
+                    f"🤖 Bot total: <b>{bot_round_total}</b>\n\n"
+                    f"{round_result}\n\n"
+                    f"📊 Score: You <b>{game.user_score}</b> - <b>{game.bot_score}</b> Bot\n\n"
+                    f"Send {game.throw_count}x {emoji} for Round {game.current_round + 1}!",
+                    parse_mode='html'
+                )
+            else:
+                settlement = outcome.settlement
+                if settlement.winner == PLAYER:
+                    winnings = settlement.payout
+                    result_text = f"🎉 <b>YOU WON!</b> 🎉\n\n💰 Winnings: <b>{winnings} ⭐</b>"
+                elif settlement.winner == BOT:
+                    result_text = f"😔 <b>You lost!</b>\n\n💸 Lost: <b>{game.bet_amount} ⭐</b>"
+                else:
+                    result_text = f"🤝 <b>It's a tie!</b>\n\n💰 Bet returned: <b>{game.bet_amount} ⭐</b>"
+                
+                balance = user_balances[user_id]
+                
+                await userbot.send_message(
+                    game.chat_id,
+                    f"<b>Final Round Results:</b>\n\n"
+                    f"👤 Your total: <b>{user_round_total}</b>\n"
+                    f"🤖 Bot total: <b>{bot_round_total}</b>\n\n"
+                    f"{round_result}\n\n"
+                    f"📊 Final Score: You <b>{game.user_score}</b> - <b>{game.bot_score}</b> Bot\n\n"
+                    f"{result_text}\n\n"
+                    f"💰 Balance: <b>{balance} ⭐</b>",
+                    parse_mode='html'
+                )
+        
+        async def process_game_dice(event):
             """Handle dice/game emoji messages"""
             try:
                 user_id = event.sender_id
+                key = (event.chat_id, user_id)
                 
-                if user_id not in user_games:
+                game = user_games.get(key)
+                if game is None or not event.dice:
                     return
                 
-                if not event.dice:
-                    return
-                
-                game = user_games[user_id]
-                game_info = GAME_TYPES[game.game_type]
-                emoji = game_info['emoji']
+                game_expiry.touch(key)
+                game_info = GAMES[game.game_type]
+                emoji = game_info.emoji
                 
                 if event.dice.emoticon != emoji:
                     return
                 
                 user_value = event.dice.value
-                game.user_results.append(user_value)
-                
-                if len(game.user_results) % game.throw_count == 0:
-                    await asyncio.sleep(0.5)
-                    
-                    bot_results = []
-                    for _ in range(game.throw_count):
-                        bot_msg = await userbot.send_message(
-                            game.chat_id,
-                            file=event.dice
-                        )
-                        # Note: We can't get bot dice value in userbot, so we'll simulate
-                        bot_results.append(random.randint(1, game_info['max_value']))
-                        await asyncio.sleep(0.3)
-                    
-                    game.bot_results.extend(bot_results)
-                    
-                    round_start = (game.current_round) * game.throw_count
-                    user_round_total = sum(game.user_results[round_start:round_start + game.throw_count])
-                    bot_round_total = sum(bot_results)
-                    
-                    game.current_round += 1
-                    
-                    if user_round_total > bot_round_total:
-                        game.user_score += 1
-                        round_result = "✅ You won this round!"
-                    elif bot_round_total > user_round_total:
-                        game.bot_score += 1
-                        round_result = "❌ Bot won this round!"
-                    else:
-                        round_result = "🤝 This round is a tie!"
-                    
-                    await asyncio.sleep(2)
-                    
-                    if game.current_round < game.total_rounds:
-                        await userbot.send_message(
-                            game.chat_id,
-                            f"<b>Round {game.current_round} Results:</b>\n\n"
-                            f"👤 Your total: <b>{user_round_total}</b>\n"
-                            f"🤖 Bot total: <b>{bot_round_total}</b>\n\n"
-                            f"{round_result}\n\n"
-                            f"📊 Score: You <b>{game.user_score}</b> - <b>{game.bot_score}</b> Bot\n\n"
-                            f"Send {game.throw_count}x {emoji} for Round {game.current_round + 1}!",
-                            parse_mode='html'
-                        )
-                    else:
-                        if game.user_score > game.bot_score:
-                            winnings = game.bet_amount * 2
-                            user_balances[user_id] += winnings
-                            update_game_stats(user_id, game.game_type, game.bet_amount, winnings, True)
-                            result_text = f"🎉 <b>YOU WON!</b> 🎉\n\n💰 Winnings: <b>{winnings} ⭐</b>"
-                        elif game.bot_score > game.user_score:
-                            update_game_stats(user_id, game.game_type, game.bet_amount, 0, False)
-                            result_text = f"😔 <b>You lost!</b>\n\n💸 Lost: <b>{game.bet_amount} ⭐</b>"
-                        else:
-                            user_balances[user_id] += game.bet_amount
-                            result_text = f"🤝 <b>It's a tie!</b>\n\n💰 Bet returned: <b>{game.bet_amount} ⭐</b>"
-                        
-                        balance = user_balances[user_id]
-                        
-                        await userbot.send_message(
-                            game.chat_id,
-                            f"<b>Final Round Results:</b>\n\n"
-                            f"👤 Your total: <b>{user_round_total}</b>\n"
-                            f"🤖 Bot total: <b>{bot_round_total}</b>\n\n"
-                            f"{round_result}\n\n"
-                            f"📊 Final Score: You <b>{game.user_score}</b> - <b>{game.bot_score}</b> Bot\n\n"
-                            f"{result_text}\n\n"
-                            f"💰 Balance: <b>{balance} ⭐</b>",
-                            parse_mode='html'
-                        )
-                        
-                        del user_games[user_id]
-                        if hasattr(userbot, 'game_contexts') and user_id in userbot.game_contexts:
-                            del userbot.game_contexts[user_id]
+                round_complete = game.add_user_throw(user_value)
+                game_checkpoints.mark_dirty(key)
+                if round_complete:
+                    await play_userbot_round(user_id, game)
                 
             except Exception as e:
                 logger.error(f"Error handling game dice: {e}")
         
+        table_buttons = [
+            [
+                Button.inline("🙋 Join", "table_join"),
+                Button.inline("▶️ Start", "table_start"),
+            ],
+            [
+                Button.inline("❌ Cancel", "table_cancel"),
+            ]
+        ]
+        
+        async def announce_table(table, result):
+            """Post what a table deadline did: play started, or the table was settled"""
+            try:
+                if result is None:
+                    await userbot.send_message(table.chat_id, format_table(table), parse_mode='html')
+                else:
+                    apply_table_result(result)
+                    await userbot.send_message(table.chat_id, format_table_result(result), parse_mode='html')
+            except Exception as e:
+                logger.error(f"Error announcing table in {table.chat_id}: {e}")
+        
+        # Deadlines fire on the timer wheel; the news goes out on the table's actor
+        table_engine.on_timeout = lambda table, result: game_actors.submit(
+            ('table', table.chat_id), announce_table(table, result)
+        )
+        
+        async def announce_expired_game(game):
+            """Tell the chat an idle game was dropped and its bet handed back"""
+            try:
+                game_info = GAMES[game.game_type]
+                await userbot.send_message(
+                    game.chat_id,
+                    f"⌛ <b>Game expired</b>\n\n"
+                    f"{game.username}'s {game_info.icon} {game_info.name} game sat idle too long.\n"
+                    f"💰 Bet returned: <b>{game.bet_amount} ⭐</b>",
+                    parse_mode='html'
+                )
+            except Exception as e:
+                logger.error(f"Error announcing expired game in {game.chat_id}: {e}")
+        
+        def expire_game(key, game):
+            refund_expired_game(game)
+            game_actors.submit(key, announce_expired_game(game))
+        
+        game_expiry.on_expire = expire_game
+        
+        async def process_table_command(event):
+            """Open a table in a group: /table [game] [stake]"""
+            try:
+                if not event.is_group:
+                    return
+                
+                user_id = event.sender_id
+                chat_id = event.chat_id
+                username = display_names.for_event(event)
+                
+                name, stake = event.pattern_match.group(1), event.pattern_match.group(2)
+                game_info = GAMES.by_command(f"/{name or 'dice'}")
+                if not game_info:
+                    await event.respond(
+                        f"Usage: /table [{GAME_CHOICES}] [stake]",
+                        reply_to=event.id
+                    )
+                    return
+                game_type = game_info.key
+                
+                if (chat_id, user_id) in user_games:
+                    await event.respond(
+                        "❌ You already have an active game in this chat! Finish it first.",
+                        reply_to=event.id
+                    )
+                    return
+                
+                get_or_create_profile(user_id, username)
+                
+                try:
+                    table = table_engine.open(
+                        chat_id, user_id, username, game_type, int(stake) if stake else TABLE_DEFAULT_STAKE
+                    )
+                except TableError as e:
+                    await event.respond(f"❌ {e}", reply_to=event.id)
+                    return
+                
+                await event.respond(format_table(table), buttons=table_buttons, reply_to=event.id, parse_mode='html')
+                logger.info(f"Table opened in {chat_id} by {user_id}: {game_type} at {table.stake} ⭐")
+                
+            except Exception as e:
+                logger.error(f"Error in table command: {e}")
+        
+        async def process_table_callback(event, action):
+            """Join, start or cancel the table in this chat"""
+            try:
+                user_id = event.sender_id
+                chat_id = event.chat_id
+                
+                try:
+                    if action == "join":
+                        if (chat_id, user_id) in user_games:
+                            raise TableError("Finish your game in this chat first")
+                        username = display_names.for_event(event)
+                        get_or_create_profile(user_id, username)
+                        table = table_engine.join(chat_id, user_id, username)
+                        await event.answer("✅ You joined the table")
+                        await event.edit(format_table(table), buttons=table_buttons, parse_mode='html')
+                    elif action == "start":
+                        table = table_engine.start(chat_id, user_id)
+                        await event.answer()
+                        await event.edit(format_table(table), parse_mode='html')
+                    elif action == "cancel":
+                        result = table_engine.cancel(chat_id, user_id)
+                        await event.answer("Table cancelled")
+                        await event.edit(format_table_result(result), parse_mode='html')
+                except TableError as e:
+                    await event.answer(f"❌ {e}", alert=True)
+                
+            except Exception as e:
+                logger.error(f"Error in table callback: {e}")
+        
+        async def process_table_dice(event):
+            """Record a seated player's throw and settle the table once everyone has thrown"""
+            try:
+                table = table_engine.get(event.chat_id)
+                if table is None or event.dice.emoticon != GAMES[table.game_type].emoji:
+                    return
+                
+                result = table_engine.throw(event.chat_id, event.sender_id, event.dice.value)
+                if result is None:
+                    return
+                
+                apply_table_result(result)
+                await round_dispatch.wait_animation(event.chat_id, event.dice.emoticon)
+                await userbot.send_message(event.chat_id, format_table_result(result), parse_mode='html')
+                
+            except Exception as e:
+                logger.error(f"Error handling table dice: {e}")
+        
+        @userbot.on(events.NewMessage(pattern=r'(?i)^/table(?:\s+(\w+))?(?:\s+(\d+))?$'))
+        async def handle_table_command(event):
+            """Queue table commands on the chat's table actor"""
+            game_actors.submit(('table', event.chat_id), process_table_command(event))
+        
+        async def handle_table_callback(event, action):
+            """Queue table buttons on the chat's table actor"""
+            game_actors.submit(('table', event.chat_id), process_table_callback(event, action))
+        
+        tournament_buttons = [
+            [
+                Button.inline("🙋 Join", "tourney_join"),
+                Button.inline("▶️ Start", "tourney_start"),
+            ],
+            [
+                Button.inline("❌ Cancel", "tourney_cancel"),
+            ]
+        ]
+        
+        async def announce_tournament(tournament, match):
+            """Post what a tournament deadline did: sign-up closed, or a match ran out of time"""
+            try:
+                if match is None:
+                    await userbot.send_message(tournament.chat_id, format_tournament(tournament), parse_mode='html')
+                else:
+                    apply_match_result(tournament, match)
+                    await userbot.send_message(tournament.chat_id, format_match_result(tournament, match), parse_mode='html')
+            except Exception as e:
+                logger.error(f"Error announcing tournament in {tournament.chat_id}: {e}")
+        
+        tournament_engine.on_timeout = lambda tournament, match: game_actors.submit(
+            ('tournament', tournament.chat_id), announce_tournament(tournament, match)
+        )
+        
+        async def process_tournament_command(event):
+            """Open a tournament in a group: /tournament [game] [entry fee]"""
+            try:
+                if not event.is_group:
+                    return
+                
+                user_id = event.sender_id
+                chat_id = event.chat_id
+                username = display_names.for_event(event)
+                
+                name, fee = event.pattern_match.group(1), event.pattern_match.group(2)
+                game_info = GAMES.by_command(f"/{name or 'dice'}")
+                if not game_info:
+                    await event.respond(
+                        f"Usage: /tournament [{GAME_CHOICES}] [entry fee]",
+                        reply_to=event.id
+                    )
+                    return
+                game_type = game_info.key
+                
+                get_or_create_profile(user_id, username)
+                
+                try:
+                    tournament = tournament_engine.open(chat_id, user_id, username, game_type, int(fee) if fee else 0)
+                except TournamentError as e:
+                    await event.respond(f"❌ {e}", reply_to=event.id)
+                    return
+                
+                await event.respond(
+                    format_tournament(tournament), buttons=tournament_buttons, reply_to=event.id, parse_mode='html'
+                )
+                logger.info(f"Tournament opened in {chat_id} by {user_id}: {game_type}, entry {tournament.entry_fee} ⭐")
+                
+            except Exception as e:
+                logger.error(f"Error in tournament command: {e}")
+        
+        async def process_tournament_callback(event, action):
+            """Join, start or cancel the tournament in this chat"""
+            try:
+                user_id = event.sender_id
+                chat_id = event.chat_id
+                
+                try:
+                    if action == "join":
+                        username = display_names.for_event(event)
+                        get_or_create_profile(user_id, username)
+                        tournament = tournament_engine.join(chat_id, user_id, username)
+                        await event.answer("✅ You are signed up")
+                        await event.edit(format_tournament(tournament), buttons=tournament_buttons, parse_mode='html')
+                    elif action == "start":
+                        tournament = tournament_engine.start(chat_id, user_id)
+                        await event.answer()
+                        await event.edit(format_tournament(tournament), parse_mode='html')
+                    elif action == "cancel":
+                        tournament = tournament_engine.cancel(chat_id, user_id)
+                        await event.answer("Tournament cancelled")
+                        await event.edit(format_tournament(tournament), parse_mode='html')
+                except TournamentError as e:
+                    await event.answer(f"❌ {e}", alert=True)
+                
+            except Exception as e:
+                logger.error(f"Error in tournament callback: {e}")
+        
+        async def process_tournament_dice(event):
+            """Record a throw in the player's current match and announce the match once decided"""
+            try:
+                tournament = tournament_engine.get(event.chat_id)
+                if tournament is None or event.dice.emoticon != GAMES[tournament.game_type].emoji:
+                    return
+                
+                match = tournament_engine.throw(event.chat_id, event.sender_id, event.dice.value)
+                if match is None:
+                    return
+                
+                apply_match_result(tournament, match)
+                await round_dispatch.wait_animation(event.chat_id, event.dice.emoticon)
+                await userbot.send_message(event.chat_id, format_match_result(tournament, match), parse_mode='html')
+                
+            except Exception as e:
+                logger.error(f"Error handling tournament dice: {e}")
+        
+        @userbot.on(events.NewMessage(pattern=r'(?i)^/tournament(?:\s+(\w+))?(?:\s+(\d+))?$'))
+        async def handle_tournament_command(event):
+            """Queue tournament commands on the chat's tournament actor"""
+            game_actors.submit(('tournament', event.chat_id), process_tournament_command(event))
+        
+        async def handle_tournament_callback(event, action):
+            """Queue tournament buttons on the chat's tournament actor"""
+            game_actors.submit(('tournament', event.chat_id), process_tournament_callback(event, action))
+        
+        # Every inline button goes through one handler; the router picks the route from the data prefix
+        for action in ('bet', 'rounds', 'throws', 'back_bet'):
+            callback_router.add(f"{action}_", handle_game_callback, partial(GAMES.parse_option, action))
+        for action in ('cancel_game', 'autoplay'):
+            callback_router.add(action, partial(handle_game_callback, action=action), exact=True)
+        callback_router.add('udeposit_', handle_deposit_callback, parse_deposit_callback)
+        for action in ('join', 'start', 'cancel'):
+            callback_router.add(f"table_{action}", partial(handle_table_callback, action=action), exact=True)
+            callback_router.add(f"tourney_{action}", partial(handle_tournament_callback, action=action), exact=True)
+        
+        @userbot.on(events.CallbackQuery)
+        async def handle_callback(event):
+            """Run the one handler routed for the button's data"""
+            route = callback_router.resolve(event.data)
+            if route is None:
+                # Answer anyway, or the client keeps the button spinning; stats() counts it as unmatched
+                await event.answer("❌ Unknown action")
+                return
+            handler, args = route
+            if args is None:
+                await event.answer("❌ This option is not available", alert=True)
+                return
+            await handler(event, *args)
+        
+        @userbot.on_each(dice_dispatch.events)
+        async def handle_game_dice(event):
+            """Queue throws on the player's game actor, or on the table or tournament actor of the chat"""
+            # A table or tournament throw is owed on a deadline, so a matching dice goes there first; a
+            # personal game in the same chat gets the player's dice once that one throw is in
+            chat_id, user_id = event.chat_id, event.sender_id
+            emoji = event.dice.emoticon
+            key = (chat_id, user_id)
+            table = table_engine.get(chat_id)
+            tournament = tournament_engine.get(chat_id)
+            if table_engine.expects_throw(chat_id, user_id) and emoji == GAMES[table.game_type].emoji:
+                game_actors.submit(('table', chat_id), process_table_dice(event))
+            elif tournament_engine.expects_throw(chat_id, user_id) and emoji == GAMES[tournament.game_type].emoji:
+                game_actors.submit(('tournament', chat_id), process_tournament_dice(event))
+            elif key in user_games:
+                game_actors.submit(key, process_game_dice(event))
+        
         await userbot.start()
         logger.info("✅ Userbot started successfully!")
         logger.info("🎮 Group gameplay enabled!")
@@ -2305,6 +2781,11 @@ async def setup_userbot(bot_username):
 def main():
     """Main function to run bot and userbot"""
     try:
+        user_balances.open()
+        user_profiles.open()
+        user_game_history.open()
+        game_checkpoints.open(lambda game: game_expiry.add(game.key, game))
+        
         # Create bot application
         application = Application.builder().token(BOT_TOKEN).build()
         
@@ -2326,6 +2807,12 @@ def main():
         # Start userbot in background
         async def post_init(app):
             try:
+                await user_balances.start()
+                await user_profiles.start()
+                await user_game_history.start()
+                await game_checkpoints.start()
+                await timer_wheel.start()
+                
                 bot_info = await app.bot.get_me()
                 bot_username = bot_info.username
                 logger.info(f"✅ Bot connected as @{bot_username}")
@@ -2339,7 +2826,35 @@ def main():
             except Exception as e:
                 logger.error(f"Error in post_init: {e}")
         
+        async def post_shutdown(app):
+            # Stop everything that can still move money (updates, queued jobs, timers) before any store closes
+            userbot = app.bot_data.get('userbot')
+            if userbot is not None:
+                await userbot.disconnect()
+            await game_actors.close()
+            await timer_wheel.close()
+            # Tables and tournaments are not checkpointed; hand every stake back before the balances close
+            for result in table_engine.refund_all():
+                logger.info(f"Refunded table in chat {result.table.chat_id} on shutdown")
+            logger.info(f"Tables: {table_engine.stats()}")
+            for tournament in tournament_engine.refund_all():
+                logger.info(f"Refunded tournament in chat {tournament.chat_id} on shutdown")
+            logger.info(f"Tournaments: {tournament_engine.stats()}")
+            await user_balances.close()
+            await user_profiles.close()
+            await user_game_history.close()
+            await game_checkpoints.close()
+            for tracker in (payment_expiry, context_expiry, game_expiry):
+                logger.info(f"Expiry {tracker.name}: {tracker.stats()}")
+            logger.info(f"Actors {game_actors.name}: {game_actors.stats()}")
+            logger.info(f"Dice dispatch: {dice_dispatch.stats()}")
+            logger.info(f"Callback router: {callback_router.stats()}")
+            logger.info(f"Display names: {display_names.stats()}")
+            if userbot is not None:
+                logger.info(f"Userbot pool: {userbot.stats()}")
+        
         application.post_init = post_init
+        application.post_shutdown = post_shutdown
         
         # Run bot
         logger.info("🚀 Starting polling...")
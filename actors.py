@@ -0,0 +1,88 @@
+"""Per-key actors: jobs for one key run one at a time, in arrival order."""
+import asyncio
+import collections
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ActorExecutor:
+    """Serializes coroutines per key without keeping a lock per key.
+
+    A key with pending work has one actor: a FIFO of jobs drained by a
+    single task. Jobs for different keys run concurrently; jobs for the same
+    key never interleave, so state owned by that key is only touched by one
+    job at a time. An actor's task exits and its entry is dropped as soon as
+    its queue runs empty, so only keys with work in flight cost anything.
+
+    ``submit`` from inside a job is fine and queues behind it. Once ``close``
+    has started, new work is refused with RuntimeError.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._queues = {}
+        self._tasks = {}
+        self._closed = False
+        self.spawned = 0
+        self.processed = 0
+        self.failed = 0
+        self.peak = 0
+
+    def __len__(self):
+        return len(self._queues)
+
+    def submit(self, key, coro):
+        """Queue ``coro`` on the key's actor and return at once; failures are logged"""
+        if self._closed:
+            coro.close()
+            raise RuntimeError(f"Actor executor {self.name} is closed")
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = collections.deque()
+            self._tasks[key] = asyncio.create_task(self._drain(key, queue))
+            self.spawned += 1
+            self.peak = max(self.peak, len(self._queues))
+        queue.append(coro)
+
+    async def _drain(self, key, queue):
+        try:
+            while queue:
+                coro = queue.popleft()
+                try:
+                    await coro
+                except Exception as e:
+                    self.failed += 1
+                    logger.error(f"Actor {self.name}[{key}] job failed: {e}")
+                self.processed += 1
+        finally:
+            # Nothing is awaited between the empty check and here, so no job can slip in
+            self._queues.pop(key, None)
+            self._tasks.pop(key, None)
+            self._discard(queue)
+
+    def _discard(self, queue):
+        while queue:
+            queue.popleft().close()
+
+    def stats(self):
+        return {
+            'active': len(self._queues),
+            'spawned': self.spawned,
+            'processed': self.processed,
+            'failed': self.failed,
+            'peak': self.peak,
+        }
+
+    async def close(self):
+        """Cancel every actor and drop the jobs still queued"""
+        self._closed = True
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # Actors cancelled before their first step never ran their cleanup
+        for queue in self._queues.values():
+            self._discard(queue)
+        self._queues.clear()
+        self._tasks.clear()
@@ -0,0 +1,335 @@
+"""Balance stores for the casino bots.
+
+Balances are integer Stars held in flat ``array('q')`` columns indexed by an
+account slot, so settlement is exact and an account costs 16 bytes plus its
+dict entry.
+
+``BalanceStore`` keeps balances in memory only. ``LedgerBalanceStore`` adds
+an append-only write-ahead ledger: every balance change is appended to an
+in-memory buffer and written out by a background task that fsyncs once per
+commit window (group commit), so handlers never wait on disk. Periodic
+snapshots let old ledger segments be dropped and keep recovery short.
+"""
+import asyncio
+import logging
+import os
+import struct
+import time
+from array import array
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+LEDGER_MAGIC = b'LDG2'
+SNAPSHOT_MAGIC = b'SNP2'
+
+# user_id, balance after the change, reason code
+LEDGER_RECORD = struct.Struct('<qqB')
+# magic, first ledger segment not covered by the snapshot, account count;
+# followed by the user id column and the balance column as raw int64 arrays
+SNAPSHOT_HEADER = struct.Struct('<4sQQ')
+
+REASONS = {
+    'set': 0,
+    'deposit': 1,
+    'bet': 2,
+    'payout': 3,
+    'refund': 4,
+    'withdraw': 5,
+}
+
+
+def _check_amount(amount):
+    if type(amount) is not int:
+        raise TypeError(f"Balances are integer Stars, got {amount!r}")
+
+
+class BalanceStore:
+    """In-memory integer balances keyed by user id; missing users read as 0"""
+
+    def __init__(self):
+        self._slots = {}
+        self._ids = array('q')
+        self._values = array('q')
+
+    def __getitem__(self, user_id):
+        slot = self._slots.get(user_id)
+        return 0 if slot is None else self._values[slot]
+
+    def __setitem__(self, user_id, value):
+        _check_amount(value)
+        self._set(user_id, value, 'set')
+
+    def __contains__(self, user_id):
+        return user_id in self._slots
+
+    def __len__(self):
+        return len(self._slots)
+
+    def get(self, user_id, default=0):
+        slot = self._slots.get(user_id)
+        return default if slot is None else self._values[slot]
+
+    def credit(self, user_id, amount, reason):
+        _check_amount(amount)
+        balance = self[user_id] + amount
+        self._set(user_id, balance, reason)
+        return balance
+
+    def debit(self, user_id, amount, reason):
+        _check_amount(amount)
+        return self.credit(user_id, -amount, reason)
+
+    def credit_many(self, credits, reason):
+        """Apply (user_id, amount) credits as one batch; every amount is checked before any is applied"""
+        credits = list(credits)
+        for _, amount in credits:
+            _check_amount(amount)
+        self._check_writable()
+        for user_id, amount in credits:
+            self._set(user_id, self[user_id] + amount, reason)
+
+    def _store(self, user_id, balance):
+        slot = self._slots.get(user_id)
+        if slot is None:
+            self._slots[user_id] = len(self._ids)
+            self._ids.append(user_id)
+            self._values.append(balance)
+        else:
+            self._values[slot] = balance
+
+    def _set(self, user_id, balance, reason):
+        self._store(user_id, balance)
+
+    def _check_writable(self):
+        pass
+
+    def open(self):
+        pass
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+
+class LedgerBalanceStore(BalanceStore):
+    """Balances backed by a write-ahead ledger plus periodic snapshots"""
+
+    def __init__(self, directory, flush_interval=0.005, snapshot_every=500000):
+        super().__init__()
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.snapshot_every = snapshot_every
+        self._pending = bytearray()
+        self._records_since_snapshot = 0
+        self._segment = 0
+        self._wal = None
+        self._lock_file = None
+        self._io_lock = None
+        self._wakeup = None
+        self._flusher = None
+        self._closing = False
+
+    def _segment_path(self, segment):
+        return os.path.join(self.directory, f"wal-{segment:08d}.log")
+
+    def _snapshot_path(self):
+        return os.path.join(self.directory, "snapshot.bin")
+
+    def _check_writable(self):
+        # A change accepted now would never reach the ledger
+        if self._closing or self._wal is None:
+            raise RuntimeError(f"Ledger {self.directory} is not open; balance change refused")
+
+    def _set(self, user_id, balance, reason):
+        self._check_writable()
+        self._store(user_id, balance)
+        self._pending += LEDGER_RECORD.pack(user_id, balance, REASONS[reason])
+        self._records_since_snapshot += 1
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def open(self):
+        """Recover balances from the snapshot and ledger tail, then open the ledger for appends"""
+        started = time.perf_counter()
+        os.makedirs(self.directory, exist_ok=True)
+
+        self._lock_file = open(os.path.join(self.directory, "LOCK"), 'w')
+        if fcntl is not None:
+            try:
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                raise RuntimeError(f"Ledger directory {self.directory} is in use by another process")
+
+        first_segment = 0
+        snapshot_path = self._snapshot_path()
+        if os.path.exists(snapshot_path):
+            with open(snapshot_path, 'rb') as f:
+                data = f.read()
+            magic, first_segment, count = SNAPSHOT_HEADER.unpack_from(data)
+            if magic != SNAPSHOT_MAGIC:
+                raise RuntimeError(f"Unrecognised snapshot file {snapshot_path}")
+            body = memoryview(data)[SNAPSHOT_HEADER.size:]
+            column = count * self._ids.itemsize
+            self._ids = array('q')
+            self._ids.frombytes(body[:column])
+            self._values = array('q')
+            self._values.frombytes(body[column:2 * column])
+            self._slots = dict(zip(self._ids, range(count)))
+
+        segments = sorted(
+            int(name[4:-4]) for name in os.listdir(self.directory)
+            if name.startswith('wal-') and name.endswith('.log')
+        )
+        replayed = 0
+        for segment in segments:
+            path = self._segment_path(segment)
+            if segment < first_segment:
+                os.remove(path)
+                continue
+            replayed += self._replay_segment(path)
+
+        self._segment = max(segments + [first_segment])
+        self._open_segment(self._segment)
+
+        logger.info(
+            f"Ledger recovered {len(self._slots)} accounts "
+            f"({replayed} ledger records) in {time.perf_counter() - started:.3f}s"
+        )
+
+    def _replay_segment(self, path):
+        with open(path, 'rb') as f:
+            data = f.read()
+        if not data.startswith(LEDGER_MAGIC):
+            raise RuntimeError(f"Unrecognised ledger segment {path}")
+        body = memoryview(data)[len(LEDGER_MAGIC):]
+        # A crash mid-write can leave a torn record at the end; it was never acknowledged
+        usable = len(body) - len(body) % LEDGER_RECORD.size
+        if usable != len(body):
+            logger.warning(f"Dropping torn ledger record at the end of {path}")
+            with open(path, 'r+b') as f:
+                f.truncate(len(LEDGER_MAGIC) + usable)
+        store = self._store
+        for user_id, balance, _ in LEDGER_RECORD.iter_unpack(body[:usable]):
+            store(user_id, balance)
+        return usable // LEDGER_RECORD.size
+
+    def _open_segment(self, segment):
+        path = self._segment_path(segment)
+        is_new = not os.path.exists(path)
+        self._wal = open(path, 'ab')
+        if is_new:
+            self._wal.write(LEDGER_MAGIC)
+            self._wal.flush()
+            os.fsync(self._wal.fileno())
+
+    def _write(self, data):
+        self._wal.write(data)
+        self._wal.flush()
+        os.fsync(self._wal.fileno())
+
+    def _rotate(self, data, segment):
+        if data:
+            self._write(data)
+        self._wal.close()
+        self._open_segment(segment)
+
+    def _write_snapshot(self, ids, values, segment):
+        path = self._snapshot_path()
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, segment, len(ids)))
+            ids.tofile(f)
+            values.tofile(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        for old in range(segment - 1, -1, -1):
+            old_path = self._segment_path(old)
+            if not os.path.exists(old_path):
+                break
+            os.remove(old_path)
+
+    async def start(self):
+        """Start the group-commit task; call from inside the running event loop"""
+        self._io_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        if self._pending:
+            self._wakeup.set()
+        self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        while not self._closing:
+            await self._wakeup.wait()
+            if self._closing:
+                break
+            # Let more writes join this commit before paying for the fsync
+            await asyncio.sleep(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                if self._records_since_snapshot >= self.snapshot_every:
+                    await self.snapshot()
+                else:
+                    await self.flush()
+            except Exception as e:
+                logger.error(f"Ledger flush failed: {e}")
+
+    async def flush(self):
+        """Write and fsync everything appended so far"""
+        async with self._io_lock:
+            if not self._pending:
+                return
+            data, self._pending = self._pending, bytearray()
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, self._write, data)
+            except Exception:
+                # Records hold absolute balances, so rewriting any that did reach the disk is harmless
+                self._pending[:0] = data
+                raise
+
+    async def snapshot(self):
+        """Write a snapshot of all balances and drop the ledger segments it covers"""
+        async with self._io_lock:
+            loop = asyncio.get_running_loop()
+            data, self._pending = self._pending, bytearray()
+            ids = array('q', self._ids)
+            values = array('q', self._values)
+            segment = self._segment + 1
+            records, self._records_since_snapshot = self._records_since_snapshot, 0
+            try:
+                await loop.run_in_executor(None, self._rotate, data, segment)
+            except Exception:
+                self._pending[:0] = data
+                self._records_since_snapshot += records
+                raise
+            self._segment = segment
+            try:
+                await loop.run_in_executor(None, self._write_snapshot, ids, values, segment)
+            except Exception:
+                self._records_since_snapshot += records
+                raise
+        logger.info(f"Ledger snapshot written: {len(ids)} accounts")
+
+    async def close(self):
+        if self._flusher is not None:
+            self._closing = True
+            self._wakeup.set()
+            await self._flusher
+            self._flusher = None
+        if self._io_lock is not None:
+            await self.flush()
+        elif self._pending and self._wal is not None:
+            self._write(bytes(self._pending))
+            self._pending = bytearray()
+        if self._wal is not None:
+            self._wal.close()
+            self._wal = None
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
@@ -0,0 +1,85 @@
+"""Checkpoint write and restore time for many active games.
+
+Writes a checkpoint log for ``count`` games at random points of play (plus
+a stream of updates and finished games, as the bot would), then times
+replaying it into a fresh table the way main() does.
+
+Run from the repository root: python benchmarks/checkpoint_restore.py [count]
+"""
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from checkpoints import GameCheckpoints
+from game_engine import play_round
+from games import GAME_KEYS, Game, GameTable
+
+
+def make_game(rng, user_id):
+    rounds, throw_count = rng.randint(1, 3), rng.randint(1, 3)
+    game = Game(user_id, f"player{user_id}", rng.choice((10, 25, 50, 100)), rounds, throw_count,
+                rng.choice(GAME_KEYS), chat_id=-1000000000000 - rng.randrange(1000))
+    for _ in range(rng.randrange(rounds * throw_count)):
+        if game.add_user_throw(rng.randint(1, 6)):
+            play_round(game, [rng.randint(1, 6) for _ in range(throw_count)])
+    return game
+
+
+async def write(path, count, rng):
+    table = GameTable()
+    checkpoints = GameCheckpoints(path, table)
+    checkpoints.open()
+    started = time.perf_counter()
+    for user_id in range(count):
+        game = make_game(rng, user_id)
+        table[game.key] = game
+        checkpoints.mark_dirty(game.key)
+    await checkpoints.flush()
+    # A second wave of throws and some finished games leaves dead records to skip
+    for key in rng.sample(list(table), count // 2):
+        if rng.random() < 0.2:
+            del table[key]
+        else:
+            table[key].add_user_throw(rng.randint(1, 6))
+        checkpoints.mark_dirty(key)
+    await checkpoints.flush()
+    elapsed = time.perf_counter() - started
+    await checkpoints.close()
+    return table, elapsed
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    rng = random.Random(15)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'games.ckpt')
+        table, write_elapsed = asyncio.run(write(path, count, rng))
+        size = os.path.getsize(path)
+        print(f"{count} games checkpointed ({len(table)} still active), "
+              f"log {size / 1e6:.1f} MB, written in {write_elapsed:.3f}s")
+
+        restored = GameTable()
+        checkpoints = GameCheckpoints(path, restored)
+        started = time.perf_counter()
+        checkpoints.open(lambda game: restored.__setitem__(game.key, game))
+        elapsed = time.perf_counter() - started
+        asyncio.run(checkpoints.close())
+
+        matches = all(
+            restored[key].user_results[:game.current_round * game.throw_count]
+            == game.user_results[:game.current_round * game.throw_count]
+            and restored[key].bot_score == game.bot_score
+            for key, game in table.items()
+        )
+        print(f"restored {len(restored)} games in {elapsed:.3f}s "
+              f"({elapsed / max(len(restored), 1) * 1e6:.2f} us/game), "
+              f"compacted log {os.path.getsize(path) / 1e6:.1f} MB, state matches: {matches}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""Throughput of the pure round-resolution engine.
+
+Plays complete games through games.Game and game_engine.play_round with
+pre-drawn throws, so only scoring and settlement are measured.
+
+Run from the repository root: python benchmarks/game_engine.py [games]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from game_engine import play_round
+from games import Game
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 300000
+    rng = random.Random(3)
+    shapes = [(rng.randint(1, 3), rng.randint(1, 3)) for _ in range(count)]
+    throws = [[rng.randint(1, 6) for _ in range(2 * rounds * throw_count)] for rounds, throw_count in shapes]
+
+    rounds_played = 0
+    payouts = 0
+    started = time.perf_counter()
+    for (rounds, throw_count), values in zip(shapes, throws):
+        game = Game(1, 'bench', 10, rounds, throw_count, 'dice')
+        user_values = values[:rounds * throw_count]
+        bot_values = values[rounds * throw_count:]
+        for round_index in range(rounds):
+            start = round_index * throw_count
+            for value in user_values[start:start + throw_count]:
+                game.add_user_throw(value)
+            outcome = play_round(game, bot_values[start:start + throw_count])
+        rounds_played += rounds
+        payouts += outcome.settlement.payout
+    elapsed = time.perf_counter() - started
+
+    print(f"{count} games, {rounds_played} rounds in {elapsed:.3f}s")
+    print(f"{rounds_played / elapsed:,.0f} rounds/s including throw recording and game setup")
+
+    game = Game(1, 'bench', 10, 3, 3, 'dice')
+    for value in (4, 5, 6):
+        game.add_user_throw(value)
+    bot_values = (3, 3, 3)
+    iterations = 1000000
+    started = time.perf_counter()
+    for _ in range(iterations):
+        game.current_round = 0
+        play_round(game, bot_values)
+    elapsed = time.perf_counter() - started
+    print(f"{iterations / elapsed:,.0f} play_round calls/s on a warm game")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+"""Compare the old random.choice ID generators with ids.IdGenerator.
+
+Run from the repository root: python benchmarks/id_generation.py [count]
+"""
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ids import IdGenerator
+
+
+def legacy_transaction_id():
+    chars = string.ascii_letters + string.digits
+    return 'stx' + ''.join(random.choice(chars) for _ in range(80))
+
+
+def legacy_payment_request_id():
+    chars = string.ascii_letters + string.digits
+    return 'pr_' + ''.join(random.choice(chars) for _ in range(16))
+
+
+def timed(label, count, generate):
+    started = time.perf_counter()
+    ids = [generate() for _ in range(count)]
+    elapsed = time.perf_counter() - started
+    print(f"{label:<26} {elapsed / count * 1e9:7.0f} ns/id  unique: {len(set(ids)) == count}")
+    return elapsed
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    print(f"{count} ids each")
+    for label, legacy, generator in (
+        ('transaction', legacy_transaction_id, IdGenerator('stx', 32)),
+        ('payment request', legacy_payment_request_id, IdGenerator('pr', 6)),
+    ):
+        old = timed(f"legacy {label}", count, legacy)
+        new = timed(f"IdGenerator {label}", count, generator)
+        print(f"{'speedup':<26} {old / new:7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""Compare the linear RANKS scan with the bisect-based RankTable.
+
+Run from the repository root: python benchmarks/rank_lookup.py [count]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ranks import RANKS, RankTable
+
+
+def linear_rank(xp):
+    current_rank = 1
+    for level, data in RANKS.items():
+        if xp >= data['xp_required']:
+            current_rank = level
+        else:
+            break
+    return current_rank
+
+
+def linear_render(xp):
+    """What a profile render cost before: the scan plus two dict lookups"""
+    level = linear_rank(xp)
+    info = RANKS[level]
+    if level < 20:
+        next_info = RANKS[level + 1]
+        return info['emoji'], info['name'], next_info['xp_required'], next_info['xp_required'] - info['xp_required']
+    return info['emoji'], info['name'], None, 0
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    rng = random.Random(42)
+    top = RANKS[max(RANKS)]['xp_required']
+    xps = [rng.randint(0, top * 2) for _ in range(count)]
+    table = RankTable(RANKS)
+
+    for xp in xps[:10000]:
+        assert table.lookup(xp).level == linear_rank(xp)
+
+    started = time.perf_counter()
+    for xp in xps:
+        linear_render(xp)
+    linear = time.perf_counter() - started
+
+    lookup = table.lookup
+    started = time.perf_counter()
+    for xp in xps:
+        rank = lookup(xp)
+        rank.emoji, rank.name, rank.next_xp, rank.span
+    bisected = time.perf_counter() - started
+
+    print(f"{count} XP values")
+    print(f"linear scan: {linear:.3f}s ({linear / count * 1e9:.0f} ns/lookup)")
+    print(f"RankTable:   {bisected:.3f}s ({bisected / count * 1e9:.0f} ns/lookup)")
+    print(f"speedup:     {linear / bisected:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""Compare the old regex-based is_valid_ton_address with ton_validator.
+
+Run from the repository root: python benchmarks/ton_validation.py [count]
+"""
+import base64
+import binascii
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ton_validator import is_valid_ton_address, parse_ton_address, validate_ton_addresses
+
+
+def legacy_is_valid_ton_address(address):
+    if not address:
+        return False
+    ton_pattern = r'^(UQ|EQ|kQ|0Q)[A-Za-z0-9_-]{46}$'
+    if re.match(ton_pattern, address):
+        return True
+    raw_pattern = r'^-?[0-9]+:[a-fA-F0-9]{64}$'
+    if re.match(raw_pattern, address):
+        return True
+    return len(address) >= 48 and len(address) <= 67
+
+
+def make_address(rng):
+    body = bytes([rng.choice((0x11, 0x51)), 0]) + rng.randbytes(32)
+    body += binascii.crc_hqx(body, 0).to_bytes(2, 'big')
+    return base64.urlsafe_b64encode(body).decode()
+
+
+def timed(label, count, func):
+    started = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<28} {elapsed:.3f}s ({elapsed / count * 1e9:.0f} ns/address)")
+    return elapsed
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    rng = random.Random(7)
+    addresses = [make_address(rng) for _ in range(count)]
+    # A few corrupted ones so the checksum path is exercised
+    for index in range(0, count, 50):
+        addresses[index] = addresses[index][:-1] + ('A' if addresses[index][-1] != 'A' else 'B')
+
+    assert validate_ton_addresses(addresses) == [is_valid_ton_address(a) for a in addresses]
+
+    print(f"{count} user-friendly addresses")
+    legacy = timed("legacy regex + length check", count, lambda: [legacy_is_valid_ton_address(a) for a in addresses])
+    parse_ton_address.cache_clear()
+    timed("validator, cold cache", count, lambda: [is_valid_ton_address(a) for a in addresses])
+    hot = addresses[:parse_ton_address.cache_info().maxsize] * (count // parse_ton_address.cache_info().maxsize)
+    timed("validator, warm cache", len(hot), lambda: [is_valid_ton_address(a) for a in hot])
+    batch = timed("validate_ton_addresses", count, lambda: validate_ton_addresses(addresses))
+    print(f"batch vs legacy: {legacy / batch:.1f}x "
+          f"(the legacy check also accepts {sum(map(legacy_is_valid_ton_address, addresses)) - sum(validate_ton_addresses(addresses))} corrupted addresses)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""Scheduling cost of a large knockout tournament.
+
+Signs up ``count`` entrants, starts the bracket and plays it through:
+in every round most matches are played out throw by throw and the rest
+are left to run out of time, with the timer wheel fast-forwarded to fire
+their deadlines. Reports the engine time per match and, for comparison,
+what the same match deadlines cost as one sleeping task per match.
+
+Run from the repository root: python benchmarks/tournament_scheduler.py [count]
+"""
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from balance_store import BalanceStore
+from timers import TimerWheel
+from tournaments import TOURNAMENT_FINISHED, TournamentEngine
+
+CHAT_ID = -1000000000001
+MATCH_SECONDS = 120
+
+
+def fast_forward(wheel, seconds):
+    """Turn the wheel by ``seconds`` without waiting, keeping its clock in line"""
+    for _ in range(int(seconds / wheel.tick) + 1):
+        wheel._advance()
+    wheel._origin = time.monotonic() - wheel._ticks * wheel.tick
+
+
+def run(count, rng, timeout_share=0.1):
+    balances = BalanceStore()
+    for user_id in range(1, count + 1):
+        balances[user_id] = 100
+    # Stand-in for profile XP, which the bots seed by
+    ratings = {user_id: rng.random() for user_id in range(1, count + 1)}
+    wheel = TimerWheel()
+    engine = TournamentEngine(wheel, balances, match_seconds=MATCH_SECONDS, max_entrants=count,
+                              seed_key=lambda user_id: -ratings[user_id])
+
+    started = time.perf_counter()
+    tournament = engine.open(CHAT_ID, 1, "player1", 'dice', 10)
+    for user_id in range(2, count + 1):
+        engine.join(CHAT_ID, user_id, f"player{user_id}")
+    signup_elapsed = time.perf_counter() - started
+
+    started = time.perf_counter()
+    engine.start(CHAT_ID, 1)
+    bracket_elapsed = time.perf_counter() - started
+
+    play_elapsed = 0.0
+    expire_elapsed = 0.0
+    while tournament.state != TOURNAMENT_FINISHED:
+        live = tournament.live_matches()
+        started = time.perf_counter()
+        for match in live:
+            if rng.random() < timeout_share:
+                continue
+            for _ in range(tournament.rounds * tournament.throw_count):
+                for user_id in match.players:
+                    engine.throw(CHAT_ID, user_id, rng.randint(1, 6))
+        play_elapsed += time.perf_counter() - started
+
+        started = time.perf_counter()
+        if tournament.current:
+            fast_forward(wheel, MATCH_SECONDS)
+        expire_elapsed += time.perf_counter() - started
+
+    return engine, tournament, balances, signup_elapsed, bracket_elapsed, play_elapsed, expire_elapsed
+
+
+async def task_per_match(count):
+    """The alternative: one sleeping task per match deadline, cancelled when the match ends"""
+    async def deadline():
+        await asyncio.sleep(MATCH_SECONDS)
+
+    started = time.perf_counter()
+    tasks = [asyncio.create_task(deadline()) for _ in range(count)]
+    await asyncio.sleep(0)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return time.perf_counter() - started
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    rng = random.Random(18)
+    engine, tournament, balances, signup, bracket, play, expire = run(count, rng)
+    matches = engine.matches_started
+    total = signup + bracket + play + expire
+    print(f"{count} entrants, bracket of {tournament.size}, {tournament.total_rounds} rounds, "
+          f"{matches} matches played ({engine.matches_expired} ran out of time)")
+    print(f"sign-up {signup:.3f}s, bracket {bracket:.3f}s, played {play:.3f}s, deadlines fired {expire:.3f}s")
+    print(f"engine time {total / matches * 1e6:.2f} us/match; "
+          f"champion {tournament.champion} won {balances[tournament.champion] - 90} ⭐, "
+          f"timers left {len(engine.wheel)}")
+
+    started = time.perf_counter()
+    wheel = TimerWheel()
+    timers = [wheel.schedule(MATCH_SECONDS, int, index) for index in range(matches)]
+    for timer in timers:
+        wheel.cancel(timer)
+    wheel_elapsed = time.perf_counter() - started
+    tasks_elapsed = asyncio.run(task_per_match(matches))
+    print(f"deadline per match: timer wheel {wheel_elapsed / matches * 1e6:.2f} us, "
+          f"task per match {tasks_elapsed / matches * 1e6:.2f} us")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""Inline-button callback routing by data prefix."""
+
+# Route slots in a trie node; child nodes are keyed by byte value (0-255)
+_PREFIX = -1
+_EXACT = -2
+
+
+class CallbackRouter:
+    """Maps callback data to exactly one handler, through a byte trie built once at startup.
+
+    A route is a prefix, a handler and an optional parser. ``resolve`` walks
+    the raw callback bytes once and takes the longest matching prefix, so a
+    click costs one walk however many routes there are; an exact route only
+    matches the whole data. The parser gets the rest of the data after the
+    prefix, decoded, and returns the handler's arguments as a tuple, or None
+    when the data is malformed. Routes without a parser take no arguments.
+    """
+
+    def __init__(self):
+        self._root = {}
+        self.routed = 0
+        self.rejected = 0
+        self.unmatched = 0
+
+    def add(self, prefix, handler, parse=None, exact=False):
+        node = self._root
+        for byte in prefix.encode('utf-8'):
+            node = node.setdefault(byte, {})
+        slot = _EXACT if exact else _PREFIX
+        if slot in node:
+            raise ValueError(f"Callback route {prefix!r} is already registered")
+        node[slot] = (handler, parse)
+
+    def resolve(self, data):
+        """``(handler, args)`` for raw callback ``data``; args is None if the parser rejected it.
+
+        Returns None when no route matches.
+        """
+        node = self._root
+        route = node.get(_PREFIX)
+        end = 0
+        for depth, byte in enumerate(data, 1):
+            node = node.get(byte)
+            if node is None:
+                break
+            if _PREFIX in node:
+                route = node[_PREFIX]
+                end = depth
+        else:
+            if _EXACT in node:
+                route = node[_EXACT]
+                end = len(data)
+        if route is None:
+            self.unmatched += 1
+            return None
+
+        handler, parse = route
+        if parse is None:
+            args = ()
+        else:
+            try:
+                args = parse(data[end:].decode('utf-8'))
+            except UnicodeDecodeError:
+                args = None
+        if args is None:
+            self.rejected += 1
+        else:
+            self.routed += 1
+        return handler, args
+
+    def stats(self):
+        return {
+            'routed': self.routed,
+            'rejected': self.rejected,
+            'unmatched': self.unmatched,
+        }
@@ -0,0 +1,222 @@
+"""Crash-safe checkpoints of the games in progress.
+
+Every active game is saved as its ``Game.to_bytes()`` record in an
+append-only log: handlers only mark a game dirty, and a background task
+writes the latest state of every dirty game (or a tombstone for games that
+ended) in one batch with a single fsync. On startup the log is replayed,
+the surviving games are handed back and the log is rewritten with just
+those records; it is also rewritten whenever dead records outweigh live
+ones by ``compact_ratio``.
+
+The log and the balance ledger are separate files, so settling a game goes
+through ``sync``: the finished game is on disk before its payout is made.
+A finished game found on startup has therefore been paid, or was about to
+be when the process died; it is dropped and logged, never replayed.
+"""
+import asyncio
+import logging
+import os
+import struct
+import time
+
+from games import Game
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_MAGIC = b'GCK2'
+# chat id, user id, payload length (0 for a tombstone); followed by the payload
+CHECKPOINT_RECORD = struct.Struct('<qqH')
+
+
+class GameCheckpoints:
+    """Checkpoint log for the games in ``table``, keyed ``(chat_id, user_id)`` like the table"""
+
+    def __init__(self, path, table, flush_interval=0.05, compact_ratio=4):
+        self.path = path
+        self.table = table
+        self.flush_interval = flush_interval
+        self.compact_ratio = compact_ratio
+        self._dirty = set()
+        self._sizes = {}
+        self._live_bytes = 0
+        self._file_bytes = 0
+        self._log = None
+        self._wakeup = None
+        self._flusher = None
+        self._closing = False
+        # One batch at a time, so ``sync`` can wait out a batch already being written
+        self._flush_lock = asyncio.Lock()
+
+    def __len__(self):
+        return len(self._sizes)
+
+    def open(self, restore=None):
+        """Replay the log, pass each surviving game to ``restore`` and compact the log"""
+        started = time.perf_counter()
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        records = {}
+        if os.path.exists(self.path):
+            with open(self.path, 'rb') as f:
+                data = f.read()
+            if not data.startswith(CHECKPOINT_MAGIC):
+                raise RuntimeError(f"Unrecognised checkpoint file {self.path}")
+            view = memoryview(data)
+            offset = len(CHECKPOINT_MAGIC)
+            header = CHECKPOINT_RECORD.size
+            while offset + header <= len(data):
+                chat_id, user_id, length = CHECKPOINT_RECORD.unpack_from(data, offset)
+                key = (chat_id, user_id)
+                end = offset + header + length
+                if end > len(data):
+                    break
+                if length:
+                    records[key] = view[offset + header:end]
+                else:
+                    records.pop(key, None)
+                offset = end
+            if offset != len(data):
+                logger.warning(f"Dropping torn checkpoint record at the end of {self.path}")
+
+        reopened = 0
+        games = []
+        for key, payload in list(records.items()):
+            game = Game.from_bytes(payload)
+            if game.finished:
+                del records[key]
+                logger.warning(
+                    f"Dropping finished game of user {game.user_id} in chat {game.chat_id} from checkpoints; "
+                    f"it was being settled when the process stopped, check its payout in the ledger"
+                )
+                continue
+            if game.reopen_round():
+                reopened += 1
+                records[key] = game.to_bytes()
+            games.append(game)
+        if restore is not None:
+            for game in games:
+                restore(game)
+        # Restored games are already on disk; the compacted log below rewrites them anyway
+        self._dirty.clear()
+
+        self._rewrite(records.items())
+        logger.info(
+            f"Restored {len(games)} games from checkpoints "
+            f"({reopened} rounds reopened) in {time.perf_counter() - started:.3f}s"
+        )
+        return len(games)
+
+    def _rewrite(self, records):
+        """Replace the log with ``records`` (key, payload) and reopen it for appends"""
+        if self._log is not None:
+            self._log.close()
+        chunks = [CHECKPOINT_MAGIC]
+        sizes = {}
+        for key, payload in records:
+            chunks.append(CHECKPOINT_RECORD.pack(*key, len(payload)))
+            chunks.append(payload)
+            sizes[key] = CHECKPOINT_RECORD.size + len(payload)
+        data = b''.join(chunks)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self._log = open(self.path, 'ab')
+        self._sizes = sizes
+        self._live_bytes = len(data) - len(CHECKPOINT_MAGIC)
+        self._file_bytes = self._live_bytes
+
+    def mark_dirty(self, key):
+        """Checkpoint the game under ``key`` on the next flush (a tombstone if it is gone)"""
+        self._dirty.add(key)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def start(self):
+        """Start the background writer; call from inside the running event loop"""
+        self._wakeup = asyncio.Event()
+        if self._dirty:
+            self._wakeup.set()
+        self._flusher = asyncio.create_task(self._write_loop())
+
+    async def _write_loop(self):
+        while not self._closing:
+            await self._wakeup.wait()
+            if self._closing:
+                break
+            await asyncio.sleep(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Checkpoint flush failed: {e}")
+
+    def _append(self, data):
+        self._log.write(data)
+        self._log.flush()
+        os.fsync(self._log.fileno())
+
+    async def sync(self):
+        """Return once every game marked dirty so far is on disk"""
+        await self.flush()
+
+    async def flush(self):
+        """Write the current state of every dirty game in one batch"""
+        async with self._flush_lock:
+            await self._flush()
+
+    async def _flush(self):
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, set()
+        loop = asyncio.get_running_loop()
+
+        if self._file_bytes > self.compact_ratio * max(self._live_bytes, 65536):
+            records = [(key, game.to_bytes()) for key, game in self.table.items()]
+            try:
+                await loop.run_in_executor(None, self._rewrite, records)
+            except Exception:
+                self._dirty |= dirty
+                raise
+            return
+
+        chunks = []
+        sizes = self._sizes
+        for key in dirty:
+            game = self.table.get(key)
+            if game is None:
+                if key not in sizes:
+                    continue
+                payload = b''
+                self._live_bytes -= sizes.pop(key)
+            else:
+                payload = game.to_bytes()
+                size = CHECKPOINT_RECORD.size + len(payload)
+                self._live_bytes += size - sizes.get(key, 0)
+                sizes[key] = size
+            chunks.append(CHECKPOINT_RECORD.pack(*key, len(payload)))
+            chunks.append(payload)
+        if not chunks:
+            return
+        data = b''.join(chunks)
+        self._file_bytes += len(data)
+        try:
+            await loop.run_in_executor(None, self._append, data)
+        except Exception:
+            self._dirty |= dirty
+            raise
+
+    async def close(self):
+        if self._flusher is not None:
+            self._closing = True
+            self._wakeup.set()
+            await self._flusher
+            self._flusher = None
+        if self._log is not None:
+            await self.flush()
+            self._log.close()
+            self._log = None
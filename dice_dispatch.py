@@ -0,0 +1,67 @@
+"""Dice-only message dispatch for the userbot."""
+
+
+class DiceDispatch:
+    """Decides which new messages reach the userbot's dice handler.
+
+    Telethon builds an event for every update each handler type listens to
+    and only then asks the handler's filter, so a bare ``events.NewMessage``
+    handler runs for every message in every group the userbot is in. The
+    builder from ``events()`` turns away messages without a dice while the
+    update is being built, before any event object exists, and its filter
+    drops dice thrown in chats ``is_active`` says nothing is waiting on.
+    Only throws that can count reach the handler; the counters show how
+    many messages were discarded on the way. With several clients on the
+    same chats, each client gets its own builder and ``owns`` makes it pass
+    over messages another client serves, so each message is counted once.
+    """
+
+    def __init__(self, is_active):
+        self.is_active = is_active
+        self.messages = 0
+        self.not_dice = 0
+        self.inactive_chat = 0
+        self.dispatched = 0
+
+    def events(self, owns=None):
+        """Event builder to pass to ``client.on``; Telethon is imported here, like in setup_userbot
+
+        ``owns(message)``, if given, says whether the client this builder is
+        registered on serves the message's chat.
+        """
+        from telethon import events
+        from telethon.tl.types import MessageMediaDice
+
+        dispatch = self
+
+        class DiceMessage(events.NewMessage):
+            @classmethod
+            def build(cls, update, others=None, self_id=None):
+                message = getattr(update, 'message', None)
+                if message is None or (owns is not None and not owns(message)):
+                    return None
+                dispatch.messages += 1
+                if not isinstance(getattr(message, 'media', None), MessageMediaDice):
+                    dispatch.not_dice += 1
+                    return None
+                return super().build(update, others, self_id)
+
+            def filter(self, event):
+                if not dispatch.is_active(event.chat_id):
+                    dispatch.inactive_chat += 1
+                    return None
+                event = super().filter(event)
+                if event:
+                    dispatch.dispatched += 1
+                return event
+
+        return DiceMessage()
+
+    def stats(self):
+        return {
+            'messages': self.messages,
+            'discarded': self.not_dice + self.inactive_chat,
+            'not_dice': self.not_dice,
+            'inactive_chat': self.inactive_chat,
+            'dispatched': self.dispatched,
+        }
@@ -0,0 +1,101 @@
+"""Display names of Telegram users, cached so handlers never wait on an entity lookup."""
+import asyncio
+import logging
+from collections import OrderedDict
+
+from profiles import UNKNOWN_USERNAME
+
+logger = logging.getLogger(__name__)
+
+
+def display_name(entity):
+    """Username, else first name, of a Telegram user entity; None if it has neither"""
+    return getattr(entity, 'username', None) or getattr(entity, 'first_name', None)
+
+
+class DisplayNames:
+    """LRU of display names keyed by user id, shared with the profile repository.
+
+    ``for_event`` answers synchronously. It takes the sender entity Telethon
+    delivered with the update when there is one, else the cached name, else
+    the name stored on the user's profile if it is in memory, else
+    ``default``. On a cache miss the sender is fetched in the background
+    (one task per user at a time), so the real name is there for the next
+    command and no handler waits on an entity round-trip. A name that
+    changes is written back to the profile when the profile is in memory;
+    nothing here reads the database.
+    """
+
+    def __init__(self, profiles, max_size=100000, default="Player"):
+        self.profiles = profiles
+        self.max_size = max_size
+        self.default = default
+        self._names = OrderedDict()
+        self._fetching = {}
+        self.hits = 0
+        self.misses = 0
+        self.fetches = 0
+
+    def __len__(self):
+        return len(self._names)
+
+    def get(self, user_id):
+        """Cached name of ``user_id``, or None; never goes to Telegram or the database"""
+        name = self._names.get(user_id)
+        if name is not None:
+            self._names.move_to_end(user_id)
+        return name
+
+    def remember(self, user_id, name):
+        old = self._names.get(user_id)
+        self._names[user_id] = name
+        self._names.move_to_end(user_id)
+        if len(self._names) > self.max_size:
+            self._names.popitem(last=False)
+        if old != name:
+            profile = self.profiles.cached(user_id)
+            if profile is not None and profile.username != name:
+                profile.username = name
+                self.profiles.mark_dirty(profile)
+
+    def for_event(self, event):
+        """Display name of the event's sender, without awaiting anything"""
+        user_id = event.sender_id
+        name = display_name(event.sender)
+        if name:
+            self.remember(user_id, name)
+            return name
+        name = self.get(user_id)
+        if name is not None:
+            self.hits += 1
+            return name
+        self.misses += 1
+        self._fetch(user_id, event)
+        profile = self.profiles.cached(user_id)
+        if profile is not None and profile.username != UNKNOWN_USERNAME:
+            return profile.username
+        return self.default
+
+    def _fetch(self, user_id, event):
+        if user_id in self._fetching:
+            return
+        self.fetches += 1
+        self._fetching[user_id] = asyncio.create_task(self._refresh(user_id, event))
+
+    async def _refresh(self, user_id, event):
+        try:
+            name = display_name(await event.get_sender())
+            if name:
+                self.remember(user_id, name)
+        except Exception as e:
+            logger.warning(f"Could not fetch the name of user {user_id}: {e}")
+        finally:
+            self._fetching.pop(user_id, None)
+
+    def stats(self):
+        return {
+            'cached': len(self._names),
+            'hits': self.hits,
+            'misses': self.misses,
+            'fetches': self.fetches,
+        }
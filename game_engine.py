@@ -0,0 +1,68 @@
+"""Round scoring and settlement for player-vs-bot games.
+
+Everything here is synchronous and does no I/O: the Bot API and Telethon
+front-ends feed throws in, get a decision back, and do the messaging and
+balance updates themselves.
+"""
+from collections import namedtuple
+
+from games import GAMES
+
+PLAYER = 'player'
+BOT = 'bot'
+TIE = 'tie'
+
+# winner is PLAYER, BOT or TIE; settlement is set once the last round is played
+RoundOutcome = namedtuple('RoundOutcome', 'round_number user_total bot_total winner finished settlement')
+# payout is credited back to the player under reason; won is None for a tie (no stats recorded)
+Settlement = namedtuple('Settlement', 'winner payout reason won')
+
+
+def settle(game):
+    """Final decision for a game whose rounds have all been played"""
+    if game.user_score > game.bot_score:
+        return Settlement(PLAYER, int(game.bet_amount * GAMES[game.game_type].payout), 'payout', True)
+    if game.bot_score > game.user_score:
+        return Settlement(BOT, 0, None, False)
+    return Settlement(TIE, game.bet_amount, 'refund', None)
+
+
+def play_round(game, bot_values):
+    """Score the round the player just completed against the bot's throws.
+
+    Records ``bot_values`` on the game, advances it to the next round and
+    updates the score; on the last round the outcome carries the settlement.
+    """
+    user_total, bot_total = game.add_bot_round(bot_values)
+    game.current_round += 1
+
+    if user_total > bot_total:
+        game.user_score += 1
+        winner = PLAYER
+    elif bot_total > user_total:
+        game.bot_score += 1
+        winner = BOT
+    else:
+        winner = TIE
+
+    finished = game.current_round >= game.total_rounds
+    return RoundOutcome(
+        game.current_round, user_total, bot_total, winner, finished,
+        settle(game) if finished else None,
+    )
+
+
+def play_rounds(game, user_values, bot_values):
+    """Score every remaining round at once, e.g. for auto-play.
+
+    ``user_values`` and ``bot_values`` hold ``throw_count`` throws per round
+    left to play, in throw order. Returns the RoundOutcome of each round;
+    the last one carries the settlement.
+    """
+    throw_count = game.throw_count
+    outcomes = []
+    for start in range(0, len(user_values), throw_count):
+        for value in user_values[start:start + throw_count]:
+            game.add_user_throw(value)
+        outcomes.append(play_round(game, bot_values[start:start + throw_count]))
+    return outcomes
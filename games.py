@@ -0,0 +1,357 @@
+"""Game types shared by the bot, the userbot and the stores."""
+import json
+import os
+import re
+import struct
+import sys
+from collections import namedtuple
+from collections.abc import Mapping
+from enum import IntEnum
+from types import MappingProxyType
+
+# bets, rounds and throws are the options offered on the setup keyboards; payout multiplies the bet on a win
+GameSpec = namedtuple('GameSpec', 'key name emoji icon command max_value tagline bets rounds throws payout')
+
+# Shown for game types in stored history that are no longer in the catalogue
+UNKNOWN_GAME = GameSpec('unknown', 'Unknown', '🎮', '🎮', '', 0, '', (), (), (), 0)
+
+# Callback actions that name a game, and which of its options the trailing number must be
+GAME_CALLBACKS = {
+    'bet': 'bets',
+    'demo_bet': 'bets',
+    'rounds': 'rounds',
+    'throws': 'throws',
+    'back_bet': None,
+    'back_to_bet': None,
+    'demo_game': None,
+    'play_game': None,
+}
+
+# Game keys are one segment of callback data; throws and round totals must fit in a byte
+MAX_THROWS_PER_SIDE = 9
+
+
+class GameRegistry(Mapping):
+    """The game catalogue, loaded once at startup and read-only afterwards.
+
+    Maps game keys to frozen ``GameSpec`` entries and indexes them by group
+    command and dice emoji. Every ``<action>_<game>`` callback prefix is
+    precomputed, so parsing a callback is a dict hit on the prefix plus a
+    check that the trailing number is one of the game's options. Keys,
+    commands and emoji are interned. Catalogue order fixes each game's
+    on-disk code: add games at the end and never reorder them.
+    """
+
+    def __init__(self, specs):
+        games = {}
+        commands = {}
+        emoji = {}
+        for spec in specs:
+            if '_' in spec.key:
+                raise ValueError(f"Game key {spec.key!r} must not contain '_'")
+            if max(spec.rounds) * max(spec.throws) > MAX_THROWS_PER_SIDE:
+                raise ValueError(f"Game {spec.key!r} allows more than {MAX_THROWS_PER_SIDE} throws a side")
+            for index, value, kind in ((games, spec.key, 'key'), (commands, spec.command, 'command'),
+                                       (emoji, spec.emoji, 'emoji')):
+                if value in index:
+                    raise ValueError(f"Duplicate game {kind} {value!r}")
+                index[value] = spec
+        self._games = MappingProxyType(games)
+        self._commands = MappingProxyType(commands)
+        self._emoji = MappingProxyType(emoji)
+        self._callbacks = MappingProxyType({
+            sys.intern(f"{action}_{spec.key}"): (action, spec)
+            for action in GAME_CALLBACKS for spec in specs
+        })
+        self.command_pattern = re.compile(
+            '^(' + '|'.join(re.escape(spec.command) for spec in specs) + ')$', re.IGNORECASE
+        )
+
+    @classmethod
+    def load(cls, path):
+        """Read the catalogue from a JSON file: ``defaults`` merged into each of ``games``"""
+        with open(path, encoding='utf-8') as f:
+            config = json.load(f)
+        defaults = config.get('defaults', {})
+        specs = []
+        for entry in config['games']:
+            entry = {**defaults, **entry}
+            specs.append(GameSpec(
+                sys.intern(entry['key']), entry['name'], sys.intern(entry['emoji']), entry['icon'],
+                sys.intern(entry['command'].lower()), int(entry['max_value']), entry.get('tagline', ''),
+                tuple(entry['bets']), tuple(entry['rounds']), tuple(entry['throws']), entry['payout'],
+            ))
+        return cls(specs)
+
+    def __getitem__(self, key):
+        return self._games[key]
+
+    def __iter__(self):
+        return iter(self._games)
+
+    def __len__(self):
+        return len(self._games)
+
+    def by_command(self, command):
+        """Game for a group command such as ``/dart``, or None"""
+        return self._commands.get(command.lower())
+
+    def by_emoji(self, emoji):
+        return self._emoji.get(emoji)
+
+    def parse_callback(self, data):
+        """``(action, spec, value)`` for game callback data such as ``bet_dice_10``.
+
+        ``value`` is None for actions without one. Returns None for unknown
+        games and for values the game does not offer.
+        """
+        hit = self._callbacks.get(data)
+        if hit is not None:
+            return (hit[0], hit[1], None) if GAME_CALLBACKS[hit[0]] is None else None
+        prefix, _, value = data.rpartition('_')
+        hit = self._callbacks.get(prefix)
+        if hit is None or not value.isdigit():
+            return None
+        action, spec = hit
+        options = GAME_CALLBACKS[action]
+        value = int(value)
+        if options is None or value not in getattr(spec, options):
+            return None
+        return action, spec, value
+
+    def parse_option(self, action, rest):
+        """Same as ``parse_callback`` for data already split after ``<action>_``, e.g. ``dice_10``"""
+        key, _, value = rest.partition('_')
+        spec = self._games.get(key)
+        if spec is None:
+            return None
+        options = GAME_CALLBACKS[action]
+        if options is None:
+            return None if value else (action, spec, None)
+        if not value.isdigit():
+            return None
+        value = int(value)
+        if value not in getattr(spec, options):
+            return None
+        return action, spec, value
+
+
+GAMES_CONFIG = os.environ.get("GAMES_CONFIG", os.path.join(os.path.dirname(os.path.abspath(__file__)), 'games.json'))
+GAMES = GameRegistry.load(GAMES_CONFIG)
+
+# Dense 0-based index per game type, in catalogue order; used for array slots and on-disk codes
+GameType = IntEnum('GameType', [(key.upper(), index) for index, key in enumerate(GAMES)])
+GAME_KEYS = tuple(GAMES)
+GAME_INDEX = {key: GameType(index) for index, key in enumerate(GAME_KEYS)}
+
+# user_id, chat_id (0 when unset), bet, game code, rounds, throws per round, current round,
+# player and bot score, player and bot throw counts, demo flag; followed by the throws
+# buffer and the UTF-8 username
+GAME_RECORD = struct.Struct('<qqqBBBBBBBBB')
+
+
+class Game:
+    """One match of a player against the bot.
+
+    All throw values and per-round totals share one bytearray preallocated
+    from ``rounds * throw_count`` (at most 9 throws a side): player throws,
+    bot throws, then the player's and the bot's round totals. The player's
+    totals are added up as throws arrive and the bot's are written once per
+    round, so resolving a round never re-reads earlier throws.
+    """
+
+    __slots__ = (
+        'user_id', 'username', 'bet_amount', 'total_rounds', 'throw_count',
+        'game_type', 'current_round', 'user_score', 'bot_score', 'is_demo',
+        'chat_id', 'throws', 'user_throws', 'bot_throws',
+    )
+
+    def __init__(self, user_id, username, bet_amount, rounds, throw_count, game_type, chat_id=None):
+        self.user_id = user_id
+        self.username = username
+        self.bet_amount = bet_amount
+        self.total_rounds = rounds
+        self.throw_count = throw_count
+        self.game_type = game_type
+        self.current_round = 0
+        self.user_score = 0
+        self.bot_score = 0
+        self.is_demo = False
+        self.chat_id = chat_id
+        self.throws = bytearray(2 * (rounds * throw_count + rounds))
+        self.user_throws = 0
+        self.bot_throws = 0
+
+    @property
+    def key(self):
+        """Key of this game in a ``GameTable``"""
+        return (self.chat_id, self.user_id)
+
+    @property
+    def at_round_start(self):
+        """True when the player has not thrown yet in the current round"""
+        return self.user_throws == self.current_round * self.throw_count
+
+    @property
+    def finished(self):
+        """True once every round has been scored"""
+        return self.current_round >= self.total_rounds
+
+    @property
+    def user_results(self):
+        return list(self.throws[:self.user_throws])
+
+    @property
+    def bot_results(self):
+        size = self.total_rounds * self.throw_count
+        return list(self.throws[size:size + self.bot_throws])
+
+    def add_user_throw(self, value):
+        """Record a player throw; True when it completes the player's side of a round"""
+        index = self.user_throws
+        size = self.total_rounds * self.throw_count
+        if index >= size:
+            return False
+        self.throws[index] = value
+        self.throws[2 * size + index // self.throw_count] += value
+        self.user_throws = index + 1
+        return self.user_throws % self.throw_count == 0
+
+    def add_bot_round(self, values):
+        """Record the bot's throws for the current round; returns (player total, bot total)"""
+        throw_count = self.throw_count
+        size = self.total_rounds * throw_count
+        round_index = self.current_round
+        if round_index >= self.total_rounds:
+            raise ValueError("Game has no rounds left")
+        start = size + round_index * throw_count
+        values = bytes(values[:throw_count])
+        self.throws[start:start + len(values)] = values
+        self.bot_throws = round_index * throw_count + len(values)
+        totals = 2 * size + round_index
+        bot_total = sum(values)
+        self.throws[totals + self.total_rounds] = bot_total
+        return self.throws[totals], bot_total
+
+    def reopen_round(self):
+        """Clear a completed player side the bot never answered; True if there was one.
+
+        Only happens to a game restored from a checkpoint taken mid-response;
+        the player throws that round again.
+        """
+        start = self.current_round * self.throw_count
+        if self.user_throws < start + self.throw_count:
+            return False
+        size = self.total_rounds * self.throw_count
+        self.throws[start:self.user_throws] = bytes(self.user_throws - start)
+        # Throws may have run ahead into later rounds; clear every player total they touched
+        totals = 2 * size
+        last_round = (self.user_throws - 1) // self.throw_count
+        self.throws[totals + self.current_round:totals + last_round + 1] = bytes(last_round + 1 - self.current_round)
+        self.user_throws = start
+        return True
+
+    def to_bytes(self):
+        header = GAME_RECORD.pack(
+            self.user_id, self.chat_id or 0, self.bet_amount, GAME_INDEX[self.game_type],
+            self.total_rounds, self.throw_count, self.current_round, self.user_score,
+            self.bot_score, self.user_throws, self.bot_throws, self.is_demo,
+        )
+        return header + self.throws + (self.username or '').encode()
+
+    @classmethod
+    def from_bytes(cls, data):
+        game = cls.__new__(cls)
+        (
+            game.user_id, chat_id, game.bet_amount, code, game.total_rounds,
+            game.throw_count, game.current_round, game.user_score, game.bot_score,
+            game.user_throws, game.bot_throws, is_demo,
+        ) = GAME_RECORD.unpack_from(data)
+        game.chat_id = chat_id or None
+        game.game_type = GAME_KEYS[code]
+        game.is_demo = bool(is_demo)
+        end = GAME_RECORD.size + 2 * (game.total_rounds * game.throw_count + game.total_rounds)
+        game.throws = bytearray(data[GAME_RECORD.size:end])
+        game.username = str(data[end:], 'utf-8') or None
+        return game
+
+    def round_totals(self, round_index):
+        """(player total, bot total) of a round"""
+        base = 2 * self.total_rounds * self.throw_count + round_index
+        return self.throws[base], self.throws[base + self.total_rounds]
+
+
+class GameSetup:
+    """A player's choices in a userbot bet menu, kept until the game starts or the menu expires"""
+
+    __slots__ = ('chat_id', 'game_type', 'message_id', 'username', 'bet_amount', 'rounds')
+
+    def __init__(self, chat_id, game_type, message_id, username, bet_amount=10, rounds=1):
+        self.chat_id = chat_id
+        self.game_type = game_type
+        self.message_id = message_id
+        self.username = username
+        self.bet_amount = bet_amount
+        self.rounds = rounds
+
+
+class GameTable(dict):
+    """Active games keyed by ``(chat_id, user_id)``, with an index by user.
+
+    A player can have one game per chat. The index maps each user to the
+    chats they have a game in, so one user's games (and the Stars they have
+    at stake) are found without scanning the table; a count of games per
+    chat answers whether a chat has any game at all. Only item assignment,
+    ``del`` and ``pop`` keep the index in step; don't use ``update``,
+    ``setdefault``, ``popitem`` or ``clear``.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._chats = {}
+        self._games_in_chat = {}
+
+    def __setitem__(self, key, game):
+        chat_id, user_id = key
+        if key not in self:
+            self._games_in_chat[chat_id] = self._games_in_chat.get(chat_id, 0) + 1
+        dict.__setitem__(self, key, game)
+        chats = self._chats.get(user_id)
+        if chats is None:
+            self._chats[user_id] = {chat_id}
+        else:
+            chats.add(chat_id)
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._unindex(key)
+
+    def pop(self, key, *default):
+        if key in self:
+            self._unindex(key)
+        return super().pop(key, *default)
+
+    def _unindex(self, key):
+        chats = self._chats.get(key[1])
+        if chats is not None:
+            chats.discard(key[0])
+            if not chats:
+                del self._chats[key[1]]
+        remaining = self._games_in_chat.pop(key[0], 1) - 1
+        if remaining:
+            self._games_in_chat[key[0]] = remaining
+
+    def has_chat(self, chat_id):
+        """True while anyone has a game in ``chat_id``"""
+        return chat_id in self._games_in_chat
+
+    def for_user(self, user_id):
+        """The user's games in every chat"""
+        return [self[(chat_id, user_id)] for chat_id in self._chats.get(user_id, ())]
+
+    def count_for(self, user_id):
+        return len(self._chats.get(user_id, ()))
+
+    def at_stake(self, user_id):
+        """Stars the user has bet on games still running"""
+        return sum(game.bet_amount for game in self.for_user(user_id))
@@ -0,0 +1,327 @@
+"""Bounded per-user game history with an append-only columnar archive.
+
+Each user keeps only their most recent games in a fixed-size ring buffer: a
+single ``array('q')`` holding a game counter followed by ``recent`` packed
+entries (game code and won flag, bet, win, epoch seconds). Every game is also
+appended to an on-disk archive stored column by column (user id as int64,
+game code and won flag as int8, bet and win as int32, timestamp as int64), written by a
+background task. Rings are kept for the ``max_rings`` most recently active
+users. An index keeps the row numbers of each user's last ``recent`` games,
+so reloading a ring reads just those rows and a user with no archive costs
+a dict miss. ``close`` saves the index next to the archive and ``open``
+loads it, scanning only the user ids archived after it was saved.
+"""
+import asyncio
+import logging
+import os
+import struct
+import time
+from array import array
+from collections import OrderedDict, namedtuple
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+HistoryEntry = namedtuple('HistoryEntry', 'game_type bet_amount win_amount won timestamp')
+
+# column name, array typecode; user_id is written last so a visible id always has its row
+ARCHIVE_COLUMNS = (
+    ('game', 'b'),
+    ('bet', 'i'),
+    ('win', 'i'),
+    ('ts', 'q'),
+    ('user_id', 'q'),
+)
+ENTRY_WIDTH = 4
+# bet and win are stored as int32; larger amounts are clamped in the archive (rings keep them exact)
+INT32_MAX = 2 ** 31 - 1
+INT32_MIN = -2 ** 31
+
+INDEX_MAGIC = b'GHI1'
+# rows covered, recent size, user count; followed by one record per user
+INDEX_HEADER = struct.Struct('<4sqii')
+# rows of the user id column read at a time when scanning it
+SCAN_ROWS = 1 << 16
+
+
+class GameHistory:
+    """Recent games per user plus a full on-disk archive"""
+
+    def __init__(self, directory, game_types, recent=5, flush_interval=1.0, max_rings=100000):
+        self.directory = directory
+        self.game_types = tuple(game_types)
+        self.game_codes = {game_type: code for code, game_type in enumerate(self.game_types)}
+        self.recent_size = recent
+        self.flush_interval = flush_interval
+        self.max_rings = max_rings
+        self._rings = OrderedDict()
+        self._index = {}
+        self._pending = {name: array(typecode) for name, typecode in ARCHIVE_COLUMNS}
+        # Rows on disk, then the batch being written, then the pending batch
+        self._disk_rows = 0
+        self._writing = None
+        self._files = {}
+        self._readers = {}
+        self._wakeup = None
+        self._flusher = None
+        self._closing = False
+
+    def _column_path(self, name):
+        return os.path.join(self.directory, f"history.{name}.bin")
+
+    def _index_path(self):
+        return os.path.join(self.directory, "history.index.bin")
+
+    def open(self):
+        """Open the archive, trimming a row left half-written by a crash"""
+        os.makedirs(self.directory, exist_ok=True)
+        rows = None
+        for name, typecode in ARCHIVE_COLUMNS:
+            path = self._column_path(name)
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            column_rows = size // array(typecode).itemsize
+            rows = column_rows if rows is None else min(rows, column_rows)
+        for name, typecode in ARCHIVE_COLUMNS:
+            f = open(self._column_path(name), 'ab')
+            f.truncate(rows * array(typecode).itemsize)
+            self._files[name] = f
+            self._readers[name] = os.open(self._column_path(name), os.O_RDONLY)
+        self._disk_rows = rows
+
+        covered = self._load_index(rows)
+        for start, ids in self._scan_ids(covered, rows):
+            for row, user_id in enumerate(ids, start):
+                self._index_row(user_id, row)
+        logger.info(
+            f"Game history archive has {rows} games of {len(self._index)} users "
+            f"({rows - covered} scanned past the saved index)"
+        )
+
+    def _load_index(self, rows):
+        """Load the index saved by ``close``; returns how many archive rows it covers"""
+        path = self._index_path()
+        if not os.path.exists(path):
+            return 0
+        with open(path, 'rb') as f:
+            data = f.read()
+        if len(data) < INDEX_HEADER.size:
+            return 0
+        magic, covered, recent, users = INDEX_HEADER.unpack_from(data)
+        record = 8 * (1 + recent)
+        if magic != INDEX_MAGIC or recent != self.recent_size or covered > rows \
+                or len(data) != INDEX_HEADER.size + users * record:
+            logger.warning(f"Ignoring stale game history index {path}")
+            return 0
+        values = array('q')
+        values.frombytes(data[INDEX_HEADER.size:])
+        index = self._index
+        for base in range(0, len(values), 1 + recent):
+            index[values[base]] = array('q', (row for row in values[base + 1:base + 1 + recent] if row >= 0))
+        return covered
+
+    def _save_index(self, rows):
+        recent = self.recent_size
+        values = array('q')
+        for user_id, user_rows in self._index.items():
+            values.append(user_id)
+            values.extend(user_rows)
+            values.extend([-1] * (recent - len(user_rows)))
+        path = self._index_path()
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(INDEX_HEADER.pack(INDEX_MAGIC, rows, recent, len(self._index)))
+            values.tofile(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def _scan_ids(self, start, stop):
+        """(first row, array of user ids) chunks of the on-disk user id column"""
+        with open(self._column_path('user_id'), 'rb') as f:
+            f.seek(start * 8)
+            while start < stop:
+                ids = array('q')
+                ids.fromfile(f, min(SCAN_ROWS, stop - start))
+                yield start, ids
+                start += len(ids)
+
+    def _index_row(self, user_id, row):
+        user_rows = self._index.get(user_id)
+        if user_rows is None:
+            self._index[user_id] = user_rows = array('q')
+        user_rows.append(row)
+        if len(user_rows) > self.recent_size:
+            del user_rows[0]
+
+    def record(self, user_id, game_type, bet_amount, win_amount, won, timestamp=None):
+        ring = self._ring(user_id)
+        kind = (self.game_codes.get(game_type, -1) << 1) | bool(won)
+        ts = int(timestamp if timestamp is not None else time.time())
+        self._push(ring, kind, bet_amount, win_amount, ts)
+
+        # Fix every value before touching a column, so a row is appended whole or not at all
+        bet, win = self._clamp(bet_amount), self._clamp(win_amount)
+        if (bet, win) != (bet_amount, win_amount):
+            logger.warning(f"Game of user {user_id} archived with clamped amounts: bet {bet_amount}, win {win_amount}")
+        row = (kind, bet, win, ts, user_id)
+        pending = self._pending
+        for (name, _), value in zip(ARCHIVE_COLUMNS, row):
+            pending[name].append(value)
+
+        self._index_row(user_id, self._disk_rows + self._in_flight() + len(pending['user_id']) - 1)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    @staticmethod
+    def _clamp(amount):
+        return min(max(int(amount), INT32_MIN), INT32_MAX)
+
+    def _in_flight(self):
+        return len(self._writing['user_id']) if self._writing is not None else 0
+
+    def _ring(self, user_id):
+        ring = self._rings.get(user_id)
+        if ring is None:
+            ring = self._load_ring(user_id)
+        else:
+            self._rings.move_to_end(user_id)
+        return ring
+
+    def _push(self, ring, kind, bet_amount, win_amount, ts):
+        base = 1 + ENTRY_WIDTH * (ring[0] % self.recent_size)
+        ring[base] = kind
+        ring[base + 1] = bet_amount
+        ring[base + 2] = win_amount
+        ring[base + 3] = ts
+        ring[0] += 1
+
+    def _entry(self, kind, bet_amount, win_amount, ts):
+        code = kind >> 1
+        game_type = self.game_types[code] if 0 <= code < len(self.game_types) else None
+        return HistoryEntry(game_type, bet_amount, win_amount, bool(kind & 1), datetime.fromtimestamp(ts))
+
+    def recent(self, user_id):
+        """The user's most recent games, newest first"""
+        ring = self._ring(user_id)
+        count = ring[0]
+        entries = []
+        for back in range(min(count, self.recent_size)):
+            base = 1 + ENTRY_WIDTH * ((count - 1 - back) % self.recent_size)
+            entries.append(self._entry(*ring[base:base + ENTRY_WIDTH]))
+        return entries
+
+    def _load_ring(self, user_id):
+        ring = array('q', bytes(8 * (1 + ENTRY_WIDTH * self.recent_size)))
+        rows = self._find_rows(user_id, self.recent_size)
+        for row in reversed(rows):
+            self._push(ring, *row)
+        self._rings[user_id] = ring
+        if len(self._rings) > self.max_rings:
+            self._rings.popitem(last=False)
+        return ring
+
+    def archive(self, user_id):
+        """Every archived game of the user, oldest first; scans the whole user id column on disk"""
+        rows = [
+            row
+            for start, ids in self._scan_ids(0, self._disk_rows)
+            for row, archived_id in enumerate(ids, start) if archived_id == user_id
+        ]
+        rows.extend(row for row in self._index.get(user_id, ()) if row >= self._disk_rows)
+        return [self._entry(*self._read_row(row)) for row in rows]
+
+    def _find_rows(self, user_id, limit):
+        """The last ``limit`` archived rows of ``user_id`` as (kind, bet, win, ts), newest first"""
+        user_rows = self._index.get(user_id)
+        if not user_rows:
+            return []
+        return [self._read_row(row) for row in reversed(user_rows[-limit:])]
+
+    def _read_row(self, row):
+        """(kind, bet, win, ts) of archive row ``row``, from disk or from the batches not yet written"""
+        if row < self._disk_rows:
+            values = []
+            for name, typecode in ARCHIVE_COLUMNS[:4]:
+                size = array(typecode).itemsize
+                values.append(struct.unpack('<' + typecode, os.pread(self._readers[name], size, row * size))[0])
+            return tuple(values)
+        row -= self._disk_rows
+        for columns in (self._writing, self._pending):
+            if columns is None:
+                continue
+            if row < len(columns['user_id']):
+                return tuple(columns[name][row] for name, _ in ARCHIVE_COLUMNS[:4])
+            row -= len(columns['user_id'])
+        raise IndexError("History row out of range")
+
+    async def start(self):
+        """Start the background archive writer; call from inside the running event loop"""
+        self._wakeup = asyncio.Event()
+        if self._pending['user_id']:
+            self._wakeup.set()
+        self._flusher = asyncio.create_task(self._write_loop())
+
+    async def _write_loop(self):
+        while not self._closing:
+            await self._wakeup.wait()
+            if self._closing:
+                break
+            await asyncio.sleep(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Game history flush failed: {e}")
+
+    def _write_columns(self, columns, rows):
+        try:
+            for name, _ in ARCHIVE_COLUMNS:
+                f = self._files[name]
+                columns[name].tofile(f)
+                f.flush()
+        except Exception:
+            # Cut every column back to the last whole row so the archive stays aligned. The old
+            # handles are closed first and replaced, so no bytes left in their buffers land after the cut
+            for name, typecode in ARCHIVE_COLUMNS:
+                try:
+                    self._files[name].close()
+                except OSError:
+                    pass
+                path = self._column_path(name)
+                os.truncate(path, rows * array(typecode).itemsize)
+                self._files[name] = open(path, 'ab')
+            raise
+
+    async def flush(self):
+        if not self._pending['user_id'] or self._writing is not None:
+            return
+        columns = self._writing = self._pending
+        self._pending = {name: array(typecode) for name, typecode in ARCHIVE_COLUMNS}
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self._write_columns, columns, self._disk_rows)
+        except Exception:
+            for name, _ in ARCHIVE_COLUMNS:
+                columns[name].extend(self._pending[name])
+            self._pending = columns
+            raise
+        else:
+            self._disk_rows += len(columns['user_id'])
+        finally:
+            self._writing = None
+
+    async def close(self):
+        if self._flusher is not None:
+            self._closing = True
+            self._wakeup.set()
+            await self._flusher
+            self._flusher = None
+        if self._files:
+            await self.flush()
+            if not self._pending['user_id']:
+                await asyncio.get_running_loop().run_in_executor(None, self._save_index, self._disk_rows)
+        for f in self._files.values():
+            f.close()
+        self._files = {}
+        for fd in self._readers.values():
+            os.close(fd)
+        self._readers = {}
@@ -0,0 +1,50 @@
+"""Unique, time-ordered identifiers for transactions and payment requests."""
+import os
+import time
+
+
+class IdGenerator:
+    """Prefix plus lowercase hex of a time-ordered head and random bytes.
+
+    The head is the current millisecond (48 bits) and a per-millisecond
+    sequence (16 bits), so IDs from one generator never repeat and sort in
+    creation order. The random tail comes from an ``os.urandom`` pool that is
+    refilled ``pool_size`` bytes at a time, and the whole ID is encoded with
+    one ``bytes.hex()`` call. Hex keeps IDs free of ``_``, which callback data
+    and invoice payloads use as a separator.
+    """
+
+    def __init__(self, prefix, random_bytes, pool_size=65536):
+        self.prefix = prefix
+        self.random_bytes = random_bytes
+        self.pool_size = pool_size - pool_size % random_bytes if random_bytes else 0
+        self._pool = b''
+        self._offset = 0
+        self._last_ms = 0
+        self._sequence = 0
+
+    def _head(self):
+        now_ms = time.time_ns() // 1000000
+        if now_ms > self._last_ms:
+            self._last_ms = now_ms
+            self._sequence = 0
+        else:
+            # Same millisecond or the clock stepped back: stay on the last one and count up
+            self._sequence += 1
+            if self._sequence > 0xFFFF:
+                self._last_ms += 1
+                self._sequence = 0
+        return ((self._last_ms << 16) | self._sequence).to_bytes(8, 'big')
+
+    def _tail(self):
+        if not self.random_bytes:
+            return b''
+        if self._offset >= len(self._pool):
+            self._pool = os.urandom(self.pool_size)
+            self._offset = 0
+        start = self._offset
+        self._offset = start + self.random_bytes
+        return self._pool[start:self._offset]
+
+    def __call__(self):
+        return self.prefix + (self._head() + self._tail()).hex()
@@ -0,0 +1,36 @@
+"""Fixed-point rendering of integer Stars amounts as USD and TON."""
+from decimal import Decimal
+from functools import lru_cache
+
+USD_SCALE = 10 ** 8
+NANOTON = 10 ** 9
+
+
+class StarsConverter:
+    """Converts integer Stars to display strings with integer arithmetic only.
+
+    Rates are fixed to 1e-8 USD and 1 nanoton per Star once at construction;
+    results are cached because the same balances and bet tiers are rendered
+    over and over.
+    """
+
+    def __init__(self, stars_to_usd, stars_to_ton, cache_size=4096):
+        self.usd_rate = int(Decimal(str(stars_to_usd)) * USD_SCALE)
+        self.ton_rate = int(Decimal(str(stars_to_ton)) * NANOTON)
+        self.usd = lru_cache(maxsize=cache_size)(self._usd)
+        self.ton = lru_cache(maxsize=cache_size)(self._ton)
+
+    def nanoton(self, stars):
+        return stars * self.ton_rate
+
+    def _usd(self, stars):
+        """USD value rounded half up to cents, e.g. '1.79'"""
+        cents = (abs(stars) * self.usd_rate + USD_SCALE // 200) // (USD_SCALE // 100)
+        sign = '-' if stars < 0 and cents else ''
+        return f"{sign}{cents // 100}.{cents % 100:02d}"
+
+    def _ton(self, stars):
+        """TON value without trailing zeros, e.g. '1.201014'"""
+        whole, frac = divmod(abs(stars) * self.ton_rate, NANOTON)
+        sign = '-' if stars < 0 else ''
+        return f"{sign}{whole}.{f'{frac:09d}'.rstrip('0') or '0'}"
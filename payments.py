@@ -0,0 +1,47 @@
+"""Notification registry for userbot deposits waiting on a Stars payment."""
+import asyncio
+
+
+class PaymentWaiters:
+    """Futures keyed by payment request id, resolved by ``successful_payment``.
+
+    A pending deposit is one future here plus one entry on the shared timer
+    wheel; nothing runs for it until the payment arrives or the timeout
+    fires, at which point every waiter gets the result (``None`` on timeout).
+    """
+
+    def __init__(self, wheel, timeout=60):
+        self.wheel = wheel
+        self.timeout = timeout
+        self._waiters = {}
+
+    def __contains__(self, request_id):
+        return request_id in self._waiters
+
+    def __len__(self):
+        return len(self._waiters)
+
+    def expect(self, request_id):
+        """Future for the request's payment; repeated calls share one future"""
+        entry = self._waiters.get(request_id)
+        if entry is None:
+            future = asyncio.get_running_loop().create_future()
+            timer = self.wheel.schedule(self.timeout, self._expire, request_id)
+            entry = self._waiters[request_id] = (future, timer)
+        return entry[0]
+
+    def resolve(self, request_id, result):
+        """Wake everything waiting on ``request_id``; False if nobody was"""
+        entry = self._waiters.pop(request_id, None)
+        if entry is None:
+            return False
+        future, timer = entry
+        self.wheel.cancel(timer)
+        if not future.done():
+            future.set_result(result)
+        return True
+
+    def _expire(self, request_id):
+        entry = self._waiters.pop(request_id, None)
+        if entry is not None and not entry[0].done():
+            entry[0].set_result(None)
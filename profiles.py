@@ -0,0 +1,257 @@
+"""Player profile records and their SQLite-backed repository."""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from games import GAME_INDEX, GAME_KEYS
+
+logger = logging.getLogger(__name__)
+
+# Stored for players whose name was not known when their profile was created
+UNKNOWN_USERNAME = 'Unknown'
+
+PROFILE_COLUMNS = (
+    'user_id', 'username', 'registration_date', 'xp', 'total_games',
+    'total_bets', 'total_wins', 'total_losses', 'games_won', 'games_lost',
+    'favorite_game', 'biggest_win', 'game_counts',
+)
+
+CREATE_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS profiles (
+    user_id INTEGER PRIMARY KEY,
+    username TEXT NOT NULL,
+    registration_date REAL NOT NULL,
+    xp INTEGER NOT NULL,
+    total_games INTEGER NOT NULL,
+    total_bets INTEGER NOT NULL,
+    total_wins INTEGER NOT NULL,
+    total_losses INTEGER NOT NULL,
+    games_won INTEGER NOT NULL,
+    games_lost INTEGER NOT NULL,
+    favorite_game TEXT,
+    biggest_win INTEGER NOT NULL,
+    game_counts BLOB NOT NULL
+)
+"""
+SELECT_SQL = f"SELECT {', '.join(PROFILE_COLUMNS)} FROM profiles WHERE user_id = ?"
+UPSERT_SQL = (
+    f"INSERT OR REPLACE INTO profiles ({', '.join(PROFILE_COLUMNS)}) "
+    f"VALUES ({', '.join('?' * len(PROFILE_COLUMNS))})"
+)
+
+
+class Profile:
+    """Per-user stats record; money counters are integer Stars.
+
+    ``game_counts`` is one slot per GameType and ``favorite_game`` is kept up
+    to date by ``count_game``, so settling a game never scans the counters.
+
+    Supports ``profile['xp']`` and ``profile.get('xp', 0)`` so handlers that
+    render profiles can treat it like the dict it replaces.
+    """
+
+    __slots__ = (
+        'user_id', 'username', 'registration_date', 'xp', 'total_games',
+        'total_bets', 'total_wins', 'total_losses', 'games_won', 'games_lost',
+        'favorite_game', 'biggest_win', 'game_counts',
+    )
+
+    def __init__(self, user_id, username=None, registration_date=None):
+        self.user_id = user_id
+        self.username = username or UNKNOWN_USERNAME
+        self.registration_date = registration_date or datetime.now()
+        self.xp = 0
+        self.total_games = 0
+        self.total_bets = 0
+        self.total_wins = 0
+        self.total_losses = 0
+        self.games_won = 0
+        self.games_lost = 0
+        self.favorite_game = None
+        self.biggest_win = 0
+        self.game_counts = array('q', bytes(8 * len(GAME_KEYS)))
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        setattr(self, key, value)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def count_game(self, game_type):
+        """Count one more game of ``game_type``; it becomes the favorite once it overtakes the current one"""
+        counts = self.game_counts
+        index = GAME_INDEX[game_type]
+        counts[index] += 1
+        favorite = self.favorite_game
+        if favorite is None or counts[index] > counts[GAME_INDEX[favorite]]:
+            self.favorite_game = game_type
+
+    def to_row(self):
+        return (
+            self.user_id, self.username, self.registration_date.timestamp(), self.xp,
+            self.total_games, self.total_bets, self.total_wins, self.total_losses,
+            self.games_won, self.games_lost, self.favorite_game, self.biggest_win,
+            self.game_counts.tobytes(),
+        )
+
+    @classmethod
+    def from_row(cls, row):
+        profile = cls(row[0], row[1], datetime.fromtimestamp(row[2]))
+        (profile.xp, profile.total_games, profile.total_bets, profile.total_wins,
+         profile.total_losses, profile.games_won, profile.games_lost,
+         profile.favorite_game, profile.biggest_win) = row[3:12]
+        counts = row[12]
+        if isinstance(counts, str):
+            # Rows written before game_counts became a fixed array hold a JSON object
+            for game_type, count in json.loads(counts).items():
+                if game_type in GAME_INDEX:
+                    profile.game_counts[GAME_INDEX[game_type]] = count
+        else:
+            stored = array('q', counts)
+            profile.game_counts[:len(stored)] = stored
+        return profile
+
+
+class ProfileRepository:
+    """Profiles cached in an LRU and persisted to SQLite by a background writer.
+
+    Changed profiles are marked dirty and coalesced: the writer wakes at most
+    once per ``flush_interval`` and upserts everything dirty in a single
+    transaction on its own thread, so the event loop never waits on a commit.
+    Cache misses are primary-key lookups on a WAL-mode database, which do not
+    block on the writer.
+    """
+
+    def __init__(self, path, cache_size=100000, flush_interval=0.05):
+        self.path = path
+        self.cache_size = cache_size
+        self.flush_interval = flush_interval
+        self._cache = OrderedDict()
+        self._dirty = {}
+        self._reader = None
+        self._writer = None
+        self._executor = None
+        self._wakeup = None
+        self._flusher = None
+        self._closing = False
+
+    def open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._writer = sqlite3.connect(self.path, check_same_thread=False)
+        self._writer.execute("PRAGMA journal_mode=WAL")
+        self._writer.execute("PRAGMA synchronous=NORMAL")
+        self._writer.execute(CREATE_TABLE_SQL)
+        self._writer.commit()
+        self._reader = sqlite3.connect(self.path)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='profile-writer')
+
+    def __contains__(self, user_id):
+        return self.get(user_id) is not None
+
+    def get(self, user_id, default=None):
+        profile = self._cache.get(user_id)
+        if profile is not None:
+            self._cache.move_to_end(user_id)
+            return profile
+        # An evicted profile may still be waiting for the writer
+        profile = self._dirty.get(user_id)
+        if profile is None:
+            row = self._reader.execute(SELECT_SQL, (user_id,)).fetchone()
+            if row is None:
+                return default
+            profile = Profile.from_row(row)
+        self._remember(profile)
+        return profile
+
+    def cached(self, user_id):
+        """Profile of ``user_id`` if it is in memory, else None; never reads the database"""
+        profile = self._cache.get(user_id)
+        if profile is None:
+            profile = self._dirty.get(user_id)
+        return profile
+
+    def get_or_create(self, user_id, username=None):
+        profile = self.get(user_id)
+        if profile is None:
+            profile = Profile(user_id, username)
+            self._remember(profile)
+            self.mark_dirty(profile)
+        return profile
+
+    def _remember(self, profile):
+        self._cache[profile.user_id] = profile
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def mark_dirty(self, profile):
+        self._dirty[profile.user_id] = profile
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def start(self):
+        """Start the background writer; call from inside the running event loop"""
+        self._wakeup = asyncio.Event()
+        if self._dirty:
+            self._wakeup.set()
+        self._flusher = asyncio.create_task(self._write_loop())
+
+    async def _write_loop(self):
+        while not self._closing:
+            await self._wakeup.wait()
+            if self._closing:
+                break
+            await asyncio.sleep(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Profile flush failed: {e}")
+
+    def _write_rows(self, rows):
+        with self._writer:
+            self._writer.executemany(UPSERT_SQL, rows)
+
+    async def flush(self):
+        """Upsert every dirty profile in one transaction"""
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, {}
+        rows = [profile.to_row() for profile in dirty.values()]
+        try:
+            await asyncio.get_running_loop().run_in_executor(self._executor, self._write_rows, rows)
+        except Exception:
+            for user_id, profile in dirty.items():
+                self._dirty.setdefault(user_id, profile)
+            raise
+
+    async def close(self):
+        if self._flusher is not None:
+            self._closing = True
+            self._wakeup.set()
+            await self._flusher
+            self._flusher = None
+        if self._writer is not None:
+            await self.flush()
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
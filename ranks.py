@@ -0,0 +1,68 @@
+"""Player ranks and XP-to-rank lookup."""
+from bisect import bisect_right
+
+RANKS = {
+    1: {"name": "Newcomer", "xp_required": 0, "emoji": "🌱"},
+    2: {"name": "Beginner", "xp_required": 100, "emoji": "🌿"},
+    3: {"name": "Amateur", "xp_required": 300, "emoji": "🌾"},
+    4: {"name": "Player", "xp_required": 600, "emoji": "⭐"},
+    5: {"name": "Regular", "xp_required": 1000, "emoji": "🌟"},
+    6: {"name": "Enthusiast", "xp_required": 1500, "emoji": "✨"},
+    7: {"name": "Skilled", "xp_required": 2200, "emoji": "💫"},
+    8: {"name": "Expert", "xp_required": 3000, "emoji": "🔥"},
+    9: {"name": "Veteran", "xp_required": 4000, "emoji": "💎"},
+    10: {"name": "Master", "xp_required": 5200, "emoji": "👑"},
+    11: {"name": "Grand Master", "xp_required": 6500, "emoji": "🏆"},
+    12: {"name": "Champion", "xp_required": 8000, "emoji": "🥇"},
+    13: {"name": "Elite", "xp_required": 10000, "emoji": "💠"},
+    14: {"name": "Pro", "xp_required": 12500, "emoji": "🎖"},
+    15: {"name": "Star", "xp_required": 15500, "emoji": "⚡"},
+    16: {"name": "Superstar", "xp_required": 19000, "emoji": "🌠"},
+    17: {"name": "Legend", "xp_required": 23000, "emoji": "🔱"},
+    18: {"name": "Mythic", "xp_required": 28000, "emoji": "🐉"},
+    19: {"name": "Immortal", "xp_required": 35000, "emoji": "👼"},
+    20: {"name": "God", "xp_required": 50000, "emoji": "🌌"}
+}
+
+
+class RankInfo:
+    """Everything needed to render a rank; ``next_xp`` is None at the top rank"""
+
+    __slots__ = ('level', 'name', 'emoji', 'xp_required', 'next_xp', 'span')
+
+    def __init__(self, level, name, emoji, xp_required, next_xp):
+        self.level = level
+        self.name = name
+        self.emoji = emoji
+        self.xp_required = xp_required
+        self.next_xp = next_xp
+        self.span = 0 if next_xp is None else next_xp - xp_required
+
+    @property
+    def is_max(self):
+        return self.next_xp is None
+
+
+class RankTable:
+    """Ranks sorted by XP threshold with one prebuilt RankInfo per level.
+
+    ``lookup`` is a bisect over the threshold list and returns the shared
+    RankInfo, so a profile render costs one O(log n) search and no allocation.
+    """
+
+    def __init__(self, ranks):
+        levels = sorted(ranks, key=lambda level: ranks[level]['xp_required'])
+        self.thresholds = [ranks[level]['xp_required'] for level in levels]
+        self.infos = []
+        for index, level in enumerate(levels):
+            data = ranks[level]
+            next_xp = self.thresholds[index + 1] if index + 1 < len(levels) else None
+            self.infos.append(RankInfo(level, data['name'], data['emoji'], data['xp_required'], next_xp))
+        self.by_level = {info.level: info for info in self.infos}
+
+    def lookup(self, xp):
+        index = bisect_right(self.thresholds, xp) - 1
+        return self.infos[index if index > 0 else 0]
+
+    def level(self, level):
+        return self.by_level.get(level, self.infos[0])
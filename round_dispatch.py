@@ -0,0 +1,74 @@
+"""Round responses: paced concurrent throws and animation-aware waits."""
+import asyncio
+import time
+
+# Seconds Telegram clients spend animating each dice emoji before the value shows
+ANIMATION_SECONDS = {
+    '🎲': 2.0,
+    '🎯': 2.0,
+    '🏀': 2.5,
+    '⚽': 2.5,
+    '🎳': 2.5,
+    '🎰': 2.0,
+}
+
+
+class ChatPacer:
+    """Send slots per chat, at most one message every ``interval`` seconds.
+
+    Slots are handed out synchronously, so callers that reserve one after
+    another get consecutive slots even if their sends then run concurrently.
+    """
+
+    def __init__(self, interval, max_chats=4096):
+        self.interval = interval
+        self.max_chats = max_chats
+        self._next = {}
+
+    def reserve(self, chat_id, not_before=0.0):
+        """Monotonic time at which the next message to ``chat_id`` may go out"""
+        now = time.monotonic()
+        if len(self._next) >= self.max_chats:
+            self._next = {chat: slot for chat, slot in self._next.items() if slot > now}
+        slot = max(now, not_before, self._next.get(chat_id, 0.0))
+        self._next[chat_id] = slot + self.interval
+        return slot
+
+    async def wait(self, chat_id, not_before=0.0):
+        delay = self.reserve(chat_id, not_before) - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class RoundDispatcher:
+    """Timing of the bot's side of a round.
+
+    ``send_throws`` issues all of the bot's throws concurrently in paced
+    slots and ``wait_animation`` holds the next message only until the dice
+    have finished rolling. Callers run rounds off the update handler (on
+    the player's game actor), so these waits never hold up other updates.
+    """
+
+    def __init__(self, pacer, reply_delay=0.5, animation=ANIMATION_SECONDS, default_animation=2.0):
+        self.pacer = pacer
+        self.reply_delay = reply_delay
+        self.animation = animation
+        self.default_animation = default_animation
+
+    async def send_throws(self, chat_id, send, count):
+        """Call ``send()`` ``count`` times concurrently, one pacer slot each; results in order"""
+        not_before = time.monotonic() + self.reply_delay
+        slots = [self.pacer.reserve(chat_id, not_before) for _ in range(count)]
+
+        async def throw(slot):
+            delay = slot - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            return await send()
+
+        return await asyncio.gather(*(throw(slot) for slot in slots))
+
+    async def wait_animation(self, chat_id, emoji):
+        """Wait until throws just sent have finished animating and the chat has a free slot"""
+        animation = self.animation.get(emoji, self.default_animation)
+        await self.pacer.wait(chat_id, time.monotonic() + animation)
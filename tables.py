@@ -0,0 +1,214 @@
+"""Multiplayer tables: players in one chat each throw once for a shared pot."""
+import logging
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+TABLE_OPEN = 'open'
+TABLE_PLAYING = 'playing'
+TABLE_CLOSED = 'closed'
+
+# payouts maps user id to Stars credited; winners is empty when stakes were refunded
+TableResult = namedtuple('TableResult', 'table payouts winners')
+
+
+class TableError(Exception):
+    """A table action that is not allowed; the message can be shown to the player"""
+
+
+class Table:
+    """One table: the stake every player puts in, the players in join order and their throws"""
+
+    __slots__ = ('chat_id', 'game_type', 'stake', 'host_id', 'state', 'players', 'names', 'values', 'timer')
+
+    def __init__(self, chat_id, game_type, stake, host_id, host_name):
+        self.chat_id = chat_id
+        self.game_type = game_type
+        self.stake = stake
+        self.host_id = host_id
+        self.state = TABLE_OPEN
+        self.players = [host_id]
+        self.names = {host_id: host_name}
+        self.values = {}
+        self.timer = None
+
+    @property
+    def pot(self):
+        return self.stake * len(self.players)
+
+    def waiting_on(self):
+        """Players who have not thrown yet"""
+        return [user_id for user_id in self.players if user_id not in self.values]
+
+
+class TableEngine:
+    """Every table of a bot, at most one per chat.
+
+    Tables have no tasks of their own. The join window and the throw deadline
+    are timers on the shared wheel; everything else happens in response to a
+    player's button or dice. When a deadline passes the engine moves the
+    table on and calls ``on_timeout(table, result)`` from the wheel (result is
+    set once the table is settled); the caller posts the news.
+
+    Stakes are debited when a player sits down. A settled pot is paid with a
+    single ``credit_many`` call, so no await can split a settlement and a
+    ledger store writes all of it in one commit. Players who never threw
+    count as throwing 0; the highest throw takes the pot and ties split it,
+    the odd Stars going to the earliest player.
+    """
+
+    def __init__(self, wheel, balances, join_seconds=60, throw_seconds=90, max_players=10, on_timeout=None):
+        self.wheel = wheel
+        self.balances = balances
+        self.join_seconds = join_seconds
+        self.throw_seconds = throw_seconds
+        self.max_players = max_players
+        self.on_timeout = on_timeout
+        self.tables = {}
+        self.opened = 0
+        self.settled = 0
+        self.refunded = 0
+
+    def __len__(self):
+        return len(self.tables)
+
+    def get(self, chat_id):
+        return self.tables.get(chat_id)
+
+    def expects_throw(self, chat_id, user_id):
+        table = self.tables.get(chat_id)
+        return (
+            table is not None and table.state == TABLE_PLAYING
+            and user_id in table.names and user_id not in table.values
+        )
+
+    def _buy_in(self, user_id, stake):
+        balance = self.balances[user_id]
+        if balance < stake:
+            raise TableError(f"Insufficient balance! The stake is {stake} ⭐, you have {balance} ⭐")
+        self.balances.debit(user_id, stake, 'bet')
+
+    def open(self, chat_id, host_id, host_name, game_type, stake):
+        if chat_id in self.tables:
+            raise TableError("A table is already running in this chat")
+        if stake < 1:
+            raise TableError("The stake must be at least 1 ⭐")
+        self._buy_in(host_id, stake)
+        table = Table(chat_id, game_type, stake, host_id, host_name)
+        table.timer = self.wheel.schedule(self.join_seconds, self._join_expired, chat_id)
+        self.tables[chat_id] = table
+        self.opened += 1
+        return table
+
+    def _table(self, chat_id, state):
+        table = self.tables.get(chat_id)
+        if table is None:
+            raise TableError("There is no table in this chat")
+        if table.state != state:
+            raise TableError("This table has already started" if state == TABLE_OPEN else "This table is not playing")
+        return table
+
+    def join(self, chat_id, user_id, name):
+        table = self._table(chat_id, TABLE_OPEN)
+        if user_id in table.names:
+            raise TableError("You are already at this table")
+        if len(table.players) >= self.max_players:
+            raise TableError("This table is full")
+        self._buy_in(user_id, table.stake)
+        table.players.append(user_id)
+        table.names[user_id] = name
+        return table
+
+    def start(self, chat_id, user_id):
+        """Host starts play before the join window closes"""
+        table = self._table(chat_id, TABLE_OPEN)
+        if user_id != table.host_id:
+            raise TableError("Only the host can start the table")
+        if len(table.players) < 2:
+            raise TableError("At least 2 players are needed")
+        self._begin(table)
+        return table
+
+    def cancel(self, chat_id, user_id):
+        """Host closes an open table; every stake is refunded"""
+        table = self._table(chat_id, TABLE_OPEN)
+        if user_id != table.host_id:
+            raise TableError("Only the host can cancel the table")
+        return self._refund(table)
+
+    def throw(self, chat_id, user_id, value):
+        """Record a player's throw; returns the TableResult once everyone has thrown"""
+        if not self.expects_throw(chat_id, user_id):
+            return None
+        table = self.tables[chat_id]
+        table.values[user_id] = value
+        if len(table.values) == len(table.players):
+            return self._settle(table)
+        return None
+
+    def _begin(self, table):
+        self.wheel.cancel(table.timer)
+        table.state = TABLE_PLAYING
+        table.timer = self.wheel.schedule(self.throw_seconds, self._throws_expired, table.chat_id)
+
+    def _close(self, table):
+        self.wheel.cancel(table.timer)
+        table.timer = None
+        table.state = TABLE_CLOSED
+        del self.tables[table.chat_id]
+
+    def _refund(self, table):
+        self._close(table)
+        payouts = {user_id: table.stake for user_id in table.players}
+        self.balances.credit_many(payouts.items(), 'refund')
+        self.refunded += 1
+        return TableResult(table, payouts, [])
+
+    def _settle(self, table):
+        if not table.values:
+            return self._refund(table)
+        self._close(table)
+        best = max(table.values.values())
+        winners = [user_id for user_id in table.players if table.values.get(user_id, 0) == best]
+        share, odd = divmod(table.pot, len(winners))
+        payouts = {user_id: share for user_id in winners}
+        payouts[winners[0]] += odd
+        self.balances.credit_many(payouts.items(), 'payout')
+        self.settled += 1
+        return TableResult(table, payouts, winners)
+
+    def refund_all(self):
+        """Close every table and refund its stakes; used on shutdown"""
+        return [self._refund(table) for table in list(self.tables.values())]
+
+    def _join_expired(self, chat_id):
+        table = self.tables.get(chat_id)
+        if table is None or table.state != TABLE_OPEN:
+            return
+        if len(table.players) < 2:
+            result = self._refund(table)
+        else:
+            self._begin(table)
+            result = None
+        self._notify(table, result)
+
+    def _throws_expired(self, chat_id):
+        table = self.tables.get(chat_id)
+        if table is None or table.state != TABLE_PLAYING:
+            return
+        self._notify(table, self._settle(table))
+
+    def _notify(self, table, result):
+        if self.on_timeout is not None:
+            try:
+                self.on_timeout(table, result)
+            except Exception as e:
+                logger.error(f"Table timeout handler failed: {e}")
+
+    def stats(self):
+        return {
+            'active': len(self.tables),
+            'opened': self.opened,
+            'settled': self.settled,
+            'refunded': self.refunded,
+        }
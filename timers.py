@@ -0,0 +1,252 @@
+"""Shared timer wheel for timeouts and expiry."""
+import asyncio
+import logging
+import math
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class Timer:
+    """Handle returned by ``TimerWheel.schedule``; pass it to ``cancel``"""
+
+    __slots__ = ('deadline', 'bucket', 'callback', 'args')
+
+    def __init__(self, deadline, callback, args):
+        self.deadline = deadline
+        self.bucket = None
+        self.callback = callback
+        self.args = args
+
+
+class TimerWheel:
+    """Hierarchical timer wheel: ``levels`` rings of ``2 ** bits`` buckets.
+
+    Level 0 buckets are one ``tick`` wide, each level above is ``2 ** bits``
+    times coarser. A timer goes into the coarsest level that still resolves
+    its deadline and moves down a level whenever the ring below wraps, so
+    scheduling and cancelling are O(1) set operations and the bucket count
+    is fixed. With the defaults (1s ticks, 4 levels of 64) the wheel covers
+    about 194 days; longer delays are clamped to that.
+
+    A single background task advances the wheel once per tick while any
+    timer is pending and sleeps on an event otherwise. Callbacks are plain
+    functions run on the event loop and must not block.
+    """
+
+    def __init__(self, tick=1.0, bits=6, levels=4):
+        self.tick = tick
+        self.bits = bits
+        self.mask = (1 << bits) - 1
+        self.horizon = (1 << (bits * levels)) - 1
+        self._levels = [[set() for _ in range(1 << bits)] for _ in range(levels)]
+        self._origin = time.monotonic()
+        self._ticks = 0
+        self._count = 0
+        self._wakeup = None
+        self._runner = None
+        self._closing = False
+
+    def __len__(self):
+        return self._count
+
+    def _current_tick(self):
+        return int((time.monotonic() - self._origin) / self.tick)
+
+    def _place(self, timer):
+        delta = timer.deadline - self._ticks
+        level = 0
+        while level + 1 < len(self._levels) and delta >> (self.bits * (level + 1)):
+            level += 1
+        bucket = self._levels[level][(timer.deadline >> (self.bits * level)) & self.mask]
+        bucket.add(timer)
+        timer.bucket = bucket
+
+    def schedule(self, delay, callback, *args):
+        """Run ``callback(*args)`` after at least ``delay`` seconds"""
+        if not self._count:
+            # The wheel stops turning when empty; realign it with the clock
+            self._origin = time.monotonic() - self._ticks * self.tick
+        ticks = min(max(1, math.ceil(delay / self.tick)), self.horizon)
+        # Deadlines count from the clock, but must stay inside the window the wheel has reached
+        deadline = min(self._current_tick() + ticks, self._ticks + self.horizon)
+        timer = Timer(deadline, callback, args)
+        self._place(timer)
+        self._count += 1
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return timer
+
+    def cancel(self, timer):
+        """Drop a pending timer; returns False if it already fired or was cancelled"""
+        if timer.bucket is None:
+            return False
+        timer.bucket.remove(timer)
+        timer.bucket = None
+        self._count -= 1
+        return True
+
+    def _advance(self):
+        self._ticks += 1
+        now = self._ticks
+        # Find the highest ring that wrapped and pull its due bucket down, top first
+        top = 0
+        while top + 1 < len(self._levels) and not (now >> (self.bits * top)) & self.mask:
+            top += 1
+        for level in range(top, 0, -1):
+            bucket = self._levels[level][(now >> (self.bits * level)) & self.mask]
+            timers = list(bucket)
+            bucket.clear()
+            for timer in timers:
+                self._place(timer)
+
+        bucket = self._levels[0][now & self.mask]
+        timers = list(bucket)
+        bucket.clear()
+        for timer in timers:
+            timer.bucket = None
+            self._count -= 1
+            try:
+                timer.callback(*timer.args)
+            except Exception as e:
+                logger.error(f"Timer callback failed: {e}")
+
+    async def start(self):
+        """Start turning the wheel; call from inside the running event loop"""
+        self._wakeup = asyncio.Event()
+        self._runner = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while not self._closing:
+            if not self._count:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            next_tick = self._origin + (self._ticks + 1) * self.tick
+            await asyncio.sleep(max(0.0, next_tick - time.monotonic()))
+            current = self._current_tick()
+            while self._ticks < current and self._count and not self._closing:
+                self._advance()
+            if not self._count:
+                self._ticks = max(self._ticks, current)
+
+    async def close(self):
+        if self._runner is not None:
+            self._closing = True
+            self._wakeup.set()
+            self._runner.cancel()
+            try:
+                await self._runner
+            except asyncio.CancelledError:
+                pass
+            self._runner = None
+
+
+class ExpiryTracker:
+    """Owns the TTL of every entry in one dict, using timers on a shared wheel.
+
+    Entries are added with ``add`` and leave either through ``complete`` or
+    ``cancel`` (normal ends) or by expiring, which pops them from the dict
+    and calls ``on_expire(key, value)``. ``touch`` restarts an entry's TTL.
+    With ``max_size`` set, adding a new entry to a full tracker first evicts
+    the least recently added or touched one, which counts as expiring early;
+    the timers dict doubles as the recency order, so this is O(1).
+    ``on_change(key)`` is called whenever an entry is added or leaves, however
+    it leaves. The counters give how many entries ended each way.
+    """
+
+    def __init__(self, wheel, name, table, ttl, on_expire=None, on_change=None, max_size=None):
+        self.wheel = wheel
+        self.name = name
+        self.table = table
+        self.ttl = ttl
+        self.on_expire = on_expire
+        self.on_change = on_change
+        self.max_size = max_size
+        self._timers = {}
+        self.added = 0
+        self.completed = 0
+        self.cancelled = 0
+        self.expired = 0
+        self.evicted = 0
+        self.peak = 0
+
+    def __len__(self):
+        return len(self.table)
+
+    def add(self, key, value):
+        old = self._timers.pop(key, None)
+        if old is not None:
+            self.wheel.cancel(old)
+        elif self.max_size is not None and len(self._timers) >= self.max_size:
+            self._evict(next(iter(self._timers)))
+        self.table[key] = value
+        self._timers[key] = self.wheel.schedule(self.ttl, self._expire, key)
+        self.added += 1
+        self.peak = max(self.peak, len(self._timers))
+        if self.on_change is not None:
+            self.on_change(key)
+        return value
+
+    def touch(self, key):
+        """Restart the entry's TTL and mark it most recently used; returns its value or None"""
+        timer = self._timers.pop(key, None)
+        if timer is None:
+            return None
+        self.wheel.cancel(timer)
+        self._timers[key] = self.wheel.schedule(self.ttl, self._expire, key)
+        return self.table.get(key)
+
+    def _remove(self, key):
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            self.wheel.cancel(timer)
+        value = self.table.pop(key, None)
+        if value is not None and self.on_change is not None:
+            self.on_change(key)
+        return value
+
+    def complete(self, key):
+        """The entry finished normally; returns its value or None"""
+        value = self._remove(key)
+        if value is not None:
+            self.completed += 1
+        return value
+
+    def cancel(self, key):
+        """The entry was abandoned on purpose; returns its value or None"""
+        value = self._remove(key)
+        if value is not None:
+            self.cancelled += 1
+        return value
+
+    def _evict(self, key):
+        self.wheel.cancel(self._timers.pop(key))
+        self.evicted += 1
+        self._dropped(key, self.table.pop(key, None))
+
+    def _expire(self, key):
+        self._timers.pop(key, None)
+        value = self.table.pop(key, None)
+        if value is None:
+            return
+        self.expired += 1
+        logger.info(f"Expired {self.name} entry {key}")
+        self._dropped(key, value)
+
+    def _dropped(self, key, value):
+        if self.on_change is not None:
+            self.on_change(key)
+        if self.on_expire is not None and value is not None:
+            self.on_expire(key, value)
+
+    def stats(self):
+        return {
+            'active': len(self.table),
+            'added': self.added,
+            'completed': self.completed,
+            'cancelled': self.cancelled,
+            'expired': self.expired,
+            'evicted': self.evicted,
+            'peak': self.peak,
+        }
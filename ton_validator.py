@@ -0,0 +1,111 @@
+"""TON wallet address parsing and validation.
+
+User-friendly addresses are 48 base64 (or base64url) characters encoding 36
+bytes: a flags byte, the workchain as int8, the 32-byte account hash and a
+big-endian CRC16-XMODEM of the first 34 bytes. Raw addresses are
+``<workchain>:<64 hex digits>``.
+"""
+import binascii
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+FRIENDLY_RE = re.compile(r'[A-Za-z0-9_\-+/]{48}')
+BASE64_RE = re.compile(r'[A-Za-z0-9_\-+/]*')
+RAW_RE = re.compile(r'(-?[0-9]{1,10}):([0-9a-fA-F]{64})')
+
+FLAG_BOUNCEABLE = 0x11
+FLAG_NON_BOUNCEABLE = 0x51
+FLAG_TESTNET = 0x80
+FRIENDLY_FLAGS = frozenset((
+    FLAG_BOUNCEABLE, FLAG_NON_BOUNCEABLE,
+    FLAG_BOUNCEABLE | FLAG_TESTNET, FLAG_NON_BOUNCEABLE | FLAG_TESTNET,
+))
+WORKCHAINS = frozenset((0, -1))
+
+TonAddress = namedtuple('TonAddress', 'workchain account bounceable testnet')
+
+
+def _to_standard(text):
+    """base64url to standard base64, so one decoder handles both spellings"""
+    return text.replace('-', '+').replace('_', '/')
+
+
+def _from_friendly(data):
+    """Parse 36 decoded bytes; None if the flags, workchain or checksum are wrong"""
+    flags = data[0]
+    if flags not in FRIENDLY_FLAGS:
+        return None
+    # CRC16-XMODEM has no final xor, so data followed by its own checksum CRCs to zero
+    if binascii.crc_hqx(data, 0):
+        return None
+    workchain = data[1] - 256 if data[1] > 127 else data[1]
+    if workchain not in WORKCHAINS:
+        return None
+    return TonAddress(workchain, bytes(data[2:34]), not flags & 0x40, bool(flags & FLAG_TESTNET))
+
+
+@lru_cache(maxsize=4096)
+def parse_ton_address(address):
+    """TonAddress for a user-friendly or raw address, or None if it is not valid"""
+    if not address:
+        return None
+    address = address.strip()
+    if FRIENDLY_RE.fullmatch(address):
+        return _from_friendly(binascii.a2b_base64(_to_standard(address)))
+    match = RAW_RE.fullmatch(address)
+    if match:
+        workchain = int(match.group(1))
+        if workchain not in WORKCHAINS:
+            return None
+        return TonAddress(workchain, bytes.fromhex(match.group(2)), True, False)
+    return None
+
+
+def is_valid_ton_address(address):
+    return parse_ton_address(address) is not None
+
+
+def validate_ton_addresses(addresses):
+    """Validate many addresses at once, returning one bool per input.
+
+    All user-friendly candidates are joined and decoded with a single base64
+    call (48 characters decode to exactly 36 bytes, so the blocks line up),
+    then each 36-byte block is checked with one CRC call. Use this for bulk re-validation; the
+    single-address path goes through the LRU instead.
+    """
+    results = [False] * len(addresses)
+    indexes = []
+    friendly = []
+    for index, address in enumerate(addresses):
+        if not address:
+            continue
+        address = address.strip()
+        if len(address) == 48:
+            indexes.append(index)
+            friendly.append(address)
+        else:
+            results[index] = parse_ton_address(address) is not None
+    if not friendly:
+        return results
+
+    joined = ''.join(friendly)
+    if not BASE64_RE.fullmatch(joined):
+        # Some candidate has a stray character; sort them out one by one
+        for index, address in zip(indexes, friendly):
+            results[index] = parse_ton_address(address) is not None
+        return results
+
+    blob = binascii.a2b_base64(_to_standard(joined))
+    view = memoryview(blob)
+    flags = blob[0::36]
+    workchains = blob[1::36]
+    crc = binascii.crc_hqx
+    for position, index in enumerate(indexes):
+        start = position * 36
+        results[index] = (
+            flags[position] in FRIENDLY_FLAGS
+            and workchains[position] in (0, 255)
+            and not crc(view[start:start + 36], 0)
+        )
+    return results
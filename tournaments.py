@@ -0,0 +1,374 @@
+"""Knockout tournaments: seeded brackets of matches played with the regular game types."""
+import logging
+
+from game_engine import BOT, PLAYER, play_round
+from games import Game
+
+logger = logging.getLogger(__name__)
+
+TOURNAMENT_SIGNUP = 'signup'
+TOURNAMENT_RUNNING = 'running'
+TOURNAMENT_FINISHED = 'finished'
+TOURNAMENT_CANCELLED = 'cancelled'
+
+
+class TournamentError(Exception):
+    """A tournament action that is not allowed; the message can be shown to the player"""
+
+
+def seed_order(size):
+    """Seeds 1..size (a power of two) in bracket slot order, so the top seeds meet last"""
+    order = [1]
+    while len(order) < size:
+        total = 2 * len(order) + 1
+        order = [seed for top in order for seed in (top, total - top)]
+    return order
+
+
+class Match:
+    """One knockout match.
+
+    The better seed plays the player side of ``game`` and the other player
+    the bot side, so rounds are scored by ``play_round`` like any game. The
+    second player's throws wait in ``pending`` until the round is complete.
+    """
+
+    __slots__ = ('index', 'players', 'game', 'pending', 'timer', 'winner')
+
+    def __init__(self, index):
+        self.index = index
+        self.players = []
+        self.game = None
+        self.pending = bytearray()
+        self.timer = None
+        self.winner = None
+
+    @property
+    def loser(self):
+        if self.winner is None or len(self.players) < 2:
+            return None
+        return self.players[1] if self.winner == self.players[0] else self.players[0]
+
+    def waiting_on(self, user_id):
+        """True while ``user_id`` still has throws to make in the current round"""
+        game = self.game
+        if user_id == game.user_id:
+            return game.user_throws < (game.current_round + 1) * game.throw_count
+        return len(self.pending) < game.throw_count
+
+
+class Tournament:
+    """One tournament: the entrants in sign-up order and, once running, the bracket.
+
+    The bracket is a complete binary tree stored in ``matches``: the final is
+    match 1, match ``i`` is fed by the winners of matches ``2i`` and
+    ``2i + 1``, and the first round is matches ``size // 2`` to ``size - 1``.
+    """
+
+    __slots__ = (
+        'chat_id', 'game_type', 'entry_fee', 'host_id', 'rounds', 'throw_count', 'state',
+        'entrants', 'names', 'seeds', 'size', 'matches', 'current', 'timer', 'champion',
+    )
+
+    def __init__(self, chat_id, game_type, entry_fee, host_id, host_name, rounds, throw_count):
+        self.chat_id = chat_id
+        self.game_type = game_type
+        self.entry_fee = entry_fee
+        self.host_id = host_id
+        self.rounds = rounds
+        self.throw_count = throw_count
+        self.state = TOURNAMENT_SIGNUP
+        self.entrants = [host_id]
+        self.names = {host_id: host_name}
+        self.seeds = {}
+        self.size = 0
+        self.matches = []
+        self.current = {}
+        self.timer = None
+        self.champion = None
+
+    @property
+    def prize(self):
+        return self.entry_fee * len(self.entrants)
+
+    @property
+    def total_rounds(self):
+        return self.size.bit_length() - 1
+
+    def round_of(self, match):
+        """Bracket round of ``match``, 1 for the first round"""
+        return self.total_rounds - (match.index.bit_length() - 1)
+
+    def next_match(self, match):
+        """The match the winner of ``match`` plays next, or None after the final"""
+        return self.matches[match.index // 2] if match.index > 1 else None
+
+    def live_matches(self):
+        return sorted({match.index: match for match in self.current.values()}.values(), key=lambda m: m.index)
+
+
+class TournamentEngine:
+    """Every tournament of a bot, at most one per chat.
+
+    Nothing runs per match. The sign-up window and each match's time limit
+    are timers on the shared wheel, which already keeps every deadline of
+    the bot in one structure driven by one task; a match costs a schedule
+    when it starts and a cancel when it ends. A match becomes playable as
+    soon as both its players are known, so fast players move on without
+    waiting for the rest of their round.
+
+    When a match runs out of time it is decided on the score, then on pips
+    thrown, then for the better seed; drawn matches are decided the same
+    way. ``on_timeout(tournament, match)`` is called from the wheel after a
+    deadline moved a tournament on: ``match`` is None when sign-up closed.
+    Entry fees are debited on sign-up and the champion takes them all.
+    """
+
+    def __init__(self, wheel, balances, signup_seconds=300, match_seconds=120, max_entrants=1024,
+                 seed_key=None, on_timeout=None):
+        self.wheel = wheel
+        self.balances = balances
+        self.signup_seconds = signup_seconds
+        self.match_seconds = match_seconds
+        self.max_entrants = max_entrants
+        self.seed_key = seed_key
+        self.on_timeout = on_timeout
+        self.tournaments = {}
+        self.opened = 0
+        self.completed = 0
+        self.cancelled = 0
+        self.matches_started = 0
+        self.matches_expired = 0
+
+    def __len__(self):
+        return len(self.tournaments)
+
+    def get(self, chat_id):
+        return self.tournaments.get(chat_id)
+
+    def expects_throw(self, chat_id, user_id):
+        tournament = self.tournaments.get(chat_id)
+        if tournament is None:
+            return False
+        match = tournament.current.get(user_id)
+        return match is not None and match.waiting_on(user_id)
+
+    def _buy_in(self, user_id, fee):
+        if not fee:
+            return
+        balance = self.balances[user_id]
+        if balance < fee:
+            raise TournamentError(f"Insufficient balance! The entry fee is {fee} ⭐, you have {balance} ⭐")
+        self.balances.debit(user_id, fee, 'bet')
+
+    def open(self, chat_id, host_id, host_name, game_type, entry_fee, rounds=3, throw_count=1):
+        if chat_id in self.tournaments:
+            raise TournamentError("A tournament is already running in this chat")
+        if entry_fee < 0:
+            raise TournamentError("The entry fee cannot be negative")
+        self._buy_in(host_id, entry_fee)
+        tournament = Tournament(chat_id, game_type, entry_fee, host_id, host_name, rounds, throw_count)
+        tournament.timer = self.wheel.schedule(self.signup_seconds, self._signup_expired, chat_id)
+        self.tournaments[chat_id] = tournament
+        self.opened += 1
+        return tournament
+
+    def _signup(self, chat_id):
+        tournament = self.tournaments.get(chat_id)
+        if tournament is None:
+            raise TournamentError("There is no tournament in this chat")
+        if tournament.state != TOURNAMENT_SIGNUP:
+            raise TournamentError("Sign-up for this tournament has closed")
+        return tournament
+
+    def join(self, chat_id, user_id, name):
+        tournament = self._signup(chat_id)
+        if user_id in tournament.names:
+            raise TournamentError("You are already signed up")
+        if len(tournament.entrants) >= self.max_entrants:
+            raise TournamentError("This tournament is full")
+        self._buy_in(user_id, tournament.entry_fee)
+        tournament.entrants.append(user_id)
+        tournament.names[user_id] = name
+        return tournament
+
+    def start(self, chat_id, user_id):
+        """Host closes sign-up early and starts the bracket"""
+        tournament = self._signup(chat_id)
+        if user_id != tournament.host_id:
+            raise TournamentError("Only the host can start the tournament")
+        if len(tournament.entrants) < 2:
+            raise TournamentError("At least 2 players are needed")
+        self._begin(tournament)
+        return tournament
+
+    def cancel(self, chat_id, user_id):
+        """Host calls off a tournament during sign-up; every fee is refunded"""
+        tournament = self._signup(chat_id)
+        if user_id != tournament.host_id:
+            raise TournamentError("Only the host can cancel the tournament")
+        self._refund(tournament)
+        return tournament
+
+    def throw(self, chat_id, user_id, value):
+        """Record a throw; returns the match if this throw decided it"""
+        if not self.expects_throw(chat_id, user_id):
+            return None
+        tournament = self.tournaments[chat_id]
+        match = tournament.current[user_id]
+        game = match.game
+        if user_id == game.user_id:
+            game.add_user_throw(value)
+        else:
+            match.pending.append(value)
+        if match.waiting_on(game.user_id) or len(match.pending) < game.throw_count:
+            return None
+
+        outcome = play_round(game, match.pending)
+        match.pending.clear()
+        if not outcome.finished:
+            return None
+        if outcome.settlement.winner == PLAYER:
+            winner = match.players[0]
+        elif outcome.settlement.winner == BOT:
+            winner = match.players[1]
+        else:
+            winner = self._decide(match)
+        self._finish_match(tournament, match, winner)
+        return match
+
+    def _begin(self, tournament):
+        """Seed the entrants, lay out the bracket and start every match that has both players"""
+        self.wheel.cancel(tournament.timer)
+        tournament.timer = None
+        tournament.state = TOURNAMENT_RUNNING
+        entrants = tournament.entrants
+        if self.seed_key is not None:
+            entrants = sorted(entrants, key=self.seed_key)
+        tournament.seeds = {user_id: seed for seed, user_id in enumerate(entrants, 1)}
+
+        size = 2
+        while size < len(entrants):
+            size *= 2
+        tournament.size = size
+        tournament.matches = [None] + [Match(index) for index in range(1, size)]
+
+        # Slots facing a seed past the last entrant are byes; the top seeds get them
+        order = seed_order(size)
+        first = size // 2
+        for slot in range(0, size, 2):
+            players = [entrants[seed - 1] for seed in order[slot:slot + 2] if seed <= len(entrants)]
+            match = tournament.matches[first + slot // 2]
+            if len(players) == 2:
+                match.players = players
+                self._start_match(tournament, match)
+            else:
+                match.players = players
+                match.winner = players[0]
+                self._feed(tournament, match.index // 2, players[0])
+
+    def _feed(self, tournament, index, user_id):
+        match = tournament.matches[index]
+        match.players.append(user_id)
+        if len(match.players) == 2:
+            match.players.sort(key=tournament.seeds.__getitem__)
+            self._start_match(tournament, match)
+
+    def _start_match(self, tournament, match):
+        better, other = match.players
+        match.game = Game(
+            better, tournament.names[better], 0, tournament.rounds, tournament.throw_count,
+            tournament.game_type, chat_id=tournament.chat_id,
+        )
+        tournament.current[better] = match
+        tournament.current[other] = match
+        match.timer = self.wheel.schedule(self.match_seconds, self._match_expired, tournament.chat_id, match.index)
+        self.matches_started += 1
+
+    def _decide(self, match):
+        """Winner of a drawn or unfinished match: score, then pips thrown, then the better seed"""
+        game = match.game
+        better, other = match.players
+        if game.user_score != game.bot_score:
+            return better if game.user_score > game.bot_score else other
+        better_total = sum(game.user_results)
+        other_total = sum(game.bot_results) + sum(match.pending)
+        return other if other_total > better_total else better
+
+    def _finish_match(self, tournament, match, winner):
+        self.wheel.cancel(match.timer)
+        match.timer = None
+        match.winner = winner
+        for user_id in match.players:
+            tournament.current.pop(user_id, None)
+        if match.index == 1:
+            self._complete(tournament, winner)
+        else:
+            self._feed(tournament, match.index // 2, winner)
+
+    def _complete(self, tournament, champion):
+        tournament.state = TOURNAMENT_FINISHED
+        tournament.champion = champion
+        del self.tournaments[tournament.chat_id]
+        if tournament.prize:
+            self.balances.credit(champion, tournament.prize, 'payout')
+        self.completed += 1
+
+    def _refund(self, tournament):
+        if tournament.timer is not None:
+            self.wheel.cancel(tournament.timer)
+            tournament.timer = None
+        for match in tournament.live_matches():
+            self.wheel.cancel(match.timer)
+            match.timer = None
+        tournament.current.clear()
+        tournament.state = TOURNAMENT_CANCELLED
+        del self.tournaments[tournament.chat_id]
+        if tournament.entry_fee:
+            self.balances.credit_many(((user_id, tournament.entry_fee) for user_id in tournament.entrants), 'refund')
+        self.cancelled += 1
+
+    def refund_all(self):
+        """Call off every tournament and refund its fees; used on shutdown"""
+        tournaments = list(self.tournaments.values())
+        for tournament in tournaments:
+            self._refund(tournament)
+        return tournaments
+
+    def _signup_expired(self, chat_id):
+        tournament = self.tournaments.get(chat_id)
+        if tournament is None or tournament.state != TOURNAMENT_SIGNUP:
+            return
+        if len(tournament.entrants) < 2:
+            self._refund(tournament)
+        else:
+            self._begin(tournament)
+        self._notify(tournament, None)
+
+    def _match_expired(self, chat_id, index):
+        tournament = self.tournaments.get(chat_id)
+        if tournament is None or tournament.state != TOURNAMENT_RUNNING:
+            return
+        match = tournament.matches[index]
+        if match.timer is None or match.winner is not None:
+            return
+        self.matches_expired += 1
+        self._finish_match(tournament, match, self._decide(match))
+        self._notify(tournament, match)
+
+    def _notify(self, tournament, match):
+        if self.on_timeout is not None:
+            try:
+                self.on_timeout(tournament, match)
+            except Exception as e:
+                logger.error(f"Tournament timeout handler failed: {e}")
+
+    def stats(self):
+        return {
+            'active': len(self.tournaments),
+            'opened': self.opened,
+            'completed': self.completed,
+            'cancelled': self.cancelled,
+            'matches_started': self.matches_started,
+            'matches_expired': self.matches_expired,
+        }
@@ -0,0 +1,138 @@
+"""Several userbot sessions sharing the group chats, each chat served by one of them."""
+import bisect
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _hash(data):
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'little')
+
+
+class HashRing:
+    """Consistent hashing of chat ids onto named nodes.
+
+    Every node owns ``replicas`` points on a 64-bit ring and a chat belongs
+    to the node owning the first point at or after the chat's hash. Points
+    depend only on the node names, so adding a session moves about 1/N of
+    the chats to it and leaves every other chat where it was.
+    """
+
+    def __init__(self, names, replicas=160):
+        if not names:
+            raise ValueError("A hash ring needs at least one node")
+        if len(set(names)) != len(names):
+            raise ValueError("Hash ring node names must be unique")
+        points = sorted(
+            (_hash(f"{name}#{replica}".encode()), index)
+            for index, name in enumerate(names) for replica in range(replicas)
+        )
+        self.names = list(names)
+        self._points = [point for point, _ in points]
+        self._nodes = [index for _, index in points]
+
+    def __len__(self):
+        return len(self.names)
+
+    def node_for(self, chat_id):
+        """Index of the node that owns ``chat_id``"""
+        position = bisect.bisect_left(self._points, _hash(chat_id.to_bytes(8, 'little', signed=True)))
+        return self._nodes[position % len(self._nodes)]
+
+
+class UserbotPool:
+    """Telethon clients, one per session, behind the interface handlers use from a single client.
+
+    Each group chat is owned by one client, picked on the hash ring, so the
+    flood limits of one account only bound the chats it owns and group
+    capacity grows with the number of sessions. ``on`` registers a handler
+    on every client but only runs it for events the receiving client owns
+    (private chats always belong to the client they were sent to), so
+    ``event.respond`` and ``event.edit`` already go out through the owner.
+    ``on_each`` does the same for builders that keep state of their own,
+    such as counters, making one builder per client.
+    ``send_message`` to a chat id routes to the owner; anything else, such
+    as the payment bot's username, goes through the first client.
+    """
+
+    def __init__(self, clients, names, replicas=160):
+        if len(clients) != len(names):
+            raise ValueError("Every userbot client needs a session name")
+        self.clients = list(clients)
+        self.ring = HashRing(names, replicas)
+        self.primary = self.clients[0]
+        self.bot_username = None
+        self.sent = [0] * len(self.clients)
+        self.skipped = 0
+
+    def __len__(self):
+        return len(self.clients)
+
+    def client_for(self, chat_id):
+        return self.clients[self.ring.node_for(chat_id)]
+
+    def on(self, builder):
+        """Decorator like ``TelegramClient.on``, registering the handler on every client"""
+        def decorator(handler):
+            for client in self.clients:
+                client.add_event_handler(self._owned(client, handler), builder)
+            return handler
+        return decorator
+
+    def on_each(self, make_builder):
+        """Like ``on``, with the builder made per client by ``make_builder(owns)``
+
+        ``owns(message)`` tells whether that client serves the message's
+        chat, so a builder can pass over the copies of an update the other
+        clients receive before doing any work or counting anything.
+        """
+        def decorator(handler):
+            for client in self.clients:
+                builder = make_builder(lambda message, client=client: self._owns_message(client, message))
+                client.add_event_handler(self._owned(client, handler), builder)
+            return handler
+        return decorator
+
+    def _owns_message(self, client, message):
+        from telethon import utils
+        from telethon.tl.types import PeerUser
+
+        peer = getattr(message, 'peer_id', None)
+        # Short updates carry no peer and, like PeerUser, are private chats
+        if peer is None or isinstance(peer, PeerUser):
+            return True
+        return self.client_for(utils.get_peer_id(peer)) is client
+
+    def _owned(self, client, handler):
+        async def handle(event):
+            if event.is_private or self.client_for(event.chat_id) is client:
+                await handler(event)
+            else:
+                self.skipped += 1
+        return handle
+
+    async def send_message(self, entity, *args, **kwargs):
+        if isinstance(entity, int):
+            index = self.ring.node_for(entity)
+        else:
+            index = 0
+        self.sent[index] += 1
+        return await self.clients[index].send_message(entity, *args, **kwargs)
+
+    async def start(self):
+        """Log every session in, one after another since each may prompt for a code"""
+        for name, client in zip(self.ring.names, self.clients):
+            await client.start()
+            logger.info(f"Userbot session {name} connected")
+
+    async def disconnect(self):
+        for client in self.clients:
+            await client.disconnect()
+
+    def stats(self):
+        return {
+            'sessions': len(self.clients),
+            'sent': dict(zip(self.ring.names, self.sent)),
+            'skipped': self.skipped,
+        }